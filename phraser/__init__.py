@@ -1,13 +1,16 @@
 from .key_helper import SEGMENT_KEY_LENGTH
 from .models import Audio, Phone, Phrase, Speaker, Syllable, Word
-from .store import ClosedStoreError, Store, UnboundStoreError
+from .sharded_store import ShardedStore
+from .store import ClosedStoreError, ReadOnlyStoreError, Store, UnboundStoreError
 
 __all__ = [
     "Audio",
     "ClosedStoreError",
     "Phone",
     "Phrase",
+    "ReadOnlyStoreError",
     "SEGMENT_KEY_LENGTH",
+    "ShardedStore",
     "Speaker",
     "Store",
     "Syllable",
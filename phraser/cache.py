@@ -0,0 +1,249 @@
+'''Object caches for Store: which loaded and saved objects stay in memory.
+
+The store keeps every object it loads or saves in its cache, so loading
+a key twice returns the same instance. ObjectCache (the default) keeps
+them all until the store closes; LRUCache bounds the cache by object
+count and/or an estimated byte budget and evicts the least recently
+used objects; WeakCache holds an object only while something else still
+refers to it. Every cache counts hits, misses and evictions (stats).
+
+Pinned keys are never evicted: the store pins the objects written in an
+open session until it ends, and Store.pin pins objects being edited.
+
+    store = Store(path, cache = LRUCache(max_objects = 1_000_000))
+    store = Store(path, cache = LRUCache(max_bytes = 8 * 1024**3))
+'''
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import gc
+import sys
+import weakref
+
+
+class ObjectCache(MutableMapping):
+    '''Unbounded cache: a mapping from key to object that keeps every
+    object until cleared.'''
+    bounded = False
+
+    def __init__(self):
+        self._objects = self._new_mapping()
+        self._pinned = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _new_mapping(self):
+        return {}
+
+    def lookup(self, key):
+        '''The cached object for key or None, counted as a hit or a
+        miss (get and [] do not count).'''
+        obj = self.get(key)
+        if obj is None: self.misses += 1
+        else: self.hits += 1
+        return obj
+
+    def pin(self, key):
+        '''Never evict the object cached under key, now or once cached.'''
+        self._pinned.add(key)
+
+    def unpin(self, key):
+        self._pinned.discard(key)
+
+    def is_pinned(self, key):
+        return key in self._pinned
+
+    def stats(self):
+        '''Counters and size: {'objects', 'pinned', 'hits', 'misses',
+        'evictions'}.'''
+        return {'objects': len(self), 'pinned': len(self._pinned),
+            'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions}
+
+    def __getitem__(self, key):
+        return self._objects[key]
+
+    def __setitem__(self, key, obj):
+        self._objects[key] = obj
+
+    def __delitem__(self, key):
+        del self._objects[key]
+
+    def __iter__(self):
+        return iter(list(self._objects))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def clear(self):
+        '''Drop every object and pin.'''
+        self._objects.clear()
+        self._pinned.clear()
+
+    def __repr__(self):
+        stats = ', '.join(f'{k}={v}' for k, v in self.stats().items())
+        return f'<{self.__class__.__name__} {stats}>'
+
+
+class LRUCache(ObjectCache):
+    '''Bounded cache evicting the least recently used unpinned objects
+    once it holds more than max_objects objects or more than max_bytes
+    (estimated with estimate_size) bytes. None: no limit of that kind.
+    '''
+    bounded = True
+
+    def __init__(self, max_objects = None, max_bytes = None):
+        if max_objects is None and max_bytes is None:
+            raise ValueError('LRUCache needs max_objects or max_bytes')
+        super().__init__()
+        self.max_objects = max_objects
+        self.max_bytes = max_bytes
+        self._sizes = {}
+        self.nbytes = 0
+
+    def _new_mapping(self):
+        return OrderedDict()
+
+    def stats(self):
+        stats = super().stats()
+        if self.max_bytes is not None: stats['bytes'] = self.nbytes
+        return stats
+
+    def __getitem__(self, key):
+        obj = self._objects[key]
+        self._objects.move_to_end(key)
+        return obj
+
+    def __setitem__(self, key, obj):
+        if key in self._objects: self._forget_size(key)
+        self._objects[key] = obj
+        self._objects.move_to_end(key)
+        if self.max_bytes is not None:
+            size = estimate_size(obj)
+            self._sizes[key] = size
+            self.nbytes += size
+        self._evict()
+
+    def __delitem__(self, key):
+        del self._objects[key]
+        self._forget_size(key)
+
+    def _forget_size(self, key):
+        self.nbytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        super().clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def _over(self):
+        if self.max_objects is not None and \
+            len(self._objects) > self.max_objects: return True
+        return self.max_bytes is not None and self.nbytes > self.max_bytes
+
+    def _evict(self):
+        '''Drop the oldest objects until within the limits; pinned ones
+        move to the recent end instead, so a cache full of pinned
+        objects may stay over its limits.'''
+        skipped = 0
+        while self._over() and skipped < len(self._objects):
+            key = next(iter(self._objects))
+            if key in self._pinned:
+                self._objects.move_to_end(key)
+                skipped += 1
+                continue
+            del self[key]
+            self.evictions += 1
+
+
+class WeakCache(ObjectCache):
+    '''Cache holding an object only while it is referenced outside the
+    cache (pinned objects are held in any case); an object is evicted
+    when it is garbage collected.'''
+    bounded = True
+
+    def __init__(self):
+        super().__init__()
+        self._strong = {}
+
+    def __getitem__(self, key):
+        obj = self._objects[key]()
+        if obj is None: raise KeyError(key)
+        return obj
+
+    def __setitem__(self, key, obj):
+        self._objects[key] = weakref.ref(obj,
+            lambda ref, key = key: self._expire(key, ref))
+        if key in self._pinned: self._strong[key] = obj
+
+    def __delitem__(self, key):
+        del self._objects[key]
+        self._strong.pop(key, None)
+
+    def _expire(self, key, ref):
+        if self._objects.get(key) is not ref: return
+        del self._objects[key]
+        self.evictions += 1
+
+    def pin(self, key):
+        super().pin(key)
+        obj = self.get(key)
+        if obj is not None: self._strong[key] = obj
+
+    def unpin(self, key):
+        super().unpin(key)
+        self._strong.pop(key, None)
+
+    def clear(self):
+        super().clear()
+        self._strong.clear()
+
+
+def estimate_size(obj):
+    '''Rough memory of an object in bytes: the object and its attribute
+    values themselves (not what they refer to). Of a slotted object the
+    slots are read raw, as reading a lazily loaded field would decode it;
+    the attributes in its __dict__ slot come from gc.get_referents, as
+    reading __dict__ would create it (a dict attribute counts with its
+    values there).'''
+    size = sys.getsizeof(obj)
+    cls = type(obj)
+    members = _slot_members(cls)
+    if members:
+        seen = set()
+        for member in members:
+            try: value = member.__get__(obj)
+            except AttributeError: continue
+            if id(value) in seen: continue
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+        if not cls.__dictoffset__: return size
+        for value in gc.get_referents(obj):
+            if value is cls or id(value) in seen: continue
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+            if type(value) is dict:
+                size += sum(sys.getsizeof(v) for v in value.values())
+        return size
+    attrs = getattr(obj, '__dict__', None)
+    if attrs is None: return size
+    size += sys.getsizeof(attrs)
+    for value in attrs.values():
+        size += sys.getsizeof(value)
+    return size
+
+
+_SLOT_MEMBERS = {}
+
+def _slot_members(cls):
+    '''The slot member descriptors of cls (unwrapping descriptors that
+    wrap one in .slot, such as segment.SlotDefault).'''
+    members = _SLOT_MEMBERS.get(cls)
+    if members is None:
+        members = [getattr(klass.__dict__[name], 'slot',
+            klass.__dict__[name]) for klass in cls.__mro__
+            for name in klass.__dict__.get('__slots__', ())
+            if name not in ('__dict__', '__weakref__')]
+        _SLOT_MEMBERS[cls] = members
+    return members
@@ -0,0 +1,628 @@
+'''Derived secondary indexes over the main LMDB sub-db.
+
+Each index owns one sub-db and turns raw main rows (key, value) into
+entries there. lmdb_helper.DB calls update() inside the transaction
+that writes or deletes the rows, so an index is never out of step with
+main. Indexes read raw bytes only; nothing here builds model objects.
+'''
+
+import numpy as np
+
+from . import key_helper
+from . import struct_value
+from .model_helper import EMPTY_ID
+from .struct_helper import RANK_CLASS_MAP
+
+
+class RowBatch(list):
+    '''The (key, value) rows of one write, as every index of the write
+    gets them. The rows are sorted out by class and the segment headers
+    decoded once for all of those indexes (see by_rank, segments)
+    instead of once per index.'''
+
+    def by_rank(self):
+        '''{rank: [(key, value)]} of the model rows (Audio, Speaker and
+        segments, see key_helper.row_key_to_rank), in batch order.'''
+        by_rank = getattr(self, '_by_rank', None)
+        if by_rank is None:
+            by_rank = self._by_rank = {}
+            for row in self:
+                rank = key_helper.row_key_to_rank(row[0])
+                if rank is None: continue
+                rows = by_rank.get(rank)
+                if rows is None: rows = by_rank[rank] = []
+                rows.append(row)
+        return by_rank
+
+    def segments(self):
+        '''[(key, value, object_type, fixed)] of the segment rows, fixed
+        their unpacked header; decoded on first use.'''
+        segments = getattr(self, '_segments', None)
+        if segments is None:
+            segments = self._segments = []
+            for rank, rows in self.by_rank().items():
+                object_type = RANK_CLASS_MAP[rank]
+                if object_type not in key_helper.SEGMENT_CLASSES: continue
+                segments.extend((key, value, object_type,
+                    struct_value.unpack_fixed(object_type, value))
+                    for key, value in rows)
+        return segments
+
+
+def as_batch(rows):
+    if isinstance(rows, RowBatch): return rows
+    return RowBatch(rows)
+
+
+def put_entries(txn, db, entries):
+    '''Put index entries sorted by key with one cursor.putmulti call.'''
+    if not entries: return
+    entries.sort()
+    txn.cursor(db = db).putmulti(entries)
+
+
+class RowIndex:
+    '''Base for an index whose entries depend on one row at a time.
+    Subclasses set name/db_name and implement entries(); the rows come
+    from source_db_name (main unless set otherwise).'''
+    name = None
+    db_name = None
+    source_db_name = 'main'
+    # indexes whose names start with this share the entries of this one:
+    # building it invalidates their built markers
+    family = None
+
+    def entries(self, key, value):
+        '''Return [(index_key, index_value)] for one main row.'''
+        return []
+
+    def clear(self, txn, db):
+        '''Remove every entry of this index (before a rebuild).'''
+        txn.drop(db, delete = False)
+
+    def build(self, txn, db, rows):
+        '''Index existing rows (a batch of a rebuild).'''
+        self.update(txn, db, [], rows)
+
+    def update(self, txn, db, removed, added):
+        '''Drop the entries of removed rows, then put those of added rows.
+        removed, added: lists (or RowBatch) of (key, value) main rows'''
+        for key, value in removed:
+            for index_key, _ in self.entries(key, value):
+                txn.delete(index_key, db = db)
+        entries = []
+        for key, value in added:
+            entries.extend(self.entries(key, value))
+        put_entries(txn, db, entries)
+
+
+class SegmentIndex(RowIndex):
+    '''Base for an index over the segment rows (Phrase, Word, Syllable,
+    Phone) only. Subclasses implement segment_entries(), which gets the
+    header the RowBatch decoded for every index of the write.'''
+
+    def entries(self, key, value):
+        if not key_helper.is_segment_key(key): return []
+        object_type = RANK_CLASS_MAP[key[9]]
+        fixed = struct_value.unpack_fixed(object_type, value)
+        return self.segment_entries(key, value, object_type, fixed)
+
+    def segment_entries(self, key, value, object_type, fixed):
+        '''Return [(index_key, index_value)] for one segment row.'''
+        return []
+
+    def update(self, txn, db, removed, added):
+        for row in as_batch(removed).segments():
+            for index_key, _ in self.segment_entries(*row):
+                txn.delete(index_key, db = db)
+        entries = []
+        for row in as_batch(added).segments():
+            entries.extend(self.segment_entries(*row))
+        put_entries(txn, db, entries)
+
+
+class IntervalIndex(SegmentIndex):
+    '''Per-audio interval index for overlap queries.
+
+    Each segment is filed under the smallest bin (of the fixed
+    key_helper.INTERVAL_SHIFTS levels) that holds its whole [start, end]
+    interval. A window query scans, per level, only the bins the window
+    touches, so its cost depends on the window and the number of hits,
+    not on how far into the recording the window lies.
+    key:    audio_id + rank + level + bin + start + identifier
+    value:  end (u32)
+    '''
+    name = 'interval'
+    db_name = 'interval'
+
+    def segment_entries(self, key, value, object_type, fixed):
+        index_key = key_helper.segment_key_to_interval_key(key, fixed['end'])
+        return [(index_key, fixed['end'].to_bytes(4, 'big'))]
+
+
+class ClassCountIndex(RowIndex):
+    '''Number of main rows per class rank, kept in the meta sub-db so
+    class sizes are known without scanning main.
+    key:    b'count:' + rank
+    value:  count (u64)
+    '''
+    name = 'class_count'
+    db_name = 'meta'
+
+    def clear(self, txn, db):
+        for rank in RANK_CLASS_MAP:
+            txn.delete(count_key(rank), db = db)
+
+    def update(self, txn, db, removed, added):
+        deltas = {}
+        for rank, rows in as_batch(removed).by_rank().items():
+            deltas[rank] = -len(rows)
+        for rank, rows in as_batch(added).by_rank().items():
+            deltas[rank] = deltas.get(rank, 0) + len(rows)
+        for rank, delta in deltas.items():
+            if delta == 0: continue
+            count = read_count(txn, db, rank) + delta
+            txn.put(count_key(rank), count.to_bytes(8, 'big'), db = db)
+
+
+class ChildIndex(SegmentIndex):
+    '''Parent -> children adjacency, so a segment's own children are a
+    prefix scan instead of a time-window scan over every speaker's
+    segments. Filed from the upward link (parent_id, parent_start) in
+    the child row; Phrases and unlinked segments have no entry.
+    key:    parent key + child key
+    value:  empty
+    '''
+    name = 'child'
+    db_name = 'child'
+
+    def segment_entries(self, key, value, object_type, fixed):
+        if object_type == 'Phrase': return []
+        if fixed['parent_id'] == EMPTY_ID: return []
+        parent_key = key_helper.segment_key_to_parent_key(key,
+            fixed['parent_id'], fixed['parent_start'])
+        return [(key_helper.pack_child_key(parent_key, key), b'')]
+
+
+class SpeakerPhraseIndex(SegmentIndex):
+    '''Phrases per speaker, so a speaker's phrases are a prefix scan
+    instead of every phrase of every audio the speaker is linked to.
+    key:    speaker_id + audio_id + start + phrase identifier
+    value:  empty
+    '''
+    name = 'speaker_phrase'
+    db_name = 'speaker_phrase'
+
+    def segment_entries(self, key, value, object_type, fixed):
+        if object_type != 'Phrase': return []
+        info = key_helper.unpack_key(key)
+        index_key = key_helper.pack_speaker_phrase_key(fixed['speaker_id'],
+            info['audio_id'], info['start'], info['identifier'])
+        return [(index_key, b'')]
+
+
+class AudioSpeakerIndex(RowIndex):
+    '''Reverse of the speaker_audio links, so the speakers linked to an
+    audio are a prefix scan.
+    key:    audio_id + speaker_id
+    value:  empty
+    '''
+    name = 'audio_speaker'
+    db_name = 'audio_speaker'
+    source_db_name = 'speaker_audio'
+
+    def entries(self, key, value):
+        return [(key_helper.speaker_audio_key_to_audio_speaker_key(key), b'')]
+
+
+class OrderedLabelIndex(SegmentIndex):
+    '''Segments by label in label order (next to the hash-based
+    label_segment index, which only answers exact matches), for prefix,
+    range and vocabulary scans.
+    key:    rank + escaped label + terminator + instance key
+            (see key_helper.pack_ordered_label_key)
+    value:  empty
+    '''
+    name = 'label_order'
+    db_name = 'label_order'
+
+    def segment_entries(self, key, value, object_type, fixed):
+        label = struct_value.unpack_label(object_type, value)
+        if label is None: return []
+        return [(key_helper.pack_ordered_label_key(label, key[9], key), b'')]
+
+
+class DurationIndex(SegmentIndex):
+    '''Segments per class in duration order (end - start), so duration
+    ranges and the shortest or longest segments of a class are a cursor
+    scan over the matching slice instead of decoding every row.
+    key:    rank + duration (u32) + instance key
+    value:  empty
+    '''
+    name = 'duration'
+    db_name = 'duration'
+
+    def segment_entries(self, key, value, object_type, fixed):
+        duration = fixed['end'] - key_helper.key_to_start(key)
+        return [(key_helper.pack_duration_key(key[9], duration, key), b'')]
+
+
+class FieldIndex(RowIndex):
+    '''Audio or Speaker rows by the values of a few fields (identity
+    fields such as filename, name and dataset, and metadata), so lookups
+    like audios.get(filename=...) read a handful of keys instead of
+    loading every row of the class. One index per class; its name holds
+    the field list, so changing the fields rebuilds it (and the marker of
+    the previous field list is dropped, as its entries are gone).
+    key:    rank + field + 0x00 + escaped value + terminator + instance key
+    value:  empty
+    '''
+    db_name = 'field'
+
+    def __init__(self, object_type, fields):
+        self.object_type = object_type
+        self.fields = tuple(fields)
+        self.rank = key_helper.CLASS_RANK_MAP[object_type]
+        self.family = f'field:{object_type}:'
+        self.name = self.family + ','.join(self.fields)
+
+    def entries(self, key, value):
+        if key_helper.row_key_to_rank(key) != self.rank: return []
+        row = struct_value.unpack_instance(self.object_type, value)
+        return [(key_helper.pack_field_key(self.rank, field, row[field],
+            key), b'') for field in self.fields]
+
+    def update(self, txn, db, removed, added):
+        # only the rows of this class
+        removed = as_batch(removed).by_rank().get(self.rank, [])
+        added = as_batch(added).by_rank().get(self.rank, [])
+        super().update(txn, db, removed, added)
+
+    def clear(self, txn, db):
+        for key in prefix_keys(txn, db, bytes([self.rank])):
+            txn.delete(key, db = db)
+
+
+class CodeBitmapIndex(RowIndex):
+    '''Bitmaps over the small code fields of the segment headers
+    (overlap_code, stress_code, position_code), one per (class, field,
+    code). Each row of a class gets an ordinal when it is first indexed;
+    bit `ordinal` of a bitmap is set when the row has that code. Filters
+    such as stress_code=1, overlap_code=0 become AND/OR over bitmaps
+    without reading main rows (see bitmap_keys).
+    Bitmaps are np.packbits layout (big bit order) in chunks of
+    BITMAP_CHUNK_BITS rows. Ordinals of deleted rows are not reused; a
+    rebuild renumbers the rows in key order.
+    entries: see key_helper (ordinal_key, pack_bitmap_key, ...)
+    '''
+    name = 'code_bitmap'
+    db_name = 'code_bitmap'
+
+    def _codes(self, rows):
+        '''[(key, [(field, code)])] of the rows of classes with bitmaps.'''
+        out = []
+        for key, _, object_type, fixed in as_batch(rows).segments():
+            fields = BITMAP_FIELDS.get(object_type)
+            if fields: out.append((key, [(f, fixed[f]) for f in fields]))
+        return out
+
+    def update(self, txn, db, removed, added):
+        changes = {}
+        ordinals = {}
+        next_ordinals = {}
+        new_entries = []
+        added_keys = {key for key, _ in added} if removed else ()
+        for key, codes in self._codes(removed):
+            ordinal = read_ordinal(txn, db, key)
+            if ordinal is None: continue
+            _mark(changes, key[9], codes, ordinal, False)
+            if key in added_keys:
+                ordinals[key] = ordinal
+                continue
+            txn.delete(key_helper.ordinal_key(key), db = db)
+            txn.delete(key_helper.ordinal_to_key_key(key[9], ordinal),
+                db = db)
+        for key, codes in self._codes(added):
+            rank = key[9]
+            # rows not just removed are new to the index
+            ordinal = ordinals.get(key)
+            if ordinal is None:
+                if rank not in next_ordinals:
+                    next_ordinals[rank] = read_next_ordinal(txn, db, rank)
+                ordinal = next_ordinals[rank]
+                next_ordinals[rank] += 1
+                new_entries.append((key_helper.ordinal_key(key),
+                    ordinal.to_bytes(4, 'big')))
+                new_entries.append((key_helper.ordinal_to_key_key(rank,
+                    ordinal), key))
+            _mark(changes, rank, codes, ordinal, True)
+        put_entries(txn, db, new_entries)
+        for rank, ordinal in next_ordinals.items():
+            txn.put(key_helper.next_ordinal_key(rank),
+                ordinal.to_bytes(4, 'big'), db = db)
+        for (rank, field, code, chunk), (cleared, set_) in changes.items():
+            bitmap_key = key_helper.pack_bitmap_key(rank, field, code, chunk)
+            bits = np.unpackbits(np.frombuffer(txn.get(bitmap_key, b'',
+                db = db), dtype = np.uint8))
+            if set_ and max(set_) >= len(bits):
+                bits = np.concatenate([bits, np.zeros(max(set_) + 1 -
+                    len(bits), dtype = np.uint8)])
+            # removed rows first: a replaced row is cleared, then set
+            cleared = np.asarray(cleared, dtype = np.int64)
+            bits[cleared[cleared < len(bits)]] = 0
+            bits[set_] = 1
+            txn.put(bitmap_key, np.packbits(bits).tobytes(), db = db)
+
+
+def _mark(changes, rank, codes, ordinal, value):
+    '''Note bit ordinal of the (rank, field, code) bitmaps of codes as
+    set (value True) or cleared; changes maps each bitmap to its
+    (cleared, set) bit lists.'''
+    chunk, bit = divmod(ordinal, BITMAP_CHUNK_BITS)
+    for field, code in codes:
+        bits = changes.get((rank, field, code, chunk))
+        if bits is None: bits = changes[(rank, field, code, chunk)] = ([], [])
+        bits[value].append(bit)
+
+
+class ChangeLog(RowIndex):
+    '''Append-only log of main-row changes with sequence numbers, so
+    long-lived readers can apply only what changed since they last looked
+    (Store.catch_up). An overwrite is logged as a put. Unlike the other
+    indexes it is a history, not derived from the rows: building it on an
+    existing database logs nothing and rebuilds keep it.
+    limit:  keep at most this many entries, dropping the oldest as new
+            ones are logged (None: grow until DB.trim_change_log); a
+            reader further behind falls back to a full refresh
+    key:    sequence number (u64), from 1
+    value:  op (CHANGE_PUT or CHANGE_DELETE) + main key
+    '''
+    name = 'change_log'
+    db_name = 'change_log'
+
+    def __init__(self, limit = None):
+        if limit is not None and limit < 1:
+            raise ValueError(f'change log limit must be >= 1, got {limit}')
+        self.limit = limit
+
+    def clear(self, txn, db):
+        pass
+
+    def build(self, txn, db, rows):
+        pass
+
+    def update(self, txn, db, removed, added):
+        seq = last_change_seq(txn, db)
+        added_keys = {key for key, _ in added} if removed else ()
+        cursor = txn.cursor(db = db)
+        for key, _ in removed:
+            if key in added_keys: continue
+            seq += 1
+            cursor.put(seq.to_bytes(8, 'big'), CHANGE_DELETE + key,
+                append = True)
+        for key, _ in added:
+            seq += 1
+            cursor.put(seq.to_bytes(8, 'big'), CHANGE_PUT + key,
+                append = True)
+        if self.limit is not None: trim_changes(txn, db, seq - self.limit)
+
+
+CHANGE_PUT = b'p'
+CHANGE_DELETE = b'd'
+
+
+# code fields of the segment headers kept in the code bitmap index
+BITMAP_FIELDS = {
+    'Phrase': ('overlap_code',),
+    'Word': ('overlap_code',),
+    'Syllable': ('stress_code', 'overlap_code'),
+    'Phone': ('position_code', 'overlap_code'),
+}
+BITMAP_CHUNK_BITS = 1 << 16
+
+
+# fields of the Audio and Speaker field indexes unless configured otherwise
+DEFAULT_INDEX_FIELDS = {
+    'Audio': ('filename', 'dataset', 'language', 'dialect'),
+    'Speaker': ('name', 'dataset', 'language', 'dialect', 'gender_code'),
+}
+
+
+def count_key(rank):
+    return b'count:' + bytes([rank])
+
+def read_count(txn, db, rank):
+    value = txn.get(count_key(rank), db = db)
+    if value is None: return 0
+    return int.from_bytes(value, 'big')
+
+
+def make_indexes(index_fields = None, change_log_limit = None):
+    '''The derived indexes every DB maintains, in update order.
+    index_fields:       {'Audio': fields, 'Speaker': fields} for the field
+                        indexes (default DEFAULT_INDEX_FIELDS)
+    change_log_limit:   entries the change log keeps (None: all)'''
+    if index_fields is None: index_fields = DEFAULT_INDEX_FIELDS
+    indexes = [IntervalIndex(), ClassCountIndex(), ChildIndex(),
+        SpeakerPhraseIndex(), AudioSpeakerIndex(), OrderedLabelIndex(),
+        DurationIndex(), CodeBitmapIndex(), ChangeLog(change_log_limit)]
+    for object_type, fields in index_fields.items():
+        if fields: indexes.append(FieldIndex(object_type, fields))
+    return indexes
+
+
+def overlapping_keys(txn, db, audio_id, object_type, start, end):
+    '''Main keys of object_type segments in the audio overlapping the
+    closed window [start, end], ordered by start time.
+    txn:    open read (or write) transaction
+    db:     the interval sub-db handle
+    '''
+    rank = key_helper.CLASS_RANK_MAP[object_type]
+    keys = []
+    cursor = txn.cursor(db = db)
+    for level, shift in enumerate(key_helper.INTERVAL_SHIFTS):
+        first_bin, last_bin = start >> shift, end >> shift
+        first = key_helper.pack_interval_bin_prefix(audio_id, rank, level,
+            first_bin)
+        if not cursor.set_range(first): break
+        prefix_len = len(first)
+        for index_key, value in cursor:
+            prefix = index_key[:prefix_len]
+            if prefix[:-4] != first[:-4]: break
+            bin_index = int.from_bytes(prefix[-4:], 'big')
+            if bin_index > last_bin: break
+            if key_helper.interval_key_to_start(index_key) > end: continue
+            if int.from_bytes(value, 'big') < start: continue
+            keys.append(key_helper.interval_key_to_instance_key(index_key))
+    keys.sort()
+    return keys
+
+
+def child_keys(txn, db, parent_key):
+    '''Main keys of the children filed under parent_key, ordered by
+    start time.
+    db:     the child sub-db handle
+    '''
+    index_keys = prefix_keys(txn, db, parent_key)
+    return [key_helper.child_key_to_instance_key(k) for k in index_keys]
+
+
+def prefix_keys(txn, db, prefix):
+    '''Every key in db starting with prefix, in key order.'''
+    keys = []
+    cursor = txn.cursor(db = db)
+    if not cursor.set_range(prefix): return keys
+    for key in cursor.iternext(keys = True, values = False):
+        if not key.startswith(prefix): break
+        keys.append(key)
+    return keys
+
+
+def ordered_label_keys(txn, db, start, stop):
+    '''Instance keys of the ordered label entries in [start, stop).'''
+    keys = []
+    cursor = txn.cursor(db = db)
+    if not cursor.set_range(start): return keys
+    for key in cursor.iternext(keys = True, values = False):
+        if key >= stop: break
+        keys.append(key_helper.ordered_label_key_to_instance_key(key))
+    return keys
+
+def ordered_labels(txn, db, start, stop):
+    '''Distinct labels with entries in [start, stop), in label order,
+    one seek per label.'''
+    labels = []
+    cursor = txn.cursor(db = db)
+    found = cursor.set_range(start)
+    while found:
+        key = cursor.key()
+        if key >= stop: break
+        label, end = key_helper.ordered_label_key_to_label(key)
+        labels.append(label)
+        found = cursor.set_range(key[:end] + b'\xff' * (
+            key_helper.SEGMENT_LEN + 1))
+    return labels
+
+def duration_keys(txn, db, rank, low = None, high = None, limit = None,
+    longest = False):
+    '''Instance keys of the rank's entries with low <= duration <= high
+    (None: open end), shortest first, or longest first; at most limit.
+    Bounds past the u32 range of the index are open ends.'''
+    keys = []
+    if limit is not None and limit <= 0: return keys
+    if low is not None and low > key_helper.MAX_DURATION: return keys
+    if high is not None and high >= key_helper.MAX_DURATION: high = None
+    start = key_helper.duration_prefix(rank, low or 0)
+    if high is None: stop = bytes([rank + 1])
+    else: stop = key_helper.duration_prefix(rank, high + 1)
+    cursor = txn.cursor(db = db)
+    if longest:
+        found = cursor.set_range(stop)
+        found = cursor.prev() if found else cursor.last()
+        index_keys = cursor.iterprev(keys = True, values = False)
+        in_range = lambda key: key >= start
+    else:
+        found = cursor.set_range(start)
+        index_keys = cursor.iternext(keys = True, values = False)
+        in_range = lambda key: key < stop
+    if not found: return keys
+    for key in index_keys:
+        if not in_range(key): break
+        keys.append(key_helper.duration_key_to_instance_key(key))
+        if len(keys) == limit: break
+    return keys
+
+def prefix_end(prefix):
+    '''Smallest key above every key starting with prefix.'''
+    stripped = prefix.rstrip(b'\xff')
+    if not stripped: return b'\xff' * 512
+    return stripped[:-1] + bytes([stripped[-1] + 1])
+
+
+def read_ordinal(txn, db, key):
+    value = txn.get(key_helper.ordinal_key(key), db = db)
+    if value is None: return None
+    return int.from_bytes(value, 'big')
+
+def read_next_ordinal(txn, db, rank):
+    value = txn.get(key_helper.next_ordinal_key(rank), db = db)
+    if value is None: return 0
+    return int.from_bytes(value, 'big')
+
+def bitmap_keys(txn, db, rank, conditions):
+    '''Sorted instance keys of the rows of rank matching every field of
+    conditions ({field: codes}): the bitmaps of the codes of one field
+    are OR-ed, the fields AND-ed, one chunk at a time.'''
+    n_chunks = -(-read_next_ordinal(txn, db, rank) // BITMAP_CHUNK_BITS)
+    n_bytes = BITMAP_CHUNK_BITS // 8
+    keys = []
+    for chunk in range(n_chunks):
+        bits = None
+        for field, codes in conditions.items():
+            field_bits = np.zeros(n_bytes, dtype = np.uint8)
+            for code in codes:
+                value = txn.get(key_helper.pack_bitmap_key(rank, field,
+                    code, chunk), db = db)
+                if value:
+                    field_bits[:len(value)] |= np.frombuffer(value,
+                        dtype = np.uint8)
+            bits = field_bits if bits is None else bits & field_bits
+            if not bits.any(): break
+        if bits is None or not bits.any(): continue
+        offset = chunk * BITMAP_CHUNK_BITS
+        for bit in np.flatnonzero(np.unpackbits(bits)):
+            ordinal = offset + int(bit)
+            keys.append(txn.get(key_helper.ordinal_to_key_key(rank,
+                ordinal), db = db))
+    return sorted(keys)
+
+
+def last_change_seq(txn, db):
+    '''Sequence number of the last change-log entry, 0 if none.'''
+    cursor = txn.cursor(db = db)
+    if not cursor.last(): return 0
+    return int.from_bytes(cursor.key(), 'big')
+
+def first_change_seq(txn, db):
+    '''Sequence number of the oldest change-log entry kept, 0 if none.'''
+    cursor = txn.cursor(db = db)
+    if not cursor.first(): return 0
+    return int.from_bytes(cursor.key(), 'big')
+
+def trim_changes(txn, db, upto_seq):
+    '''Delete the change-log entries with sequence numbers <= upto_seq.'''
+    stop = (max(upto_seq, 0) + 1).to_bytes(8, 'big')
+    cursor = txn.cursor(db = db)
+    if not cursor.first(): return
+    while cursor.key() < stop:
+        if not cursor.delete(): break
+
+def changes_since(txn, db, seq):
+    '''[(seq, op, key)] of the change-log entries after seq.'''
+    cursor = txn.cursor(db = db)
+    changes = []
+    if not cursor.set_range((seq + 1).to_bytes(8, 'big')): return changes
+    for index_key, value in cursor:
+        changes.append((int.from_bytes(index_key, 'big'), value[:1],
+            value[1:]))
+    return changes
@@ -0,0 +1,322 @@
+'''Parallel ingestion: many producer processes, one writer process.
+
+LMDB allows one writer, so Store.save_phrase_trees runs in one process.
+Producers (TextGrid parsing, syllabification, feature assignment) build
+phrase trees without a Store, validate them and pack them into rows
+(pack_phrase_trees). An IngestWriter process owns the Store: it checks
+each packed batch against the database (same-speaker overlap, existing
+keys) and commits batches in grouped transactions, one session per
+group. The inbox queue is bounded, so producers block while the writer
+is behind, and every batch is acknowledged on the ack queue. The
+parent polls both queues and watches the processes, so a writer that
+dies raises RuntimeError instead of leaving ingest waiting.
+
+    def produce(path):
+        return textgrid_to_phrase_trees(path)   # staged Phrase objects
+
+    acks = ingest(db_path, textgrid_paths, produce, n_producers=8)
+'''
+
+from dataclasses import dataclass, field
+import multiprocessing
+import os
+import queue
+
+import lmdb
+
+from . import key_helper
+from . import save_validation
+from . import struct_value
+from .store import Store, value_key_to_instance
+
+# spawned, not forked: a forked child inherits the parent's open LMDB
+# environments and may not open the database again
+context = multiprocessing.get_context('spawn')
+
+
+@dataclass
+class PackedTrees:
+    '''Rows of a batch of phrase trees, ready for the writer.
+    phrase_rows are the (key, value) rows of the phrases themselves, for
+    the writer-side overlap check.'''
+    batch_id: object
+    keys: list = field(default_factory = list)
+    values: list = field(default_factory = list)
+    label_keys: list = field(default_factory = list)
+    phrase_rows: list = field(default_factory = list)
+
+    @property
+    def n_rows(self):
+        return len(self.keys)
+
+
+@dataclass
+class Ack:
+    '''Outcome of one batch: error is None when its rows are committed,
+    else the message of the check or write that rejected it (nothing of
+    the batch is written).'''
+    batch_id: object
+    n_rows: int
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def pack_phrase_trees(phrases, batch_id = None):
+    '''Validate and pack staged phrase trees without a Store: the checks
+    of save_phrase_trees that need no database (tree coherence, phrase
+    identity, duplicate keys, overlap within the batch), then the rows.
+    Nothing is bound to or written in a store.'''
+    phrases = list(phrases)
+    save_validation.check_phrase_batch(phrases)
+    save_validation.check_same_speaker_overlap(None, phrases)
+    objs = []
+    for phrase in phrases:
+        objs.extend(phrase.items)
+    keys = [key_helper.instance_to_key(obj) for obj in objs]
+    save_validation.check_intra_batch_keys(objs, keys)
+    batch = PackedTrees(batch_id, keys = keys)
+    batch.values = [struct_value.pack_instance(obj) for obj in objs]
+    for obj in objs:
+        try: batch.label_keys.append(obj.label_index_key)
+        except AttributeError: pass
+    for key, value in zip(keys, batch.values):
+        if key_helper.key_to_object_type(key) == 'Phrase':
+            batch.phrase_rows.append((key, value))
+    return batch
+
+
+class IngestWriter:
+    '''Writer process owning the Store at path.
+
+    group_rows:     rows committed per transaction (a group of batches)
+    max_pending:    batches queued before submit blocks (backpressure)
+    poll:           seconds between checks that the writer is alive
+                    while submit or get_ack waits
+    store_kwargs:   passed to Store in the writer process
+
+    Use as a context manager, or start() and close(). Batches go in with
+    submit() (or put on .inbox by producer processes); one Ack per batch
+    comes out of .acks (get_ack).
+    '''
+    def __init__(self, path, group_rows = 100_000, max_pending = 64,
+        poll = 1.0, **store_kwargs):
+        self.path = path
+        self.group_rows = group_rows
+        self.poll = poll
+        self.store_kwargs = store_kwargs
+        self.inbox = context.Queue(maxsize = max_pending)
+        self.acks = context.Queue()
+        self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try: self.close()
+        except RuntimeError:
+            if exc_type is None: raise
+
+    def start(self):
+        args = (self.path, self.inbox, self.acks, self.group_rows,
+            self.store_kwargs)
+        self.process = context.Process(target = run_writer,
+            args = args, daemon = True)
+        self.process.start()
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def submit(self, batch):
+        '''Queue a PackedTrees batch; blocks while max_pending batches
+        wait. Raises RuntimeError when the writer has exited.'''
+        if not self._put(batch): raise RuntimeError(self._exit_message())
+
+    def get_ack(self, timeout = None):
+        '''The next Ack, or None after timeout seconds without one (None:
+        wait for it). Raises RuntimeError when the writer has exited and
+        no Ack is left.'''
+        waited = 0
+        while timeout is None or waited < timeout:
+            alive = self.alive()
+            try: return self.acks.get(timeout = self.poll)
+            except queue.Empty:
+                if not alive: raise RuntimeError(self._exit_message())
+            waited += self.poll
+        return None
+
+    def close(self):
+        '''Let the writer commit what is queued and stop.'''
+        if self.process is None: return
+        self._put(None)
+        self.process.join()
+        message = self._exit_message()
+        exitcode = self.process.exitcode
+        self.process = None
+        if exitcode != 0: raise RuntimeError(message)
+
+    def _put(self, item):
+        '''Put item on the inbox; False when the inbox stays full because
+        the writer has exited.'''
+        while True:
+            alive = self.alive()
+            try:
+                self.inbox.put(item, timeout = self.poll)
+                return True
+            except queue.Full:
+                if not alive: return False
+
+    def _exit_message(self):
+        exitcode = None if self.process is None else self.process.exitcode
+        return f'ingest writer exited with code {exitcode}'
+
+
+def run_writer(path, inbox, acks, group_rows = 100_000,
+    store_kwargs = None):
+    '''Writer loop: take batches from inbox until None, commit them in
+    groups of about group_rows rows, put one Ack per batch on acks.'''
+    store = Store(path = path, **(store_kwargs or {}))
+    try:
+        done = False
+        while not done:
+            group, done = _next_group(inbox, group_rows)
+            if group: _commit_group(store, group, acks)
+    finally: store.close()
+
+
+def _next_group(inbox, group_rows):
+    '''Block for one batch, then take whatever else is queued, up to
+    group_rows rows. Returns (batches, stop).'''
+    batch = inbox.get()
+    if batch is None: return [], True
+    group, n_rows = [batch], batch.n_rows
+    while n_rows < group_rows:
+        try: batch = inbox.get_nowait()
+        except queue.Empty: break
+        if batch is None: return group, True
+        group.append(batch)
+        n_rows += batch.n_rows
+    return group, False
+
+
+def _commit_group(store, group, acks, retries = 3):
+    '''Write each batch in a child transaction of one session: a batch
+    that fails its checks is rolled back alone, the others commit
+    together. A full map aborts the session, which grows the map; the
+    group is then written again, and rejected when the map stays full.
+    Any other error aborts the session; the batches are then written one
+    per session, so only a batch that fails again is rejected.'''
+    try: outcome = _write_group(store, group, retries)
+    except lmdb.MapFullError as e:
+        outcome = [_rejected(batch, 'group', e) for batch in group]
+    except Exception as e:
+        if len(group) == 1: outcome = [_rejected(group[0], 'batch', e)]
+        else: outcome = [_commit_alone(store, batch, retries)
+            for batch in group]
+    store._cache.clear()
+    for ack in outcome: acks.put(ack)
+
+
+def _write_group(store, group, retries):
+    '''Acks of the group written in one session, written again after a
+    full map grew, at most retries times.'''
+    for attempt in range(retries + 1):
+        try:
+            with store.DB.session():
+                return [Ack(batch.batch_id, batch.n_rows,
+                    _write_batch(store, batch)) for batch in group]
+        except lmdb.MapFullError:
+            if attempt == retries: raise
+
+
+def _commit_alone(store, batch, retries):
+    try: return _write_group(store, [batch], retries)[0]
+    except Exception as e: return _rejected(batch, 'batch', e)
+
+
+def _rejected(batch, what, error):
+    message = f'{what} not written: {type(error).__name__}: {error}'
+    return Ack(batch.batch_id, batch.n_rows, message)
+
+
+def _write_batch(store, batch):
+    '''Check and write one batch; the error message, or None.'''
+    try:
+        phrases = [value_key_to_instance(store, value, key)
+            for key, value in batch.phrase_rows]
+        save_validation.check_same_speaker_overlap(store, phrases)
+        store.DB.write_with_label_links(batch.keys, batch.values,
+            batch.label_keys)
+    except (KeyError, ValueError) as e:
+        return str(e)
+    return None
+
+
+def ingest(path, tasks, produce, n_producers = None, group_rows = 100_000,
+    max_pending = 64, poll = 1.0, **store_kwargs):
+    '''Ingest in parallel: n_producers processes call produce(task) for
+    the tasks (produce must be a module-level function returning staged
+    Phrase trees), pack the trees and feed one IngestWriter. Returns the
+    Acks in task order; a task whose produce or packing raised, or whose
+    producer process died, gets an Ack with that error and nothing
+    written. Raises RuntimeError when the writer process dies.'''
+    tasks = list(tasks)
+    if n_producers is None: n_producers = max(1, (os.cpu_count() or 2) - 1)
+    n_producers = max(1, min(n_producers, len(tasks)))
+    todo = context.Queue()
+    for index, task in enumerate(tasks): todo.put((index, task))
+    for _ in range(n_producers): todo.put(None)
+    with IngestWriter(path, group_rows, max_pending, poll,
+        **store_kwargs) as writer:
+        producers = [context.Process(target = run_producer,
+            args = (produce, todo, writer.inbox, writer.acks), daemon = True)
+            for _ in range(n_producers)]
+        for producer in producers: producer.start()
+        try: acks = _collect_acks(writer, producers, len(tasks))
+        except BaseException:
+            for producer in producers: producer.terminate()
+            raise
+        for producer in producers: producer.join()
+    return acks
+
+
+def _collect_acks(writer, producers, n_tasks):
+    '''The Acks of tasks 0 .. n_tasks - 1 in task order. Once every
+    producer has exited and one of them died, the tasks it held will not
+    be acknowledged: the writer is closed (it commits what is queued
+    first) and the tasks still missing get an error Ack.'''
+    acks = {}
+    while len(acks) < n_tasks:
+        ack = writer.get_ack(timeout = writer.poll)
+        if ack is not None:
+            acks[ack.batch_id] = ack
+            continue
+        codes = [producer.exitcode for producer in producers]
+        if None in codes or not any(codes): continue
+        writer.close()
+        while len(acks) < n_tasks:
+            try: ack = writer.acks.get(timeout = writer.poll)
+            except queue.Empty: break
+            acks[ack.batch_id] = ack
+        code = next(code for code in codes if code)
+        message = f'not written: a producer exited with code {code}'
+        for index in range(n_tasks):
+            acks.setdefault(index, Ack(index, 0, message))
+    return [acks[index] for index in range(n_tasks)]
+
+
+def run_producer(produce, todo, inbox, acks):
+    '''Producer loop: (index, task) from todo until None; the packed
+    trees go to the writer's inbox, failures straight to acks.'''
+    while True:
+        item = todo.get()
+        if item is None: return
+        index, task = item
+        try: batch = pack_phrase_trees(produce(task), batch_id = index)
+        except Exception as e:
+            acks.put(Ack(index, 0, f'{type(e).__name__}: {e}'))
+            continue
+        inbox.put(batch)
@@ -10,6 +10,15 @@ AUDIO_FMT   = struct_helper.make_key_fmt_for_class('audio')    # '>B8sB'
 SEGMENT_FMT = struct_helper.make_key_fmt_for_class('segment')  # '>B8sBI8s'
 TIME_SCAN_FMT = struct_helper.make_key_fmt_for_time_scan()     # '>B8sBI'
 SPEAKER_AUDIO_FMT = struct_helper.make_key_fmt_for_class('speaker_audio')#'>8s8s'
+INTERVAL_FMT = '>8sBBII8s'  # audio, class, level, bin, start, segment
+INTERVAL_PREFIX_FMT = '>8sBBI'
+SPEAKER_PHRASE_FMT = '>8s8sI8s'  # speaker, audio, start, phrase
+# longer labels are cut in the ordered label index (LMDB keys <= 511 bytes)
+ORDERED_LABEL_MAX_BYTES = 400
+# durations are stored as u32 in the duration index
+MAX_DURATION = 2**32 - 1
+
+SEGMENT_CLASSES = ('Phrase', 'Word', 'Syllable', 'Phone')
 
 LABEL_HASH_LEN = 16  
 LABEL_INDEX_LEN =  39
@@ -20,11 +29,33 @@ SPEAKER_AUDIO_LEN = struct.calcsize(SPEAKER_AUDIO_FMT)  # 16
 SEGMENT_KEY_LENGTH = struct.calcsize(SEGMENT_FMT)  # 22
 SEGMENT_LEN = SEGMENT_KEY_LENGTH
 TIME_SCAN_LEN = struct.calcsize(TIME_SCAN_FMT)  # 17
+INTERVAL_LEN = struct.calcsize(INTERVAL_FMT)  # 26
+
+# bin widths (as shifts, in ms) of the interval index levels: 4 s, 33 s,
+# 4.4 min, 35 min, 4.7 h, 37 h; the last level holds everything else
+INTERVAL_SHIFTS = (12, 15, 18, 21, 24, 27, 32)
+
+# key of the content identifier hash; another secret keeps the identifiers
+# of separately imported corpora apart
+CONTENT_ID_SECRET = b'phraser-content-id'
 
     
 def make_identifier():
     return os.urandom(8)
 
+def content_identifier(object_type, audio_id, speaker_id, start, end, label,
+    parent = b'', secret = CONTENT_ID_SECRET):
+    '''Deterministic identifier: keyed blake2b hash of a segment's content
+    and its parent identity (the parent identifier, or for a phrase the
+    digest of its tree). The same content always gets the same key.'''
+    h = hashlib.blake2b(digest_size = 8, key = secret)
+    parts = (object_type.encode(), audio_id, speaker_id,
+        struct.pack('>qq', start, end), label.encode('utf-8'), parent)
+    for part in parts:
+        h.update(struct.pack('>I', len(part)))
+        h.update(part)
+    return h.digest()
+
 def instance_to_rank(instance):
     '''Map an object to its single-letter type code.
     Supports: Audio, Phrase, Word, Syllable, Phone.
@@ -129,6 +160,11 @@ def pack_audio_key(audio_uuid):
     rank = CLASS_RANK_MAP['Audio']
     return struct.pack(AUDIO_FMT, rank, audio_uuid, rank)
 
+def pack_audio_prefix(audio_uuid):
+    '''Prefix of every main key of an audio: its own row and its
+    segments.'''
+    return bytes([CLASS_RANK_MAP['Audio']]) + audio_uuid
+
 def pack_audio_scan_prefix(audio_uuid, child_class):
     child_class_rank = CLASS_RANK_MAP[child_class]
     audio_rank = CLASS_RANK_MAP['Audio']
@@ -260,3 +296,193 @@ def label_index_key_to_instance_key(key):
     
 def label_index_key_to_rank(key):
     return key[0]
+
+
+# -------- interval index --------
+def interval_level_and_bin(start, end):
+    '''Return (level, bin) of the smallest interval-index bin holding the
+    closed interval [start, end].'''
+    for level, shift in enumerate(INTERVAL_SHIFTS):
+        if start >> shift == end >> shift: return level, start >> shift
+    return len(INTERVAL_SHIFTS) - 1, 0
+
+def pack_interval_key(audio_uuid, class_rank, start, end, segment_uuid):
+    level, bin_index = interval_level_and_bin(start, end)
+    return struct.pack(INTERVAL_FMT, audio_uuid, class_rank, level,
+        bin_index, start, segment_uuid)
+
+def segment_key_to_interval_key(key, end):
+    '''Interval index key of the segment row key with that end time.'''
+    audio_rank, audio_uuid, rank, start, segment_uuid = struct.unpack(
+        SEGMENT_FMT, key)
+    return pack_interval_key(audio_uuid, rank, start, end, segment_uuid)
+
+def pack_interval_bin_prefix(audio_uuid, class_rank, level, bin_index):
+    return struct.pack(INTERVAL_PREFIX_FMT, audio_uuid, class_rank, level,
+        bin_index)
+
+def interval_key_to_instance_key(key):
+    audio_uuid, rank, _, _, start, segment_uuid = struct.unpack(
+        INTERVAL_FMT, key)
+    return pack_segment_key(audio_uuid, rank, start, segment_uuid)
+
+def interval_key_to_start(key):
+    return struct.unpack_from('>I', key, 14)[0]
+
+def row_key_to_rank(key):
+    '''Class rank of a main-db row key (Audio, Speaker or segment), or
+    None for a key that is not a model row.'''
+    n = len(key)
+    if n == AUDIO_LEN and key[0] == key[9] == CLASS_RANK_MAP['Audio']:
+        return key[9]
+    if n == SPEAKER_LEN and key[0] == CLASS_RANK_MAP['Speaker']:
+        return key[0]
+    if is_segment_key(key): return key[9]
+    return None
+
+def is_segment_key(key):
+    '''True for a main-db segment row key (Phrase, Word, Syllable,
+    Phone); False for Audio, Speaker and foreign keys.'''
+    if len(key) != SEGMENT_LEN: return False
+    if key[0] != CLASS_RANK_MAP['Audio']: return False
+    return RANK_CLASS_MAP.get(key[9]) in SEGMENT_CLASSES
+
+
+# -------- parent -> child adjacency index --------
+def pack_child_key(parent_key, child_key):
+    '''Adjacency key: parent segment key + child segment key. All
+    children of one parent share the audio and class in their key, so
+    they sort by start time under the parent prefix.'''
+    return parent_key + child_key
+
+def child_key_to_instance_key(key):
+    return key[SEGMENT_LEN:]
+
+def segment_key_to_parent_key(key, parent_id, parent_start):
+    '''Key of the parent (one rank up) of the segment row key.'''
+    audio_uuid = key[1:9]
+    return pack_segment_key(audio_uuid, key[9] - 1, parent_start, parent_id)
+
+
+# -------- speaker / audio link indexes --------
+def pack_speaker_phrase_key(speaker_uuid, audio_uuid, start, phrase_uuid):
+    return struct.pack(SPEAKER_PHRASE_FMT, speaker_uuid, audio_uuid, start,
+        phrase_uuid)
+
+def speaker_phrase_key_to_instance_key(key):
+    speaker_uuid, audio_uuid, start, phrase_uuid = struct.unpack(
+        SPEAKER_PHRASE_FMT, key)
+    return pack_segment_key(audio_uuid, CLASS_RANK_MAP['Phrase'], start,
+        phrase_uuid)
+
+def speaker_audio_key_to_audio_speaker_key(key):
+    '''Reverse a speaker_audio link (speaker + audio) to audio + speaker.'''
+    return key[8:16] + key[:8]
+
+
+# -------- ordered label index --------
+# rank + escaped utf-8 label + terminator + instance key. 0x00 in the
+# label is escaped as 0x00 0xFF and the label ends in 0x00 0x01 (0x00 0x02
+# when cut at ORDERED_LABEL_MAX_BYTES), so byte order is label order
+# (utf-8 byte order is code point order, as for str) and a label sorts
+# before every longer label it is a prefix of.
+LABEL_END = b'\x00\x01'
+LABEL_CUT_END = b'\x00\x02'
+
+def _escape_label(label):
+    b = label.encode('utf-8')
+    cut = len(b) > ORDERED_LABEL_MAX_BYTES
+    b = b[:ORDERED_LABEL_MAX_BYTES].replace(b'\x00', b'\x00\xff')
+    return b, cut
+
+def pack_ordered_label_key(label, class_rank, key):
+    b, cut = _escape_label(label)
+    return bytes([class_rank]) + b + (LABEL_CUT_END if cut else LABEL_END) \
+        + key
+
+def ordered_label_prefix(label_prefix, class_rank):
+    '''Key prefix shared by every label starting with label_prefix.'''
+    return bytes([class_rank]) + _escape_label(label_prefix)[0]
+
+def ordered_label_upper_bound(label, class_rank):
+    '''A key above the keys of every label <= label.'''
+    return ordered_label_prefix(label, class_rank) + LABEL_CUT_END \
+        + b'\xff' * (SEGMENT_LEN + 1)
+
+def ordered_label_key_to_instance_key(key):
+    return key[-SEGMENT_LEN:]
+
+def ordered_label_key_to_label(key):
+    '''(label, end) of an ordered label key; end is the offset after
+    the terminator. A cut label comes back cut.'''
+    out = bytearray()
+    i = 1
+    while True:
+        byte = key[i]
+        if byte == 0:
+            if key[i + 1] == 0xff: out.append(0)
+            else: return out.decode('utf-8', errors = 'ignore'), i + 2
+            i += 2
+            continue
+        out.append(byte)
+        i += 1
+
+
+# -------- Audio / Speaker field index --------
+# rank + field name + 0x00 + escaped value + terminator + instance key;
+# values are encoded like ordered labels (non-str values as str(value))
+def field_index_prefix(class_rank, field):
+    return bytes([class_rank]) + field.encode('ascii') + b'\x00'
+
+def field_value_prefix(class_rank, field, value):
+    '''Key prefix of the entries of one field value.'''
+    if not isinstance(value, str): value = str(value)
+    b, cut = _escape_label(value)
+    return field_index_prefix(class_rank, field) + b + \
+        (LABEL_CUT_END if cut else LABEL_END)
+
+def pack_field_key(class_rank, field, value, key):
+    return field_value_prefix(class_rank, field, value) + key
+
+def field_key_to_instance_key(key):
+    if key[0] == CLASS_RANK_MAP['Speaker']: return key[-SPEAKER_LEN:]
+    return key[-AUDIO_LEN:]
+
+
+# -------- code bitmap index --------
+# ordinals number the rows of a class in the order they were indexed:
+#   b'o' + instance key                       -> ordinal (u32)
+#   b'k' + rank + ordinal (u32)               -> instance key
+#   b'n' + rank                               -> next ordinal (u32)
+#   b'b' + rank + field + 0x00 + code + chunk -> packed bits of the chunk
+def ordinal_key(key):
+    return b'o' + key
+
+def ordinal_to_key_key(rank, ordinal):
+    return b'k' + bytes([rank]) + ordinal.to_bytes(4, 'big')
+
+def next_ordinal_key(rank):
+    return b'n' + bytes([rank])
+
+def bitmap_prefix(rank, field, code):
+    return b'b' + bytes([rank]) + field.encode('ascii') + b'\x00' + \
+        bytes([code])
+
+def pack_bitmap_key(rank, field, code, chunk):
+    return bitmap_prefix(rank, field, code) + chunk.to_bytes(4, 'big')
+
+
+# -------- duration index --------
+# rank + duration (u32, end - start) + instance key
+def duration_prefix(class_rank, duration):
+    duration = min(max(duration, 0), MAX_DURATION)
+    return bytes([class_rank]) + duration.to_bytes(4, 'big')
+
+def pack_duration_key(class_rank, duration, key):
+    return duration_prefix(class_rank, duration) + key
+
+def duration_key_to_duration(key):
+    return int.from_bytes(key[1:5], 'big')
+
+def duration_key_to_instance_key(key):
+    return key[5:]
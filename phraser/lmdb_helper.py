@@ -1,33 +1,332 @@
+from contextlib import contextmanager
+import functools
+from operator import itemgetter
 from pathlib import Path
 import pickle
+import time
 
 import lmdb
 from progressbar import progressbar
 
+from . import index_helper
 from . import key_helper
 from . import locations
+from . import struct_value
 
 default_db_name = 'main'
+meta_db_name = 'meta'
+
+
+class ReadOnlyStoreError(RuntimeError):
+    pass
+
+
+def grows_map(method):
+    '''Decorator for DB write methods: when LMDB runs out of map space
+    (MapFullError) double the map size and run the method again; when
+    another process grew the map (MapResizedError) adopt its size. Not
+    retried inside a session or snapshot (the map cannot be resized
+    while a transaction is open); a session grows the map when it
+    aborts on MapFullError, so running it again succeeds.'''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        while True:
+            try: return method(self, *args, **kwargs)
+            except lmdb.MapResizedError:
+                if not self._can_resize_map(): raise
+                self.env.set_mapsize(0)
+            except lmdb.MapFullError:
+                if not self._can_resize_map(): raise
+                self._grow_map()
+    return wrapper
+
 
 class DB:
     def __init__(self, path=locations.cgn_lmdb, map_size=1024**4,
-        db_names = ['main', 'speaker_audio', 'label_segment']):
+        db_names = ['main', 'speaker_audio', 'label_segment'],
+        readonly = False, readahead = True, max_readers = 126,
+        index_fields = None, change_log_limit = None):
+        '''
+        readonly:     open without write access and without the lock file
+                      (lmdb lock=False): many reader processes, no writer
+                      interference; only safe while no process writes
+        readahead:    OS readahead on the data file; switch off for random
+                      access to databases much larger than RAM
+        max_readers:  maximum number of simultaneous read transactions
+        map_size:     initial memory map size in bytes; write methods
+                      double it when the map is full (see grows_map)
+        index_fields: {'Audio': fields, 'Speaker': fields} kept in the
+                      field indexes (default
+                      index_helper.DEFAULT_INDEX_FIELDS)
+        change_log_limit: keep at most this many change-log entries,
+                      dropping the oldest on write (None: keep all until
+                      trim_change_log)
+        '''
         self.path = path
         self.map_size = map_size
-        self.db_names = db_names
-        self.max_dbs = len(db_names)
+        self.readonly = readonly
+        self.readahead = readahead
+        self.max_readers = max_readers
+        self.index_fields = index_fields
+        self.change_log_limit = change_log_limit
+        self.indexes = index_helper.make_indexes(index_fields,
+            change_log_limit)
+        self._snapshot_txn = None
+        self._session_txn = None
+        index_db_names = [index.db_name for index in self.indexes]
+        self.db_names = list(db_names) + index_db_names + [meta_db_name]
+        self.max_dbs = len(self.db_names)
         self.open()
 
     def open(self):
         self.close()
         env, db = open_lmdb(self.path, self.map_size, self.db_names, 
-            self.max_dbs)
+            self.max_dbs, readonly = self.readonly,
+            readahead = self.readahead, max_readers = self.max_readers)
         self.env = env
         self.db = db
+        if not self.readonly: self._ensure_indexes()
+
+    @contextmanager
+    def snapshot(self):
+        '''Pin one read transaction for every read inside the block.
+        All DB reads (load, load_many, key_exists, key scans) see the same
+        database state and share the transaction instead of opening one
+        per call. Writes made meanwhile use their own transactions and
+        are not visible inside the block. Nested blocks reuse the outer
+        snapshot. The snapshot belongs to the thread that opened it.
+        '''
+        if self._snapshot_txn is not None:
+            yield self
+            return
+        self._snapshot_txn = self.env.begin()
+        try: yield self
+        finally: self._end_snapshot()
+
+    def _end_snapshot(self):
+        txn = getattr(self, '_snapshot_txn', None)
+        if txn is None: return
+        self._snapshot_txn = None
+        txn.abort()
+
+    @contextmanager
+    def session(self, commit_every = None):
+        '''Pin one write transaction for every DB write inside the block
+        and commit it once on exit (abort if the block raises), instead of
+        one commit per write call. Reads inside the block go through the
+        same transaction, so they see the block's own writes. Each write
+        call runs in a child transaction: one that fails (e.g. KeyError on
+        an existing key) leaves nothing behind and the session goes on.
+        commit_every:  commit after this many write calls and continue in
+                       a fresh transaction, bounding the size of one
+                       commit; None commits only on exit
+        Nested blocks join the outer session.
+        '''
+        if self._session_txn is not None:
+            yield self
+            return
+        self._session_txn = self._open_write_txn()
+        self._session_writes = 0
+        self._session_commit_every = commit_every
+        try: yield self
+        except BaseException as e:
+            self._end_session(commit = False)
+            if isinstance(e, lmdb.MapFullError) and self._can_resize_map():
+                self._grow_map()
+            raise
+        self._end_session(commit = True)
+
+    def _end_session(self, commit):
+        txn = getattr(self, '_session_txn', None)
+        if txn is None: return
+        self._session_txn = None
+        if commit: txn.commit()
+        else: txn.abort()
+
+    def _session_wrote(self):
+        '''Count one write call; commit the chunk when commit_every is
+        reached.'''
+        self._session_writes += 1
+        every = self._session_commit_every
+        if every is None or self._session_writes < every: return
+        self._session_txn.commit()
+        self._session_txn = self.env.begin(write=True)
+        self._session_writes = 0
+
+    @contextmanager
+    def _begin_read(self):
+        '''Yield the open session transaction, the pinned snapshot
+        transaction, or a fresh read transaction for this call.'''
+        if self._session_txn is not None:
+            yield self._session_txn
+            return
+        if self._snapshot_txn is not None:
+            yield self._snapshot_txn
+            return
+        with self.env.begin() as txn:
+            yield txn
+
+    @contextmanager
+    def _begin_write(self):
+        '''Yield a write transaction committed on exit (aborted on error);
+        every DB write goes through here. Inside a session it is a child
+        of the session transaction.'''
+        if self._session_txn is not None:
+            parent = self._session_txn
+            with self.env.begin(write=True, parent=parent) as txn:
+                yield txn
+            self._session_wrote()
+            return
+        with self._open_write_txn() as txn:
+            yield txn
+
+    def _open_write_txn(self):
+        if self.readonly:
+            m = f'LMDB store at {self.path} is opened read-only.'
+            raise ReadOnlyStoreError(m)
+        return self.env.begin(write=True)
+
+    def _can_resize_map(self):
+        return self._session_txn is None and self._snapshot_txn is None
+
+    def _grow_map(self):
+        self.map_size = self.env.info()['map_size'] * 2
+        print(f'LMDB map full, growing map size to {self.map_size} bytes.')
+        self.env.set_mapsize(self.map_size)
+
+    def stats(self):
+        '''Environment statistics, e.g. to see how much of the file is
+        free after many replace/delete cycles.
+        file_size, map_size:  bytes of data.mdb and of the memory map
+        total_pages:          pages in use or on the free list
+        used_pages:           pages holding data (meta pages, sub-db
+                              tree pages)
+        free_pages:           total_pages - used_pages: free pages LMDB
+                              reuses for new writes (or still held for
+                              open readers); compact() drops them
+        sub_dbs:              per sub-db entries, depth and pages
+        '''
+        info = self.env.info()
+        env_stat = self.env.stat()
+        used_pages = 2 + tree_pages(env_stat)
+        sub_dbs = {}
+        with self._begin_read() as txn:
+            for name, db in self.db.items():
+                stat = txn.stat(db)
+                sub_dbs[name] = {'entries': stat['entries'],
+                    'depth': stat['depth'], 'pages': tree_pages(stat)}
+                used_pages += sub_dbs[name]['pages']
+        total_pages = info['last_pgno'] + 1
+        return {'file_size': data_file_size(self.path),
+            'map_size': info['map_size'], 'page_size': env_stat['psize'],
+            'total_pages': total_pages, 'used_pages': used_pages,
+            'free_pages': total_pages - used_pages,
+            'readers': info['num_readers'],
+            'max_readers': info['max_readers'], 'sub_dbs': sub_dbs}
+
+    def compact(self, dest):
+        '''Write a compacted copy of the database (free pages dropped,
+        trees rewritten in order) to the directory dest, from a
+        consistent read snapshot; writers may go on meanwhile. Writes of
+        an open session are not included.
+        Returns {'path', 'before', 'after'}: data file sizes in bytes.
+        '''
+        dest = Path(dest)
+        dest.mkdir(parents=True, exist_ok=True)
+        self.env.copy(str(dest), compact = True)
+        return {'path': str(dest), 'before': data_file_size(self.path),
+            'after': data_file_size(dest)}
+
+    def extract(self, dest, audio_ids = (), speaker_ids = ()):
+        '''Copy a subset to a new database at the directory dest: whole
+        recordings (the key range 0x00 + audio_id of each audio id and of
+        each audio the speakers are linked to or speak in), the speakers
+        of those recordings and the given speakers, their speaker_audio
+        links and label-index entries. Rows are copied as raw bytes with
+        sorted append writes from one read snapshot, in one transaction;
+        label-index keys and the derived indexes of dest come from the raw
+        rows, nothing is built as an object.
+        Returns {'path', 'audios', 'speakers', 'rows'}.'''
+        indexed = {name: self.has_index(name)
+            for name in ('audio_speaker', 'speaker_phrase')}
+        phrase_rank = key_helper.CLASS_RANK_MAP['Phrase']
+        with self._begin_read() as txn:
+            audio_ids = set(audio_ids)
+            for speaker_id in speaker_ids:
+                audio_ids.update(self._speaker_audio_ids(txn, speaker_id,
+                    indexed['speaker_phrase']))
+            audio_ids = sorted(audio_ids)
+            speaker_ids = set(speaker_ids)
+            main_rows, links = [], []
+            cursor = txn.cursor(db = self.db[default_db_name])
+            for audio_id in audio_ids:
+                prefix = key_helper.pack_audio_prefix(audio_id)
+                if not cursor.set_range(prefix): continue
+                for key, value in cursor:
+                    if not key.startswith(prefix): break
+                    main_rows.append((key, value))
+                    if key_helper.row_key_to_rank(key) != phrase_rank:
+                        continue
+                    fixed = struct_value.unpack_fixed('Phrase', value)
+                    speaker_ids.add(fixed['speaker_id'])
+                audio_links = self._audio_links(txn, audio_id,
+                    indexed['audio_speaker'])
+                speaker_ids.update(link[:8] for link in audio_links)
+                links.extend(audio_links)
+            for speaker_id in sorted(speaker_ids):
+                key = key_helper.speaker_id_to_key(speaker_id)
+                value = txn.get(key, db = self.db[default_db_name])
+                if value is not None: main_rows.append((key, value))
+        label_keys = []
+        for key, value in main_rows:
+            if not key_helper.is_segment_key(key): continue
+            object_type = key_helper.key_to_object_type(key)
+            text = struct_value.unpack_label(object_type, value)
+            if text is None: continue
+            label_keys.append((key_helper.label_to_label_index_key(text,
+                object_type, key), b''))
+        link_rows = [(link, b'') for link in sorted(links)]
+        target = DB(path = dest, map_size = self.map_size,
+            index_fields = self.index_fields,
+            change_log_limit = self.change_log_limit)
+        try: target._append_copy(main_rows, sorted(label_keys), link_rows)
+        finally: target.close()
+        return {'path': str(dest), 'audios': len(audio_ids),
+            'speakers': len(speaker_ids), 'rows': len(main_rows)}
+
+    def _append_copy(self, main_rows, label_rows, link_rows):
+        '''Write sorted rows into this empty database with append puts
+        and build its derived indexes from them, in one transaction.'''
+        # decoded once for every index
+        sources = {default_db_name: index_helper.as_batch(main_rows),
+            'speaker_audio': index_helper.as_batch(link_rows)}
+        with self._begin_write() as txn:
+            if txn.stat(self.db[default_db_name])['entries']:
+                raise ValueError(f'{self.path} is not empty')
+            for db_name, rows in [(default_db_name, main_rows),
+                ('label_segment', label_rows), ('speaker_audio', link_rows)]:
+                cursor = txn.cursor(db = self.db[db_name])
+                cursor.putmulti(rows, append = True)
+            for index in self.indexes:
+                rows = sources[index.source_db_name]
+                db = self.db[index.db_name]
+                index.clear(txn, db)
+                index.build(txn, db, rows)
+
+    def _speaker_audio_ids(self, txn, speaker_id, indexed):
+        '''Ids of the audios a speaker is linked to or speaks in.'''
+        prefix = key_helper.make_speaker_scan_prefix(speaker_id)
+        audio_ids = set(_skip_scan_ids(txn, self.db['speaker_audio'],
+            prefix))
+        if indexed: audio_ids.update(_skip_scan_ids(txn,
+            self.db['speaker_phrase'], prefix))
+        return audio_ids
 
     def close(self):
         env = getattr(self, 'env', None)
         if env is None: return
+        self._end_session(commit = False)
+        self._end_snapshot()
         env.close()
         self.env = None
         self.db = {}
@@ -41,7 +340,7 @@ class DB:
         '''
         keys = []
         db = self.db[db_name]
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cursor = txn.cursor(db = db)
             for k in cursor.iternext(keys=True, values=False):
                 keys.append(k)
@@ -59,12 +358,12 @@ class DB:
         db_name:   Name of the LMDB database to use (default 'main').
         '''
         db = self.db[db_name]
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             return txn.get(key, db = db) is not None
 
     def check_any_key_exist(self, keys, db_name = 'main'):
         db = self.db[db_name]
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             for key in keys:
                 if txn.get(key, db=db) is not None: return True
         return False
@@ -75,7 +374,7 @@ class DB:
         db_name:   Name of the LMDB database to use (default 'main').
         '''
         db = self.db[db_name]
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             raw = txn.get(key, db= db)
             if raw is None: return None
         return raw
@@ -85,15 +384,28 @@ class DB:
         Load multiple LMDB values in a single read transaction.
         keys:       List of keys (bytes) to retrieve.
         db_name:   Name of the LMDB database to use (default 'main').
+
+        Keys are fetched in sorted order with one cursor, so the B-tree
+        is walked front to back instead of in the caller's (often
+        random) order; values come back in the order of keys, None for
+        a missing key.
         """
+        db = self.db[db_name]
+        with self._begin_read() as txn:
+            return get_many(txn, db, keys)
 
-        objs = [[] for _ in range(len(keys))]
+    @contextmanager
+    def load_many_buffers(self, keys, db_name = 'main'):
+        '''Like load_many, but yield zero-copy memoryviews into the
+        memory map instead of bytes copies. The views are only valid
+        inside the with block (they use their own read transaction).
+        with db.load_many_buffers(keys) as values: ...
+        '''
         db = self.db[db_name]
-        with self.env.begin() as txn:
-            for index, key in enumerate(keys):
-                objs[index] = txn.get(key, db = db)
-        return objs
+        with self.env.begin(buffers = True) as txn:
+            yield get_many(txn, db, keys)
 
+    @grows_map
     def write(self, key, value, db_name = 'main', overwrite = False):
         '''Write byte value to LMDB under byte key.
         key:       Key to write value under. 
@@ -102,16 +414,17 @@ class DB:
         overwrite:  If False, raises an error if the key already exists. 
                     If True, overwrites existing value.
         '''
-        if not overwrite:
-            exists= self.key_exists(key, db_name = db_name)
-            if exists:
+        db = self.db[db_name]
+        with self._begin_write() as txn:
+            # checked in the write transaction: a pinned snapshot would
+            # not see keys written after it was opened
+            if not overwrite and txn.get(key, db = db) is not None:
                 m = f'Key {key} already exists in LMDB store at {db_name}. '
                 m += f'Use overwrite=True to overwrite.'
                 raise KeyError(m)
-        db = self.db[db_name]
-        with self.env.begin(write=True) as txn:
-            txn.put(key, value, db = db)  
+            self._write_rows(txn, [(key, value)], db_name = db_name)
 
+    @grows_map
     def write_many(self, keys, values, db_name = 'main', overwrite = False):
         '''
         key:       Key to write value under. 
@@ -120,17 +433,33 @@ class DB:
         overwrite:  If False, raises an error if the key already exists. 
                     If True, overwrites existing value.
         '''
-        db = self.db[db_name]
         message = f'At least one key already exists in LMDB store at '
         message += f'{db_name}. Use overwrite=True to overwrite. '
         message += 'written nothing.'
         items = zip(keys, values)
-        item_count = len(keys)
-        with self.env.begin(write=True) as txn:
-            for k, v in progressbar(items, max_value=item_count):
-                written = txn.put(k, v, db=db, overwrite=overwrite)
-                if not written: raise KeyError(message)
+        with self._begin_write() as txn:
+            written = self._write_rows(txn, items, overwrite, db_name,
+                progress = WriteProgress(len(keys)))
+            if not written: raise KeyError(message)
+
+    @grows_map
+    def write_with_label_links(self, keys, values, label_keys,
+            overwrite = False):
+        '''Write main rows and their label-index links in one
+        transaction. Raises KeyError, writing nothing, when a key exists
+        and overwrite is False.'''
+        label = self.db['label_segment']
+        message = 'At least one key already exists in LMDB store at '
+        message += 'main. Use overwrite=True to overwrite. written nothing.'
+        items = zip(keys, values)
+        with self._begin_write() as txn:
+            if not self._write_rows(txn, items, overwrite,
+                progress = WriteProgress(len(keys))):
+                raise KeyError(message)
+            label_rows = [(key, b'') for key in sorted(label_keys)]
+            put_sorted(txn, label, label_rows)
 
+    @grows_map
     def replace_many(self, delete_keys, delete_label_keys, keys, values,
             label_keys):
         '''Replace rows atomically: delete old main rows and their
@@ -139,22 +468,200 @@ class DB:
         ones, never neither. No existence checks: the caller decides
         what is replaced. A key in both delete_keys and keys ends up
         holding its new value.'''
-        main = self.db['main']
         label = self.db['label_segment']
-        with self.env.begin(write=True) as txn:
-            for key in delete_keys:
-                txn.delete(key, db = main)
+        with self._begin_write() as txn:
+            self._delete_rows(txn, delete_keys)
             for key in delete_label_keys:
                 txn.delete(key, db = label)
-            for key, value in zip(keys, values):
-                txn.put(key, value, db = main)
-            for key in label_keys:
-                txn.put(key, b'', db = label)
+            self._write_rows(txn, zip(keys, values))
+            label_rows = [(key, b'') for key in sorted(label_keys)]
+            put_sorted(txn, label, label_rows)
+
+    def _write_rows(self, txn, items, overwrite = True,
+            db_name = default_db_name, progress = None):
+        '''Put (key, value) rows in db_name and update the derived
+        indexes of that sub-db in the same transaction. Returns False,
+        having written a partial batch the caller must abort, when a key
+        exists and overwrite is False.
+        Rows are written in key order; new rows (overwrite False) go in
+        through cursor.putmulti, in append mode when they all sort after
+        the last key of db (a fresh database, a new recording at the end).
+        progress:  WriteProgress reporting rows per second, or None'''
+        db = self.db[db_name]
+        # stable: a key repeated in the batch keeps its last value
+        rows = sorted(items, key = itemgetter(0))
+        if progress is None: progress = WriteProgress(len(rows), False)
+        if not overwrite:
+            for start in range(0, len(rows), progress.chunk_size):
+                chunk = rows[start:start + progress.chunk_size]
+                if not put_sorted(txn, db, chunk, overwrite = False):
+                    return False
+                progress.update(len(chunk))
+            progress.done()
+            self._update_indexes(txn, [], rows, db_name)
+            return True
+        removed, added = [], {}
+        for key, value in rows:
+            old = txn.replace(key, value, db = db)
+            # a key repeated in the batch replaces its own new row
+            if old is not None and key not in added:
+                removed.append((key, old))
+            added[key] = value
+            progress.update(1)
+        progress.done()
+        self._update_indexes(txn, removed, list(added.items()), db_name)
+        return True
+
+    def _delete_rows(self, txn, keys, db_name = default_db_name):
+        '''Delete rows of db_name and their derived index entries in the
+        same transaction; missing keys are skipped.'''
+        db = self.db[db_name]
+        removed = []
+        for key in keys:
+            old = txn.pop(key, db = db)
+            if old is not None: removed.append((key, old))
+        self._update_indexes(txn, removed, [], db_name)
+
+    def _update_indexes(self, txn, removed, added,
+            db_name = default_db_name):
+        if not removed and not added: return
+        # decoded once here for every index
+        removed = index_helper.as_batch(removed)
+        added = index_helper.as_batch(added)
+        for index in self.indexes:
+            if index.source_db_name != db_name: continue
+            index.update(txn, self.db[index.db_name], removed, added)
+
+    def _ensure_indexes(self):
+        '''Build each derived index this database has not built yet,
+        i.e. one written before the index existed. A one-off scan of
+        main per missing index; later writes keep it current.'''
+        self._drop_unused_field_indexes()
+        for index in self.indexes:
+            if not self.index_built(index): self.build_index(index)
+
+    def _drop_unused_field_indexes(self):
+        '''Forget the field indexes built for other index_fields: this
+        open does not maintain them, so their entries would miss its
+        writes. Their markers go, and the entries of classes without a
+        field index now.'''
+        meta = self.db[meta_db_name]
+        names = {b'built:' + index.name.encode() for index in self.indexes}
+        prefix = b'built:field:'
+        with self._begin_read() as txn:
+            stale = [key for key in index_helper.prefix_keys(txn, meta,
+                prefix) if key not in names]
+        if not stale: return
+        kept = {index.object_type for index in self.indexes
+            if isinstance(index, index_helper.FieldIndex)}
+        with self._begin_write() as txn:
+            for marker in stale:
+                txn.delete(marker, db = meta)
+                object_type = marker[len(prefix):].split(b':')[0].decode()
+                if object_type in kept: continue
+                index = index_helper.FieldIndex(object_type, ())
+                index.clear(txn, self.db[index.db_name])
+
+    def index_built(self, index):
+        '''True if index exists and is complete. A read-only database
+        written by an older version may lack it; its users then fall
+        back to scanning main.'''
+        if index.db_name not in self.db: return False
+        if meta_db_name not in self.db: return False
+        marker = b'built:' + index.name.encode()
+        return self.key_exists(marker, db_name = meta_db_name)
+
+    def has_index(self, name):
+        for index in self.indexes:
+            if index.name == name: return self.index_built(index)
+        return False
+
+    @grows_map
+    def build_index(self, index, batch_size = 100_000):
+        '''(Re)build one derived index from the rows of its source
+        sub-db (main for most), in one transaction.'''
+        source = self.db[index.source_db_name]
+        db = self.db[index.db_name]
+        meta = self.db[meta_db_name]
+        marker = b'built:' + index.name.encode()
+        with self._begin_write() as txn:
+            n_rows = txn.stat(source)['entries']
+            if n_rows: print(f'Building {index.name} index for {n_rows} rows.')
+            index.clear(txn, db)
+            if index.family is not None:
+                family = b'built:' + index.family.encode()
+                for key in index_helper.prefix_keys(txn, meta, family):
+                    txn.delete(key, db = meta)
+            rows = []
+            for key, value in txn.cursor(db = source):
+                rows.append((key, value))
+                if len(rows) == batch_size:
+                    index.build(txn, db, rows)
+                    rows = []
+            index.build(txn, db, rows)
+            txn.put(marker, b'', db = meta)
+
+    def rebuild_indexes(self):
+        '''Rebuild every derived index from its source rows.'''
+        for index in self.indexes:
+            self.build_index(index)
+
+    def overlapping_keys(self, audio_id, object_type, start, end):
+        '''Return keys of object_type segments in the audio that overlap
+        the closed window [start, end] (including segments starting
+        before it), ordered by start time. Uses the interval index, so
+        the cost does not grow with the window's offset in the audio.'''
+        if not self.has_index('interval'):
+            return self._overlapping_keys_by_scan(audio_id, object_type,
+                start, end)
+        db = self.db['interval']
+        with self._begin_read() as txn:
+            return index_helper.overlapping_keys(txn, db, audio_id,
+                object_type, start, end)
+
+    def _overlapping_keys_by_scan(self, audio_id, object_type, start, end):
+        '''overlapping_keys without the interval index: scan every row
+        starting up to end and check its end in the raw value.'''
+        keys = list(self.time_range_keys(audio_id, object_type, 0, end))
+        values = self.load_many(keys)
+        overlapping = []
+        for key, value in zip(keys, values):
+            fixed = struct_value.unpack_fixed(object_type, value)
+            if fixed['end'] >= start: overlapping.append(key)
+        return overlapping
+
+    def instance_to_overlapping_keys(self, instance, child_class = None):
+        '''Keys of child_class segments overlapping instance's time range,
+        ordered by start time. A superset of instance_to_child_keys: it
+        also finds segments that start before the instance.'''
+        if child_class is None: child_class = instance.child_class_name
+        return self.overlapping_keys(instance.audio_id, child_class,
+            instance.start, instance.end)
+
+    def instance_to_owned_child_keys(self, instance):
+        '''Keys of the segments whose parent link points at instance,
+        ordered by start time: one prefix scan of the child index, so
+        other speakers' overlapping segments are never read. Without the
+        index (read-only store on an older database) the overlapping
+        candidates are filtered by their stored parent_id.'''
+        parent_key = key_helper.instance_to_key(instance)
+        if self.has_index('child'):
+            with self._begin_read() as txn:
+                return index_helper.child_keys(txn, self.db['child'],
+                    parent_key)
+        candidates = self.instance_to_overlapping_keys(instance)
+        values = self.load_many(candidates)
+        child_class = instance.child_class_name
+        keys = []
+        for key, value in zip(candidates, values):
+            fixed = struct_value.unpack_fixed(child_class, value)
+            if fixed['parent_id'] == instance.identifier: keys.append(key)
+        return keys
 
     def audio_id_to_child_keys(self, audio_id, child_class = 'Phrase'):
         db = self.db['main']
         prefix = key_helper.pack_audio_scan_prefix(audio_id, child_class)
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cur = txn.cursor(db = db)
             if not cur.set_range(prefix):
                 return
@@ -163,10 +670,50 @@ class DB:
                     break
                 yield k  # or (k, v)
 
+    def iter_class_rows(self, object_type):
+        '''Yield (key, value) of every object_type segment row in key
+        order: per audio one seek and one contiguous range, so rows of
+        other classes are never read.'''
+        db = self.db[default_db_name]
+        with self._begin_read() as txn:
+            audio_prefix = bytes([key_helper.CLASS_RANK_MAP['Audio']])
+            for audio_id in _skip_scan_ids(txn, db, audio_prefix):
+                prefix = key_helper.pack_audio_scan_prefix(audio_id,
+                    object_type)
+                cursor = txn.cursor(db = db)
+                if not cursor.set_range(prefix): continue
+                for key, value in cursor:
+                    if not key.startswith(prefix): break
+                    yield key, value
+
+    def audio_rows(self, audio_ids):
+        '''[(key, value)] of every main row of the audios (the audio row
+        and all its segments) in key order: one contiguous range scan
+        per audio.'''
+        db = self.db[default_db_name]
+        rows = []
+        with self._begin_read() as txn:
+            cursor = txn.cursor(db = db)
+            for audio_id in sorted(audio_ids):
+                prefix = key_helper.pack_audio_prefix(audio_id)
+                if not cursor.set_range(prefix): continue
+                for key, value in cursor:
+                    if not key.startswith(prefix): break
+                    rows.append((key, value))
+        return rows
+
+    def speaker_keys(self):
+        '''Keys of all speakers: one range scan of the speaker rows,
+        which sort after every audio row.'''
+        prefix = bytes([key_helper.CLASS_RANK_MAP['Speaker']])
+        with self._begin_read() as txn:
+            return index_helper.prefix_keys(txn, self.db[default_db_name],
+                prefix)
+
     def label_to_segment_keys(self, label, object_type):
         db = self.db['label_segment']
         prefix = key_helper.label_to_label_index_prefix(label, object_type)
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cur = txn.cursor(db = db)
             if not cur.set_range(prefix):
                 return
@@ -179,6 +726,163 @@ class DB:
 
 
 
+    def label_prefix_keys(self, object_type, prefix):
+        '''Keys of object_type segments whose label starts with prefix,
+        in label order: one range scan of the ordered label index.'''
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        start = key_helper.ordered_label_prefix(prefix, rank)
+        if not self.has_index('label_order'):
+            rows = self._label_scan(object_type,
+                lambda label: label.startswith(prefix))
+            return [key for _, key in rows]
+        with self._begin_read() as txn:
+            return index_helper.ordered_label_keys(txn,
+                self.db['label_order'], start, index_helper.prefix_end(start))
+
+    def label_range_keys(self, object_type, low = None, high = None):
+        '''Keys of object_type segments with low <= label <= high (None:
+        open end), in label order. Labels longer than the index keeps
+        (key_helper.ORDERED_LABEL_MAX_BYTES) are matched on their cut
+        form, so near the bounds a few extra keys may come back.'''
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        if not self.has_index('label_order'):
+            rows = self._label_scan(object_type, lambda label:
+                (low is None or label >= low) and
+                (high is None or label <= high))
+            return [key for _, key in rows]
+        start, stop = self._label_bounds(rank, low, high)
+        with self._begin_read() as txn:
+            return index_helper.ordered_label_keys(txn,
+                self.db['label_order'], start, stop)
+
+    def labels(self, object_type, prefix = ''):
+        '''Sorted distinct labels of object_type (the vocabulary),
+        optionally only those starting with prefix; one seek per label.
+        Labels longer than the index keeps come back cut.'''
+        if not self.has_index('label_order'):
+            rows = self._label_scan(object_type,
+                lambda label: label.startswith(prefix))
+            return sorted({label for label, _ in rows})
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        start = key_helper.ordered_label_prefix(prefix, rank)
+        with self._begin_read() as txn:
+            return index_helper.ordered_labels(txn, self.db['label_order'],
+                start, index_helper.prefix_end(start))
+
+    def field_index(self, object_type, field):
+        '''The built field index of object_type holding field, or None.'''
+        for index in self.indexes:
+            if not isinstance(index, index_helper.FieldIndex): continue
+            if index.object_type != object_type: continue
+            if field in index.fields and self.index_built(index):
+                return index
+        return None
+
+    def field_keys(self, object_type, field, value):
+        '''Sorted keys of the object_type (Audio or Speaker) instances whose
+        field equals value, from the field index; None when the field is
+        not indexed. Values longer than the index keeps may match more.'''
+        index = self.field_index(object_type, field)
+        if index is None: return None
+        prefix = key_helper.field_value_prefix(index.rank, field, value)
+        with self._begin_read() as txn:
+            keys = index_helper.prefix_keys(txn, self.db[index.db_name],
+                prefix)
+            return sorted(key_helper.field_key_to_instance_key(key)
+                for key in keys)
+
+    def bitmap_keys(self, object_type, conditions):
+        '''Sorted keys of object_type segments matching conditions
+        ({code field: codes}, e.g. {'stress_code': [1, 2]}) from the code
+        bitmap index, without reading main rows; None when a field is not
+        in index_helper.BITMAP_FIELDS or the index is not built.'''
+        fields = index_helper.BITMAP_FIELDS.get(object_type, ())
+        if not all(field in fields for field in conditions): return None
+        if not self.has_index('code_bitmap'): return None
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        with self._begin_read() as txn:
+            return index_helper.bitmap_keys(txn, self.db['code_bitmap'],
+                rank, conditions)
+
+    def duration_keys(self, object_type, low = None, high = None,
+        limit = None, longest = False):
+        '''Keys of object_type segments with low <= duration <= high (ms,
+        None: open end) in duration order, shortest first or longest
+        first, at most limit: one range scan of the duration index.
+        Without the index every row of the class is decoded.'''
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        if not self.has_index('duration'):
+            return self._duration_scan(object_type, low, high, limit, longest)
+        with self._begin_read() as txn:
+            return index_helper.duration_keys(txn, self.db['duration'], rank,
+                low, high, limit, longest)
+
+    def _duration_scan(self, object_type, low, high, limit, longest):
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        rows = []
+        with self._begin_read() as txn:
+            for key, value in txn.cursor(db = self.db[default_db_name]):
+                if key_helper.row_key_to_rank(key) != rank: continue
+                fixed = struct_value.unpack_fixed(object_type, value)
+                duration = fixed['end'] - key_helper.key_to_start(key)
+                if low is not None and duration < low: continue
+                if high is not None and duration > high: continue
+                rows.append((duration, key))
+        rows.sort(reverse = longest)
+        return [key for _, key in rows[:limit]]
+
+    def last_change_seq(self):
+        '''Sequence number of the last logged main-row change (0 if
+        none); one cursor step, cheap enough to poll. A read-only open of
+        a database written before the change log has no log: 0.'''
+        if 'change_log' not in self.db: return 0
+        with self._begin_read() as txn:
+            return index_helper.last_change_seq(txn, self.db['change_log'])
+
+    def changes_since(self, seq):
+        '''[(seq, op, key)] of the main-row changes after seq, op
+        index_helper.CHANGE_PUT or CHANGE_DELETE. Raises LookupError when
+        entries after seq were trimmed from the log. Without a log
+        (read-only, older database) there are no changes.'''
+        if 'change_log' not in self.db: return []
+        db = self.db['change_log']
+        with self._begin_read() as txn:
+            first = index_helper.first_change_seq(txn, db)
+            if first > seq + 1:
+                m = f'change log starts at {first}, changes after {seq} '
+                m += 'were trimmed'
+                raise LookupError(m)
+            return index_helper.changes_since(txn, db, seq)
+
+    @grows_map
+    def trim_change_log(self, upto_seq):
+        '''Remove change-log entries up to and including upto_seq (once
+        every reader has caught up past it). The last entry is kept so
+        numbering continues.'''
+        db = self.db['change_log']
+        with self._begin_write() as txn:
+            last = index_helper.last_change_seq(txn, db)
+            index_helper.trim_changes(txn, db, min(upto_seq, last - 1))
+
+    def _label_bounds(self, rank, low, high):
+        if low is None: start = bytes([rank])
+        else: start = key_helper.ordered_label_prefix(low, rank)
+        if high is None: stop = bytes([rank + 1])
+        else: stop = key_helper.ordered_label_upper_bound(high, rank)
+        return start, stop
+
+    def _label_scan(self, object_type, predicate):
+        '''Fallback without the ordered label index: decode the label of
+        every row of the class; sorted [(label, key)] of the matches.'''
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        matches = []
+        with self._begin_read() as txn:
+            for key, value in txn.cursor(db = self.db[default_db_name]):
+                if key_helper.row_key_to_rank(key) != rank: continue
+                label = struct_value.unpack_label(object_type, value)
+                if predicate(label): matches.append((label, key))
+        return sorted(matches)
+
     def instance_to_child_keys(self, instance, child_class = None):
         '''Yield keys for child objects of instance, ordered by start time.
         instance:      An Segment instance (Phrase, Word, Syllable).
@@ -198,7 +902,7 @@ class DB:
             child_class, start)
         end_prefix = key_helper.make_time_scan_prefix(audio_id,
             child_class, end)
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cur = txn.cursor(db = db)
             if not cur.set_range(start_prefix):
                 return
@@ -224,17 +928,32 @@ class DB:
     def object_type_to_keys_dict(self):
         db = self.db['main']
         d = {k:[] for k in key_helper.RANK_CLASS_MAP.values()}
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cursor = txn.cursor(db = db)
             for key, _ in cursor:
                 object_type = key_helper.RANK_CLASS_MAP[key[9]]
                 d[object_type].append(key)
         return d
 
+    def rank_to_count_dict(self):
+        '''Return {rank: number of main rows}, read from the class counts
+        in the meta sub-db instead of scanning main.'''
+        if not self.has_index('class_count'):
+            d = self.rank_to_keys_dict()
+            return {rank: len(keys) for rank, keys in d.items()}
+        db = self.db[meta_db_name]
+        with self._begin_read() as txn:
+            return {rank: index_helper.read_count(txn, db, rank)
+                for rank in key_helper.RANK_CLASS_MAP}
+
+    def count_object_type(self, object_type):
+        rank = key_helper.CLASS_RANK_MAP[object_type]
+        return self.rank_to_count_dict()[rank]
+
     def rank_to_keys_dict(self):
         db = self.db['main']
         d = {k:[] for k in key_helper.RANK_CLASS_MAP.keys()}
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cursor = txn.cursor(db = db)
             for key in cursor.iternext(keys=True, values=False):
                 rank = key[9]
@@ -267,30 +986,116 @@ class DB:
     def all_speaker_keys(self):
         return self.all_object_type_keys('Speaker')
 
+    @grows_map
     def delete(self, key, db_name = 'main'):
-        db = self.db[db_name]
-        if not self.key_exists(key, db_name = db_name): return
-        with self.env.begin(write=True) as txn:
-            txn.delete(key, db = db)
+        with self._begin_write() as txn:
+            self._delete_rows(txn, [key], db_name)
 
+    @grows_map
     def delete_many(self, keys, db_name = 'main'):
-        db = self.db[db_name]
+        '''Delete keys, committing every 10_000 keys (inside a session
+        each batch is a child transaction of the session).'''
         batch_size = 10_000
-        i = 0
-        txn = self.env.begin(write=True)
+        batch = []
+        for k in progressbar(keys):
+            batch.append(k)
+            if len(batch) == batch_size:
+                self._delete_batch(batch, db_name)
+                batch = []
+        self._delete_batch(batch, db_name)
+
+    def _delete_batch(self, keys, db_name):
         try:
-            for k in progressbar(keys):
-                i += 1
-                txn.delete(k, db = db)
-                if i % batch_size == 0:
-                    txn.commit()
-                    txn = self.env.begin(write=True)
-            txn.commit()
+            with self._begin_write() as txn:
+                self._delete_rows(txn, keys, db_name)
         except Exception as e:
-            print(f'Error {e}, while deleting key: {k}')
-            txn.abort()
+            print(f'Error {e}, while deleting {len(keys)} keys')
             raise e
 
+    @grows_map
+    def drop_audio(self, audio_id):
+        '''Delete an audio with all its segments, their label links and
+        derived index entries, and its speaker links, in one
+        transaction. Every main key of a recording starts with
+        0x00 + audio_id, so the rows are one cursor range; label links
+        are derived from the raw rows. Returns the deleted main keys.'''
+        prefix = key_helper.pack_audio_prefix(audio_id)
+        indexed = self.has_index('audio_speaker')
+        with self._begin_write() as txn:
+            cursor = txn.cursor(db = self.db['main'])
+            rows = []
+            if cursor.set_range(prefix):
+                for key, value in cursor:
+                    if not key.startswith(prefix): break
+                    rows.append((key, value))
+            self._drop_rows(txn, rows)
+            self._delete_rows(txn, self._audio_links(txn, audio_id,
+                indexed), 'speaker_audio')
+        return [key for key, _ in rows]
+
+    @grows_map
+    def drop_phrase_trees(self, phrase_keys):
+        '''Delete phrases with the words, syllables and phones they own
+        (linked through parent_id), their label links and derived index
+        entries, in one transaction. Descendants are found by a key range
+        scan per class over the phrase's time span, reading raw rows
+        only. Returns the deleted main keys.'''
+        main = self.db['main']
+        with self._begin_write() as txn:
+            rows = []
+            for phrase_key in phrase_keys:
+                value = txn.get(phrase_key, db = main)
+                if value is None: continue
+                rows.append((phrase_key, value))
+                rows.extend(self._phrase_tree_rows(txn, phrase_key, value))
+            self._drop_rows(txn, rows)
+        return [key for key, _ in rows]
+
+    def _phrase_tree_rows(self, txn, phrase_key, value):
+        info = key_helper.unpack_key(phrase_key)
+        end = struct_value.unpack_fixed('Phrase', value)['end']
+        owners = {info['identifier']}
+        rows = []
+        cursor = txn.cursor(db = self.db['main'])
+        for object_type in ('Word', 'Syllable', 'Phone'):
+            start_prefix = key_helper.make_time_scan_prefix(
+                info['audio_id'], object_type, info['start'])
+            end_prefix = key_helper.make_time_scan_prefix(
+                info['audio_id'], object_type, end)
+            if not cursor.set_range(start_prefix): continue
+            for key, row in cursor:
+                if key > end_prefix: break
+                fixed = struct_value.unpack_fixed(object_type, row)
+                if fixed['parent_id'] not in owners: continue
+                owners.add(key_helper.key_to_identifier(key))
+                rows.append((key, row))
+        return rows
+
+    def _drop_rows(self, txn, rows):
+        '''Delete main rows read in txn together with their label links
+        (derived from the raw rows) and derived index entries.'''
+        main, label = self.db['main'], self.db['label_segment']
+        for key, value in rows:
+            txn.delete(key, db = main)
+            if not key_helper.is_segment_key(key): continue
+            object_type = key_helper.key_to_object_type(key)
+            text = struct_value.unpack_label(object_type, value)
+            if text is None: continue
+            txn.delete(key_helper.label_to_label_index_key(text,
+                object_type, key), db = label)
+        self._update_indexes(txn, rows, [])
+
+    def _audio_links(self, txn, audio_id, indexed):
+        '''speaker_audio link keys of an audio, from the audio_speaker
+        index if indexed, else by scanning the links.'''
+        if indexed:
+            keys = index_helper.prefix_keys(txn, self.db['audio_speaker'],
+                audio_id)
+            return [key[8:] + key[:8] for key in keys]
+        links = txn.cursor(db = self.db['speaker_audio'])
+        return [key for key in links.iternext(values = False)
+            if key[-8:] == audio_id]
+
     def delete_main(self):
         """Delete all keys in the main LMDB database."""
         keys_to_delete = self.all_keys(db_name = 'main')
@@ -346,7 +1151,7 @@ class DB:
         db = self.db['speaker_audio']
 
         prefix = key_helper.make_speaker_scan_prefix(speaker.identifier)
-        with self.env.begin() as txn:
+        with self._begin_read() as txn:
             cur = txn.cursor(db = db)
             if not cur.set_range(prefix):
                 return
@@ -356,28 +1161,184 @@ class DB:
                 yield k
 
     def speaker_to_audio_keys(self, speaker):
-        links = self._speaker_audio_links(speaker)
-        z = b'\x00'
-        audio_keys = [z + k[-8:] + z for k in links]
-        return audio_keys
+        '''Keys of the audios linked to speaker (speaker_audio links)
+        or holding one of its phrases (speaker_phrase index), sorted.'''
+        audio_ids = {k[-8:] for k in self._speaker_audio_links(speaker)}
+        if self.has_index('speaker_phrase'):
+            prefix = key_helper.make_speaker_scan_prefix(speaker.identifier)
+            with self._begin_read() as txn:
+                audio_ids.update(_skip_scan_ids(txn,
+                    self.db['speaker_phrase'], prefix))
+        return [key_helper.audio_id_to_key(i) for i in sorted(audio_ids)]
+
+    def audio_ids(self):
+        '''Identifiers of the audios with rows in this database (an
+        Audio row or segments), one seek per audio.'''
+        audio_prefix = bytes([key_helper.CLASS_RANK_MAP['Audio']])
+        with self._begin_read() as txn:
+            return _skip_scan_ids(txn, self.db[default_db_name],
+                audio_prefix)
+
+    def speaker_to_phrase_keys(self, speaker):
+        '''Keys of speaker's phrases, ordered by audio and start: one
+        prefix scan of the speaker_phrase index, so other speakers'
+        phrases in the same recordings are never read. Without the index
+        (read-only store on an older database) the phrases of the
+        speaker's audios are filtered by their stored speaker_id.'''
+        if not self.has_index('speaker_phrase'):
+            keys = []
+            for audio_key in self.speaker_to_audio_keys(speaker):
+                audio_id = key_helper.key_to_info(audio_key)['identifier']
+                rows = self._audio_phrase_speaker_ids(audio_id)
+                keys += [k for k, i in rows if i == speaker.identifier]
+            return keys
+        prefix = key_helper.make_speaker_scan_prefix(speaker.identifier)
+        with self._begin_read() as txn:
+            index_keys = index_helper.prefix_keys(txn,
+                self.db['speaker_phrase'], prefix)
+        f = key_helper.speaker_phrase_key_to_instance_key
+        return [f(k) for k in index_keys]
+
+    def audio_to_speaker_keys(self, audio):
+        '''Keys of the speakers linked to audio (audio_speaker index)
+        or speaking one of its phrases, sorted. Phrase speakers come from
+        the fixed value header; no Phrase is built.'''
+        speaker_ids = set()
+        if self.has_index('audio_speaker'):
+            with self._begin_read() as txn:
+                links = index_helper.prefix_keys(txn,
+                    self.db['audio_speaker'], audio.identifier)
+            speaker_ids.update(k[8:] for k in links)
+        rows = self._audio_phrase_speaker_ids(audio.identifier)
+        speaker_ids.update(i for _, i in rows)
+        return [key_helper.speaker_id_to_key(i) for i in sorted(speaker_ids)]
+
+    def _audio_phrase_speaker_ids(self, audio_id):
+        '''[(phrase key, speaker_id)] for the phrases of an audio.'''
+        prefix = key_helper.pack_audio_scan_prefix(audio_id, 'Phrase')
+        rows = []
+        with self._begin_read() as txn:
+            cursor = txn.cursor(db = self.db[default_db_name])
+            if not cursor.set_range(prefix): return rows
+            for key, value in cursor:
+                if not key.startswith(prefix): break
+                fixed = struct_value.unpack_fixed('Phrase', value)
+                rows.append((key, fixed['speaker_id']))
+        return rows
+
+
+def put_sorted(txn, db, rows, overwrite = True):
+    '''Put (key, value) rows sorted by key with one cursor.putmulti call,
+    in append mode when they all sort after the last key of db. Returns
+    False when overwrite is False and a key exists (or repeats in rows);
+    the caller aborts the partial write.'''
+    if not rows: return True
+    cursor = txn.cursor(db = db)
+    append = not cursor.last() or rows[0][0] > cursor.key()
+    if append and not overwrite:
+        for (key, _), (next_key, _) in zip(rows, rows[1:]):
+            if key == next_key: return False
+    _, added = cursor.putmulti(rows, overwrite = overwrite, append = append)
+    if append and added != len(rows):
+        raise ValueError('put_sorted: rows are not sorted by key')
+    return overwrite or added == len(rows)
 
-        
+
+class WriteProgress:
+    '''Optional, rate-limited progress of one batch write: a line with
+    the rows written and rows per second at most every interval seconds,
+    and a summary when it printed before. Short writes stay silent.'''
+    chunk_size = 100_000
+
+    def __init__(self, total, enabled = True, interval = 5.0):
+        self.total = total
+        self.enabled = enabled
+        self.interval = interval
+        self.written = 0
+        self.start = self.last = time.time()
+        self.reported = False
+
+    def update(self, n):
+        self.written += n
+        if not self.enabled: return
+        now = time.time()
+        if now - self.last < self.interval: return
+        self.last = now
+        self.reported = True
+        print(self.line(now))
+
+    def done(self):
+        if self.reported: print(self.line(time.time()))
+
+    def line(self, now):
+        rate = self.written / max(now - self.start, 1e-9)
+        return f'wrote {self.written}/{self.total} rows, {rate:.0f} rows/s'
+
+
+def _skip_scan_ids(txn, db, prefix):
+    '''Distinct 8-byte ids following prefix in the keys of db, one
+    seek per id (the keys of each id are skipped, not read).'''
+    ids = []
+    cursor = txn.cursor(db = db)
+    n = len(prefix)
+    found = cursor.set_range(prefix)
+    while found:
+        key = cursor.key()
+        if not key.startswith(prefix): break
+        identifier = key[n:n + 8]
+        ids.append(identifier)
+        found = cursor.set_range(prefix + identifier + b'\xff' * 32)
+    return ids
+
+
+
+def get_many(txn, db, keys):
+    '''Values for keys (None when missing) in the order of keys, fetched
+    in key order with a single cursor. Keys that are already sorted (key
+    scans, query results) skip the sort.'''
+    get = txn.cursor(db = db).get
+    if all(a <= b for a, b in zip(keys, keys[1:])):
+        return [get(key) for key in keys]
+    values = [None] * len(keys)
+    for index in sorted(range(len(keys)), key = keys.__getitem__):
+        values[index] = get(keys[index])
+    return values
+
+
+def tree_pages(stat):
+    return stat['branch_pages'] + stat['leaf_pages'] + stat['overflow_pages']
+
+def data_file_size(path):
+    return (Path(path) / 'data.mdb').stat().st_size
 
 
 def open_lmdb(path=locations.cgn_lmdb, map_size=1024**4, 
-    db_names = ['main', 'speaker_audio'], max_dbs = 2):
+    db_names = ['main', 'speaker_audio'], max_dbs = 2, readonly = False,
+    readahead = True, max_readers = 126):
      
     '''
     env : lmdb.Environment or None
     path : str
     map_size : int
+    readonly : open read-only and lock-free; sub-dbs are opened without a
+               write transaction and missing ones are left out of db
 
     lmdb.Environment    The LMDB environment ready for use.
     '''
 
     path = Path(path)
+    if readonly:
+        env = lmdb.open(str(path), map_size = map_size, max_dbs = max_dbs,
+            readonly = True, lock = False, readahead = readahead,
+            max_readers = max_readers)
+        db = {}
+        for name in db_names:
+            try: db[name] = env.open_db(name.encode(), create = False)
+            except lmdb.NotFoundError: pass
+        return env, db
     path.mkdir(parents=True, exist_ok=True)
-    env = lmdb.open(str(path), map_size = map_size, max_dbs = max_dbs)
+    env = lmdb.open(str(path), map_size = map_size, max_dbs = max_dbs,
+        readahead = readahead, max_readers = max_readers)
 
     db = {}
     with env.begin(write = True) as txn:
@@ -68,9 +68,8 @@ class Audio:
     @property
     def speakers(self):
         if hasattr(self, '_speakers'): return self._speakers
-        speakers = [x.speaker for x in self.phrases]
-        unique_speakers = set(speakers)
-        self._speakers = list(unique_speakers)
+        speaker_keys = self.store.DB.audio_to_speaker_keys(self)
+        self._speakers = self.store.load_many(speaker_keys)
         return self._speakers
 
     @property
@@ -247,9 +246,7 @@ class Speaker:
     @property
     def phrase_keys(self):
         if hasattr(self, '_phrase_keys'): return self._phrase_keys
-        self._phrase_keys = []
-        for audio in self.audios:
-            self._phrase_keys += audio.phrase_keys
+        self._phrase_keys = self.store.DB.speaker_to_phrase_keys(self)
         return self._phrase_keys
 
     @property
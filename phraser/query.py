@@ -34,15 +34,8 @@ def queryset_from_items(items, store = None):
     if store is None:
         store = items[0].store
 
-    # Empty input -> empty queryset
-    data = Data(cls, store)
-
     # Convert to LMDB keys and restrict
-    keys = objects_to_keys(items)
-
-    # Optional: keep only keys that actually exist for this class in the store.
-    data.keys = keys
-
+    data = Data(cls, store, keys = objects_to_keys(items))
     return QuerySet(data)
 
 
@@ -52,20 +45,51 @@ def get_class_object(cls, store):
     return QuerySet(data)
 
 class Data:
-    '''handles loading objects of a given class from store'''
-    def __init__(self, cls, store):
+    '''handles loading objects of a given class from store
+    The key list is built on first use: a store-wide root knows its size
+    from the class counts without listing any keys. Data given its keys
+    (the items of queryset_from_items) is scoped: its filters run over
+    those objects and never consult the database indexes.
+    '''
+    def __init__(self, cls, store, keys = None):
         self.cls = cls
         self.store = store
         self.object_type = cls.__name__
         self.rank = key_helper.CLASS_RANK_MAP[self.object_type]
-        self._get_keys(update = False)
+        self._keys = keys
+        self.scoped = keys is not None
+
+    @property
+    def keys(self):
+        if self._keys is None: self._get_keys(update = False)
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
 
     def _get_keys(self, update = False):
         d = self.store.rank_to_keys_dict(update = update)
-        m = f'No keys found for object type: {B}{self.object_type}{RE}'
         try: self.keys = d[self.rank]
         except KeyError: self.keys = []
 
+    def has_key_list(self):
+        '''True when the key list exists or is taken from the key lists
+        the store holds (rank_to_keys_dict), without reading the db.
+        Until then the database itself is the key list.'''
+        if self._keys is not None: return True
+        return hasattr(self.store, '_rank_to_keys_dict')
+
+    def count(self):
+        '''number of objects, without building the key list if it is not
+        there yet. Once there is a key list (has_key_list), iteration
+        uses it, so the count does too, even when it lags behind the
+        database; otherwise the class counts are read in the transaction
+        a key listing would use now (the open snapshot or session, else
+        a fresh one).'''
+        if self.has_key_list(): return len(self.keys)
+        return self.store.class_count(self.object_type)
+
     def load(self, keys = None):
         if keys is None: keys = self.keys
         objs = self.store.load_many(keys)
@@ -131,24 +155,79 @@ class QuerySet:
     def _apply(self):
         '''applies filters, excludes, and ordering to the QuerySet'''
         if hasattr(self, '_objs'): return self._objs
-        objs = self._data.load()
-        for op, params in self._filters:
+        for _, params in self._filters:
             self.check_relations_loaded(params)
-            if op == "filter":
-                objs = filter_objects(objs, **params)
-            elif op == "exclude":
-                objs = [x for x in objs if not object_matches(x, **params)]
+        objs = self._filter(self._data.load(self._index_keys()))
         if self._ordering:
             objs = sorted(objs, key=lambda obj: sort_key(obj, self._ordering))
         self._objs = objs
         return self._objs
 
+    def _filter(self, objs):
+        for op, params in self._filters:
+            if op == "filter":
+                objs = filter_objects(objs, **params)
+            elif op == "exclude":
+                objs = [x for x in objs if not object_matches(x, **params)]
+        return objs
+
+    def _iter_chunks(self, chunk_size = 10_000):
+        '''Load and filter the keys a chunk at a time without keeping the
+        results, so a pass over a large class with a bounded store cache
+        holds one chunk (plus what the caller keeps) in memory.'''
+        for _, params in self._filters:
+            self.check_relations_loaded(params)
+        keys = self._index_keys()
+        if keys is None: keys = self._data.keys
+        for i in range(0, len(keys), chunk_size):
+            yield from self._filter(self._data.load(keys[i:i + chunk_size]))
+
+    def _index_keys(self):
+        '''Keys narrowed by the database indexes the store offers for the
+        filter lookups (store.index_keys; code lookups together through
+        store.bitmap_index_keys when offered), or None to load every key
+        of the data. The filters are still applied after loading. Scoped
+        data is not narrowed: an index lookup reads every match in the
+        database, far more than a few given keys.
+        The matches are those among the keys iteration would load: the
+        key list once there is one (has_key_list; it lags behind writes
+        until store.catch_up), else the live database. So len, iteration
+        and filters agree whichever of them runs first.'''
+        if self._data.scoped: return None
+        resolve = getattr(self.store, 'index_keys', None)
+        if resolve is None: return None
+        lookups = [(lookup, value) for op, params in self._filters
+            if op == "filter" for lookup, value in params.items()]
+        keys = None
+        combine = getattr(self.store, 'bitmap_index_keys', None)
+        if combine is not None and lookups:
+            found, lookups = combine(self._data.object_type, lookups)
+            if found is not None: keys = set(found)
+        for lookup, value in lookups:
+            found = resolve(self._data.object_type, lookup, value)
+            if found is None: continue
+            found = set(found)
+            keys = found if keys is None else keys & found
+        if keys is None: return None
+        if not self._data.has_key_list(): return sorted(keys)
+        return [key for key in self._data.keys if key in keys]
+
     def __iter__(self):
+        if hasattr(self, '_objs') or self._ordering:
+            return iter(self._apply())
+        cache = getattr(self.store, '_cache', None)
+        if getattr(cache, 'bounded', False): return self._iter_chunks()
         return iter(self._apply())
 
     def __len__(self):
+        if not self._filters: return self._data.count()
         return len(self._apply())
 
+    def count(self):
+        '''number of matching objects; an unfiltered QuerySet answers from
+        the class counts without loading anything'''
+        return len(self)
+
     def __repr__(self):
         return queryset_summary(self)
 
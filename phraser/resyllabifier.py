@@ -16,8 +16,9 @@ def apply_new_syllable_boundaries(word, phone_groups, phone_types=None,
     drops a nucleus, so the count is invariant and new[i] is old[i]'s nucleus
     with moved boundaries. Each new syllable is a COPY of its old one (carrying
     persisted metadata and speaker links unchanged) under a fresh id; the word's
-    child cache is repointed at them and — with update_database — the old rows and
-    their label-index entries are deleted.
+    child cache is repointed at them and — with update_database — the new rows are
+    saved and the old rows and their label-index entries deleted in one store
+    session (one transaction).
     Returns the new syllables. Raises ValueError on a multi-speaker word or a
     count mismatch.
     '''
@@ -31,8 +32,9 @@ def apply_new_syllable_boundaries(word, phone_groups, phone_types=None,
         new_syllables.append(_rebuild_syllable(old_syllable, phones, phone_types))
     word._children, word._overlapping = new_syllables, []   # pair is load-bearing
     if update_database:
-        _save_new_syllables(new_syllables)
-        _delete_old_syllables(old_syllables)
+        with word.store.session():
+            _save_new_syllables(new_syllables)
+            _delete_old_syllables(old_syllables)
     return new_syllables
 
 
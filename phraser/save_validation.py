@@ -31,6 +31,12 @@ def validate_phrase_trees(store, phrases):
     '''Validate a save_phrase_trees batch: Phrase objects only, each
     tree coherent (Phrase.validate_tree), no duplicate phrase identity
     in the batch, no same-speaker phrase overlap.'''
+    check_phrase_batch(phrases)
+    check_same_speaker_overlap(store, phrases)
+
+
+def check_phrase_batch(phrases):
+    '''The checks of validate_phrase_trees that need no database.'''
     from .models import Phrase
     seen = set()
     for phrase in phrases:
@@ -45,7 +51,6 @@ def validate_phrase_trees(store, phrases):
             m += f'{phrase.speaker_id}, {phrase.start})'
             raise ValueError(m)
         seen.add(phrase)
-    check_same_speaker_overlap(store, phrases)
 
 
 def check_same_speaker_overlap(store, phrases):
@@ -54,12 +59,14 @@ def check_same_speaker_overlap(store, phrases):
     persisted on the same audio. A phrase's own persisted row
     (identical key) is exempt, so overwrite re-saves pass. Two
     persisted rows overlapping each other are legacy data and do
-    not block an unrelated save.'''
+    not block an unrelated save. store None checks the batch only.'''
     groups = {}
     for phrase in phrases:
         group_key = (phrase.audio_id, phrase.speaker_id)
         groups.setdefault(group_key, []).append(phrase)
-    persisted = persisted_phrases_by_group(store, groups)
+    persisted = {}
+    if store is not None:
+        persisted = persisted_phrases_by_group(store, groups)
     for group_key, group in groups.items():
         entries = [(p, True) for p in group]
         entries += [(p, False) for p in persisted.get(group_key, [])]
@@ -1,3 +1,5 @@
+import hashlib
+import struct
 import time
 
 from ssh_audio_play import play
@@ -9,9 +11,67 @@ from . import struct_value
 from . import utils
 from .model_helper import EMPTY_ID
 from .store import ClosedStoreError, UnboundStoreError
+from .store import share_repeated_values
 from .utils import R, B, GR, RE, object_type_to_ljust_label
 
 
+class SlotDefault:
+    '''A slot with a default: reading it while unset (or reading it on
+    the class) gives default, as the plain class attribute it replaces
+    did.'''
+    def __init__(self, slot, default):
+        self.slot = slot
+        self.name = slot.__name__
+        self.default = default
+
+    def __get__(self, obj, cls = None):
+        if obj is None: return self.default
+        try: return self.slot.__get__(obj, cls)
+        except AttributeError: pass
+        if obj._decode_lazy(self.name): return self.slot.__get__(obj, cls)
+        return self.default
+
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+
+    def __delete__(self, obj):
+        self.slot.__delete__(obj)
+
+
+def set_slot_defaults(cls, **defaults):
+    for name, default in defaults.items():
+        setattr(cls, name, SlotDefault(cls.__dict__[name], default))
+
+
+def set_lazy_members(cls):
+    '''The slots a lazy load fills and leaves: _FIXED_MEMBERS in the
+    order of the fixed value header (read with _FIXED_STRUCT), and
+    _STRING_MEMBERS ({name: member}), decoded on first access.'''
+    layout = struct_value.LAYOUTS[cls.__name__.lower()]
+    cls._FIXED_STRUCT = struct.Struct(layout['fixed_fmt'])
+    cls._FIXED_MEMBERS = tuple(slot_member(cls, name)
+        for name in layout['fixed_fields'])
+    cls._STRING_MEMBERS = {name: slot_member(cls, name)
+        for name in struct_value.string_fields(cls.__name__)}
+
+
+def slot_member(cls, name):
+    '''The slot member descriptor of name on cls (unwrapping a
+    SlotDefault): reads and writes the slot without defaults or lazy
+    decoding.'''
+    member = _SLOT_MEMBERS.get((cls, name))
+    if member is None:
+        for klass in cls.__mro__:
+            if name in klass.__dict__.get('__slots__', ()):
+                member = klass.__dict__[name]
+                break
+        member = getattr(member, 'slot', member)
+        _SLOT_MEMBERS[(cls, name)] = member
+    return member
+
+_SLOT_MEMBERS = {}
+
+
 class Segment:
     '''
     Base time-aligned segment with a unique ID and parent/child links.
@@ -19,13 +79,26 @@ class Segment:
     Only save and delete touch the database; every other method and
     property (add_parent, add_children, replace_children, ...) works
     in memory. Tree persistence goes through store.save_phrase_trees.
+
+    The stored fields and the link caches live in __slots__; other
+    attributes (metadata kwargs, feature caches) go to a __dict__ that
+    is only created when one is set, so a loaded segment has none.
+
+    A lazily loaded segment (Store(lazy = True)) has its key and fixed
+    fields set and keeps the raw value in _raw_strings; the first read
+    of a string field (label, ...) decodes them all.
     '''
+    __slots__ = ('object_type', 'identifier', 'label', 'start', 'end',
+        'parent_id', 'parent_start', 'audio_id', 'speaker_id',
+        'overlap_code', 'version', 'flags', 'overwrite', '_key',
+        '_persisted_speaker_id', '_store', '_parent', '_children',
+        '_overlapping', '_raw_strings', '__dict__', '__weakref__')
     IDENTITY_FIELDS= {'label', 'start', 'end', 'audio_key'}
     DB_FIELDS = {'identifier', 'label', 'start', 'end', 'parent_id',
         'parent_start', 'audio_id', 'speaker_id'}
     METADATA_FIELDS = {}# subclasses override
     allowed_child_type = []# subclasses override
-    overlap_code = 9
+    _STRING_MEMBERS = {}# set by set_lazy_members
 
     def __init__(self, label, start, end, audio_id, speaker_id,
         parent_id=EMPTY_ID, parent_start=0,
@@ -69,9 +142,50 @@ class Segment:
 
     def __str__(self):
         m = self.__repr__() + '\n'
-        m += utils.pretty_print_object_dict(self.__dict__)
+        m += utils.pretty_print_object_dict(self.attribute_dict())
         return m
 
+    def __getattr__(self, name):
+        # only reached for unset slots and missing attributes
+        if self._decode_lazy(name): return getattr(self, name)
+        m = f'{self.__class__.__name__!r} object has no attribute {name!r}'
+        raise AttributeError(m)
+
+    def _decode_lazy(self, name):
+        '''Decode the strings a lazy load left in _raw_strings if name
+        is one of them; False otherwise.'''
+        if name not in self._STRING_MEMBERS: return False
+        return self.decode_strings()
+
+    def decode_strings(self):
+        '''Decode the string fields (label, ...) a lazy load left
+        undecoded; fields set meanwhile are kept. False if there was
+        nothing to decode.'''
+        raw = self._raw_strings
+        if raw is None: return False
+        del self._raw_strings
+        data = struct_value.unpack_strings(self.object_type, raw)
+        share_repeated_values(None, data, self.object_type)
+        for field, member in self._STRING_MEMBERS.items():
+            try: member.__get__(self)
+            except AttributeError: member.__set__(self, data[field])
+        return True
+
+    def attribute_dict(self):
+        '''The attributes set on this object, slots and __dict__ alike
+        (what __dict__ alone held before the slots).'''
+        self.decode_strings()
+        d = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name in ('__dict__', '__weakref__'): continue
+                slot = cls.__dict__[name]
+                if isinstance(slot, SlotDefault): slot = slot.slot
+                try: d[name] = slot.__get__(self, cls)
+                except AttributeError: pass
+        d.update(getattr(self, '__dict__', {}))
+        return d
+
     def __eq__(self, other):
         if not isinstance(other, Segment):
             return False
@@ -218,41 +332,43 @@ class Segment:
 
     @property
     def _candidate_child_keys(self):
-        '''Keys from a time-range candidate scan: segments of the child
-        class in the same audio within [start, end]. NOT an ownership
-        list — a candidate may belong to another parent. Only the
-        children property consumes this, classifying the loaded
-        candidates.'''
+        '''Keys from an interval-index candidate scan: segments of the
+        child class in the same audio overlapping [start, end], including
+        ones that start before this segment. NOT an ownership list — a
+        candidate may belong to another parent. Only the overlapping
+        property consumes this.'''
         if self.allowed_child_type is None: return []
-        return list(self.store.DB.instance_to_child_keys(self))
+        return self.store.DB.instance_to_overlapping_keys(self)
 
     @property
     def children(self):
         """Return the list of child segments this segment owns."""
         if self.allowed_child_type is None: return []
         if hasattr(self, '_children'): return self._children
-        self._children, self._overlapping = [], []
+        self._children = []
         # unbound segments have no DB children to merge with
         if getattr(self, '_store', None) is None: return self._children
-        candidate_keys = self._candidate_child_keys
-        if candidate_keys:
-            candidates = self.store.load_many(candidate_keys)
-        else:
-            candidates = []
-        for candidate in candidates:
-            if candidate.parent_id == self.identifier:
-                self._children.append(candidate)
-            else: self._overlapping.append(candidate)
+        # the child index holds only rows linked to this segment, so no
+        # other parent's (or speaker's) rows are loaded
+        keys = self.store.DB.instance_to_owned_child_keys(self)
+        if keys: self._children = self.store.load_many(keys)
         return self._children
 
     @property
     def overlapping(self):
         '''Segments of the child class in this segment's time range that
         belong to another parent, e.g. another speaker's overlapping
-        speech.'''
+        speech. A separate time-window query, run on first access.'''
         if hasattr(self, '_overlapping'): return self._overlapping
         if self.allowed_child_type is None: return []
-        _ = self.children
+        self._overlapping = []
+        if getattr(self, '_store', None) is None: return self._overlapping
+        owned = set(self.store.DB.instance_to_owned_child_keys(self))
+        keys = [key for key in self._candidate_child_keys
+            if key not in owned]
+        for candidate in self.store.load_many(keys):
+            if candidate.parent_id == self.identifier: continue
+            self._overlapping.append(candidate)
         return self._overlapping
 
 
@@ -586,9 +702,9 @@ class Segment:
 
 
 class Phrase(Segment):
+    __slots__ = ('filename',)
     IDENTITY_FIELDS = {'audio_id', 'speaker_id', 'start'}
     METADATA_FIELDS = {'filename', 'overlap'}
-    filename = ''
 
     @property
     def all_objects(self):
@@ -620,11 +736,49 @@ class Phrase(Segment):
                 m += 'phrase; reassign the speaker on the whole tree.'
                 raise ValueError(m)
 
+    def use_content_identifiers(self, extra = (),
+        secret = key_helper.CONTENT_ID_SECRET):
+        '''Replace the random identifiers of this staged tree by content
+        identifiers (key_helper.content_identifier), so an unchanged
+        re-import gets the same keys. Top-down: each segment hashes its
+        parent's new identifier, and the phrase hashes the content of its
+        whole tree, so its key exists only if the same tree was saved.
+        extra: segments tied to this phrase by phrase refs only (orphan
+        syllables and phones).'''
+        items = list(self.items)
+        seen = {id(item) for item in items}
+        items += [item for item in extra if id(item) not in seen]
+        for item in items:
+            if not hasattr(item, '_persisted_speaker_id'): continue
+            m = 'content identifiers are for staged trees; this '
+            m += f'{item.object_type} is already persisted.'
+            raise ValueError(m)
+        rank = key_helper.CLASS_RANK_MAP
+        items.sort(key = lambda item: rank[item.object_type])
+        rows = sorted((rank[item.object_type], item.start, item.end,
+            item.label) for item in items if item is not self)
+        tree = hashlib.blake2b(repr(rows).encode('utf-8'),
+            digest_size = 16).digest()
+        new_ids = {}
+        for item in items:
+            if item is self: parent = tree
+            else: parent = new_ids.get(item.parent_id,
+                new_ids[self.identifier])
+            new_ids[item.identifier] = key_helper.content_identifier(
+                item.object_type, item.audio_id, item.speaker_id,
+                item.start, item.end, item.label, parent, secret)
+        for item in items:
+            item.identifier = new_ids[item.identifier]
+            if item.parent_id in new_ids:
+                item.parent_id = new_ids[item.parent_id]
+            if item.object_type in ('Syllable', 'Phone'):
+                item.phrase_id = self.identifier
+                item.phrase_start = self.start
+
     def delete(self):
         """ Delete this phrase and all its descendants from the database.
         """
-        all_keys = self.all_keys
-        self.store.delete_many(all_keys)
+        self.store.drop_phrase_trees([self])
 
     @property
     def phrase_start(self):
@@ -664,8 +818,8 @@ class Phrase(Segment):
 
 
 class Word(Segment):
+    __slots__ = ('ipa',)
     METADATA_FIELDS = {'overlap', 'ipa'}
-    ipa = ''
 
     @property
     def phrase_start(self):
@@ -695,10 +849,8 @@ class Word(Segment):
         return query.queryset_from_items(self.phones, self.store)
 
 class Syllable(Segment):
+    __slots__ = ('stress_code', 'phrase_id', 'phrase_start')
     METADATA_FIELDS = {'stress_code'}
-    phrase_id = EMPTY_ID
-    phrase_start = 0
-    stress_code = 9
 
     @property
     def stress(self):
@@ -741,12 +893,10 @@ class Syllable(Segment):
         return query.queryset_from_items(self.phones, self.store)
 
 class Phone(Segment):
+    # position_code: 1=onset 2=nucleus 3=coda, 9=unassigned
+    __slots__ = ('position_code', 'phrase_id', 'phrase_start')
     METADATA_FIELDS = {}
 
-    phrase_id = EMPTY_ID
-    phrase_start = 0
-    position_code = 9      # stored int: 1=onset 2=nucleus 3=coda, 9=unassigned
-
     @property
     def position(self):
         '''Syllable position string from the stored position_code
@@ -818,6 +968,17 @@ class Phone(Segment):
         return self.parent.parent
 
 
+set_slot_defaults(Segment, overlap_code = 9, _raw_strings = None)
+set_slot_defaults(Phrase, filename = '')
+set_slot_defaults(Word, ipa = '')
+set_slot_defaults(Syllable, stress_code = 9, phrase_id = EMPTY_ID,
+    phrase_start = 0)
+set_slot_defaults(Phone, position_code = 9, phrase_id = EMPTY_ID,
+    phrase_start = 0)
+
+for segment_class in (Phrase, Word, Syllable, Phone):
+    set_lazy_members(segment_class)
+
 Phrase.allowed_child_type = Word
 Word.allowed_child_type = Syllable
 Word.parent_class = Phrase
@@ -0,0 +1,163 @@
+'''Columnar tables of the fixed fields of one segment class.
+
+A SegmentTable holds the fields of every segment of a class as NumPy
+arrays, decoded straight from the LMDB rows without building objects:
+the keys and the fixed value headers are joined and read with one
+np.frombuffer each; only the label is cut out row by row and coded
+against a vocabulary. Ids (audio, speaker, parent, phrase) are coded as
+indexes into sorted arrays of the distinct 8-byte ids, -1 for no id.
+
+    phones = store.table('Phone')
+    n = np.bincount(phones.label_code)
+    mean = np.bincount(phones.label_code, weights = phones.duration) / n
+    dict(zip(phones.labels, mean))
+'''
+
+import re
+
+import numpy as np
+
+from . import key_helper
+from . import struct_value
+
+# segment key: audio rank + audio_id + class rank + start + identifier
+KEY_DTYPE = np.dtype([('audio_rank', 'u1'), ('audio_id', 'V8'),
+    ('rank', 'u1'), ('start', '>u4'), ('identifier', 'V8')])
+
+ID_FIELDS = ('speaker_id', 'parent_id', 'phrase_id')
+CODE_FIELDS = ('overlap_code', 'position_code', 'stress_code')
+
+
+def header_dtype(object_type):
+    '''NumPy dtype of the fixed value header of object_type (the
+    struct_value layout, big-endian and unpadded like struct).'''
+    layout = struct_value.LAYOUTS[object_type.lower()]
+    fmt = layout['fixed_fmt']
+    if fmt[0] not in '<>!=': raise ValueError(f'no byte order in {fmt}')
+    order = '<' if fmt[0] == '<' else '>'
+    tokens = re.findall(r'(\d*)([a-zA-Z])', fmt[1:])
+    fields = []
+    for name, (count, code) in zip(layout['fixed_fields'], tokens):
+        if code == 's': fields.append((name, f'V{count}'))
+        else: fields.append((name, order + np.dtype(code).str[1:]))
+    return np.dtype(fields)
+
+
+class SegmentTable:
+    '''The fixed fields of every segment of one class, one row per
+    segment in key order (by audio, then start).
+
+    start, end, duration:   ms (int64)
+    audio_index, speaker_index, parent_index, phrase_index:
+        int32 indexes into audio_ids, speaker_ids, parent_ids, phrase_ids
+        (sorted arrays of distinct 8-byte ids, dtype V8; bytes(ids[i])
+        is the id), -1 for an empty id
+    overlap_code, position_code, stress_code:   uint8 codes
+    label_code:     int32 index into labels (the vocabulary)
+    identifiers:    the segment ids (V8)
+    Fields the class does not have (parent of a Phrase, stress of a
+    Phone, ...) are None.
+    '''
+
+    def __init__(self, object_type, key_rows, header_rows, raw_labels):
+        self.object_type = object_type
+        self.audio_ids, self.audio_index = _code_ids(key_rows['audio_id'])
+        self.start = key_rows['start'].astype(np.int64)
+        self.identifiers = key_rows['identifier'].copy()
+        self.end = header_rows['end'].astype(np.int64)
+        for field in ID_FIELDS:
+            ids, index = None, None
+            if field in header_rows.dtype.names:
+                ids, index = _code_ids(header_rows[field])
+            setattr(self, field + 's', ids)
+            setattr(self, field.replace('_id', '_index'), index)
+        for field in CODE_FIELDS:
+            codes = None
+            if field in header_rows.dtype.names:
+                codes = header_rows[field].copy()
+            setattr(self, field, codes)
+        vocabulary = {}
+        codes = [vocabulary.setdefault(raw, len(vocabulary))
+            for raw in raw_labels]
+        self.label_code = np.array(codes, dtype = np.int32)
+        self.labels = [raw.decode('utf-8') for raw in vocabulary]
+
+    @classmethod
+    def from_rows(cls, object_type, rows):
+        '''Decode an iterable of (key, value) main rows of object_type.'''
+        if object_type not in key_helper.SEGMENT_CLASSES:
+            raise ValueError(f'not a segment class: {object_type}')
+        header = header_dtype(object_type)
+        layout = struct_value.LAYOUTS[object_type.lower()]
+        var_fields = struct_value._parse_var_fields(layout['fields'],
+            object_type)
+        if var_fields[0][0] != 'label':
+            raise ValueError(f'{object_type}: label is not the first string')
+        n, width = header.itemsize, var_fields[0][1] // 8
+        keys, headers, raw_labels = [], [], []
+        for key, value in rows:
+            keys.append(key)
+            headers.append(value[:n])
+            length = int.from_bytes(value[n:n + width], 'big')
+            raw_labels.append(bytes(value[n + width:n + width + length]))
+        key_rows = np.frombuffer(b''.join(keys), dtype = KEY_DTYPE)
+        header_rows = np.frombuffer(b''.join(headers), dtype = header)
+        return cls(object_type, key_rows, header_rows, raw_labels)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return (f'<SegmentTable {self.object_type} rows={len(self)} '
+            f'labels={len(self.labels)}>')
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def label_mask(self, *labels):
+        '''Boolean mask of the rows with one of labels.'''
+        codes = [i for i, label in enumerate(self.labels) if label in labels]
+        return np.isin(self.label_code, codes)
+
+    def label_array(self):
+        '''The label of every row (object array).'''
+        return np.array(self.labels, dtype = object)[self.label_code]
+
+    def keys(self, rows = None):
+        '''LMDB keys of the rows (a mask or row numbers; None: all), to
+        load objects: store.load_many(table.keys(table.duration > 200))'''
+        rows = np.arange(len(self)) if rows is None else rows
+        rank = key_helper.CLASS_RANK_MAP[self.object_type]
+        audio_ids = self.audio_ids[self.audio_index[rows]]
+        return [key_helper.pack_segment_key(bytes(audio_id), rank,
+            int(start), bytes(identifier)) for audio_id, start, identifier
+            in zip(audio_ids, self.start[rows], self.identifiers[rows])]
+
+    def rows_of(self, ids):
+        '''Row numbers in this table of the segments with identifiers
+        ids (an array of V8 ids such as another table's parent_ids),
+        -1 for ids not in the table. The phones' syllable rows:
+        syllables.rows_of(phones.parent_ids)[phones.parent_index]
+        (rows with parent_index -1 pick the last entry; mask them).'''
+        ids = np.asarray(ids).view('>u8')
+        rows = np.full(len(ids), -1, dtype = np.int64)
+        if not len(self): return rows
+        own = self.identifiers.view('>u8')
+        order = np.argsort(own)
+        pos = np.minimum(np.searchsorted(own[order], ids), len(own) - 1)
+        found = own[order][pos] == ids
+        rows[found] = order[pos[found]]
+        return rows
+
+
+def _code_ids(ids):
+    '''(sorted distinct ids without the empty id, int32 index per row
+    into them or -1 for the empty id).'''
+    distinct, index = np.unique(ids, return_inverse = True)
+    index = index.astype(np.int32).reshape(-1)
+    empty = np.zeros(1, dtype = ids.dtype)[0]
+    if len(distinct) and distinct[0] == empty:
+        distinct = distinct[1:]
+        index -= 1
+    return distinct, index
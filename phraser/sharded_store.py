@@ -0,0 +1,286 @@
+'''Several LMDB environments (shards) behind one Store-like facade.
+
+Recordings are partitioned by audio: an Audio and all its segments live
+in one shard, so every shard can be built by its own process (LMDB
+serialises writers per environment) and no merge step is needed to read
+them together. Speakers are small and shared by audios across shards,
+so each Speaker row is written to every shard.
+'''
+
+import copy
+from contextlib import ExitStack, contextmanager
+import heapq
+import json
+from pathlib import Path
+
+from . import key_helper
+from .store import Store
+from .struct_helper import CLASS_RANK_MAP, RANK_CLASS_MAP
+
+manifest_name = 'shards.json'
+
+
+def hash_route(audio, n_shards):
+    '''Default router: spread audios evenly by their random identifier.'''
+    return int.from_bytes(audio.identifier, 'big') % n_shards
+
+
+class ShardedStore:
+    """
+    Store facade over n_shards Stores in path/shard_000, path/shard_001, ...
+
+    route(audio, n_shards) -> shard index places a new Audio (default
+    hash_route; e.g. route by CGN component from audio.filename). Its
+    segments follow it. Which shard holds an audio is read from the
+    shards on open, so the router only matters for writes.
+
+    load, load_many, save, save_many, save_phrase_trees, the query roots
+    (store.phrases, store.words, ...), counts and label lookups work as on
+    a Store and fan out over the shards. Loaded objects are bound to their
+    shard Store, so navigation (phrase.words) stays inside the shard; use
+    speaker_phrases(speaker) for a speaker's phrases across all shards.
+
+    Each shard is a plain Store: shard(i) or Store(shard_paths[i]) can be
+    filled by a separate process, writing the audios route() assigns to
+    shard i plus all speakers.
+    """
+
+    def __init__(self, path, n_shards = None, route = hash_route,
+        verbose = False, readonly = False, **store_kwargs):
+        self.path = Path(path)
+        self.route = route
+        self.n_shards = self._read_manifest(n_shards, readonly)
+        self.shard_paths = [self.path / f'shard_{i:03d}'
+            for i in range(self.n_shards)]
+        self.readonly = readonly
+        self.shards = [Store(path, verbose = verbose, readonly = readonly,
+            **store_kwargs) for path in self.shard_paths]
+        self.closed = False
+        self._index_audios()
+        self.attach_query_roots()
+
+    def __repr__(self):
+        m = f'<ShardedStore path {self.path} | shards {self.n_shards} | '
+        m += f'audios {len(self._audio_shard)}>'
+        return m
+
+    def _read_manifest(self, n_shards, readonly):
+        '''n_shards from path/shards.json; written on first creation.'''
+        manifest = self.path / manifest_name
+        if manifest.exists():
+            stored = json.loads(manifest.read_text())['n_shards']
+            if n_shards not in (None, stored):
+                m = f'{self.path} holds {stored} shards, not {n_shards}'
+                raise ValueError(m)
+            return stored
+        if n_shards is None or readonly:
+            raise ValueError(f'no sharded store at {self.path}; '
+                'pass n_shards to create one')
+        self.path.mkdir(parents = True, exist_ok = True)
+        manifest.write_text(json.dumps({'n_shards': n_shards}))
+        return n_shards
+
+    def _index_audios(self):
+        '''audio_id -> shard index, read from the shards (one seek per
+        audio), so any router's placement is found again.'''
+        self._audio_shard = {}
+        for index, shard in enumerate(self.shards):
+            for audio_id in shard.DB.audio_ids():
+                self._audio_shard[audio_id] = index
+
+    def attach_query_roots(self):
+        '''Query roots (self.audios, self.phrases, ...) over all shards;
+        QuerySet only needs load_many, rank_to_keys_dict and class_count
+        from its store, which fan out here.'''
+        from . import query
+        self.CLASS_MAP = self.shards[0].CLASS_MAP
+        self.relations_to_class_map = {}
+        self._query_roots = {}
+        for class_name, cls in self.CLASS_MAP.items():
+            attr = class_name.lower() + 's'
+            root = query.get_class_object(cls, self)
+            setattr(self, attr, root)
+            self.relations_to_class_map[attr] = cls
+            self._query_roots[cls] = root
+
+    def query_for_class(self, cls):
+        return self._query_roots[cls]
+
+    def refresh_query_roots(self):
+        for shard in self.shards: shard.refresh_query_roots()
+        self.attach_query_roots()
+
+    # ------------------ routing ------------------
+
+    def shard(self, index):
+        return self.shards[index]
+
+    def shard_index_for_audio_id(self, audio_id):
+        try: return self._audio_shard[audio_id]
+        except KeyError:
+            m = f'audio {audio_id.hex()} is in no shard; save its Audio first'
+            raise KeyError(m) from None
+
+    def shard_index_for_key(self, key):
+        '''Shard of a row key; Speaker rows are read from shard 0.'''
+        if key_helper.row_key_to_rank(key) == CLASS_RANK_MAP['Speaker']:
+            return 0
+        return self.shard_index_for_audio_id(key[1:9])
+
+    def _shard_index_for(self, obj):
+        if obj.object_type == 'Speaker': return None
+        if obj.object_type == 'Audio':
+            index = self._audio_shard.get(obj.identifier)
+            if index is None:
+                index = self.route(obj, self.n_shards)
+                self._audio_shard[obj.identifier] = index
+            return index
+        return self.shard_index_for_audio_id(obj.audio_id)
+
+    def create(self, cls, **kwargs):
+        '''Create an instance of cls bound to the shard it belongs to:
+        an Audio to the routed shard, a segment to its audio's shard and
+        a Speaker to shard 0 (saving it writes it to every shard).'''
+        save = kwargs.pop('save', False)
+        overwrite = kwargs.get('overwrite', False)
+        obj = cls(**kwargs)
+        index = self._shard_index_for(obj)
+        self.shards[index or 0].attach(obj)
+        if save: self.save(obj, overwrite = overwrite)
+        return obj
+
+    # ------------------ writes ------------------
+
+    def save(self, obj, overwrite = False, fail_gracefully = False):
+        self.save_many([obj], overwrite = overwrite,
+            fail_gracefully = fail_gracefully)
+
+    def save_many(self, objs, overwrite = False, fail_gracefully = False):
+        '''Save objects in their shards, one save_many per shard;
+        Speakers are written to every shard.'''
+        for index, group in self._group_objects(objs).items():
+            self.shards[index].save_many(group, overwrite = overwrite,
+                fail_gracefully = fail_gracefully)
+
+    def save_phrase_trees(self, phrases, overwrite = False):
+        '''Store.save_phrase_trees per shard of the phrases' audios.'''
+        for index, group in self._group_objects(phrases).items():
+            self.shards[index].save_phrase_trees(group,
+                overwrite = overwrite)
+
+    def _group_objects(self, objs):
+        objs = list(objs)
+        # place new audios first: their segments may come earlier
+        for obj in objs:
+            if obj.object_type == 'Audio': self._shard_index_for(obj)
+        groups = {}
+        for obj in objs:
+            index = self._shard_index_for(obj)
+            if index is not None:
+                groups.setdefault(index, []).append(obj)
+                continue
+            # speaker: the object itself goes to the shard it is bound
+            # to (shard 0 unless attached elsewhere), copies to the rest
+            home = getattr(obj, '_store', None)
+            for index, shard in enumerate(self.shards):
+                if home is None and index == 0: home = shard
+                replica = obj
+                if shard is not home:
+                    replica = copy.copy(obj)
+                    replica._store = shard
+                groups.setdefault(index, []).append(replica)
+        return groups
+
+    # ------------------ reads ------------------
+
+    def load(self, key):
+        return self.shards[self.shard_index_for_key(key)].load(key)
+
+    def load_many(self, keys):
+        '''Load keys from their shards (one load_many per shard) and
+        return the objects in the order of keys.'''
+        positions = {}
+        for position, key in enumerate(keys):
+            index = self.shard_index_for_key(key)
+            positions.setdefault(index, []).append(position)
+        objs = [None] * len(keys)
+        for index, shard_positions in positions.items():
+            shard_keys = [keys[p] for p in shard_positions]
+            loaded = self.shards[index].load_many(shard_keys)
+            for position, obj in zip(shard_positions, loaded):
+                objs[position] = obj
+        return objs
+
+    def rank_to_keys_dict(self, update = False):
+        '''Per rank, the keys of all shards in key order (Speakers once).'''
+        if not update and hasattr(self, '_rank_to_keys_dict'):
+            return self._rank_to_keys_dict
+        dicts = [shard.rank_to_keys_dict(update = update)
+            for shard in self.shards]
+        d = {}
+        for rank in RANK_CLASS_MAP:
+            if rank == CLASS_RANK_MAP['Speaker']:
+                d[rank] = list(dicts[0].get(rank, []))
+            else:
+                d[rank] = list(heapq.merge(*[x.get(rank, []) for x in dicts]))
+        self._rank_to_keys_dict = d
+        return d
+
+    def rank_to_count_dict(self):
+        counts = [shard.rank_to_count_dict() for shard in self.shards]
+        d = {}
+        for rank in RANK_CLASS_MAP:
+            if rank == CLASS_RANK_MAP['Speaker']:
+                d[rank] = counts[0].get(rank, 0)
+            else: d[rank] = sum(c.get(rank, 0) for c in counts)
+        return d
+
+    def class_count(self, object_type):
+        return self.rank_to_count_dict()[CLASS_RANK_MAP[object_type]]
+
+    def preload_class_instances(self, cls = None, class_name = None):
+        if cls is None: cls = self.CLASS_MAP[class_name]
+        if cls.__name__ == 'Speaker':
+            self.shards[0].preload_class_instances(cls)
+            return
+        for shard in self.shards: shard.preload_class_instances(cls)
+
+    def label_to_instances(self, label, object_type):
+        instances = []
+        for shard in self.shards:
+            instances += shard.label_to_instances(label, object_type)
+        return instances
+
+    def index_keys(self, object_type, lookup, value):
+        '''Store.index_keys of every shard, merged; None unless every
+        shard answers.'''
+        found = [shard.index_keys(object_type, lookup, value)
+            for shard in self.shards]
+        if any(keys is None for keys in found): return None
+        return list(heapq.merge(*found))
+
+    def speaker_phrases(self, speaker):
+        '''The speaker's phrases in all shards.'''
+        phrases = []
+        for shard in self.shards:
+            shard_speaker = copy.copy(speaker)
+            shard_speaker._store = shard
+            phrases += shard.load_many(
+                shard.DB.speaker_to_phrase_keys(shard_speaker))
+        return phrases
+
+    @contextmanager
+    def snapshot(self):
+        '''One pinned read snapshot per shard for the block.'''
+        with ExitStack() as stack:
+            for shard in self.shards: stack.enter_context(shard.snapshot())
+            yield self
+
+    def open(self):
+        for shard in self.shards: shard.open()
+        self.closed = False
+        self._index_audios()
+
+    def close(self):
+        for shard in self.shards: shard.close()
+        self.closed = True
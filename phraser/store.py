@@ -1,14 +1,25 @@
+import bisect
+from contextlib import contextmanager
 import gc
+import math
+import numbers
 import pickle
 import random
+import struct
+import sys
 import time
 
+from . import index_helper
+from .cache import ObjectCache
 from . import key_helper
 from . import lmdb_helper
 from . import locations
 from . import save_validation
 from . import struct_value
 from . import utils
+from .lmdb_helper import ReadOnlyStoreError
+from .model_helper import EMPTY_ID
+from .segment_table import SegmentTable
 from .struct_helper import CLASS_RANK_MAP, RANK_CLASS_MAP
 
 R= "\033[91m"
@@ -17,6 +28,13 @@ B= "\033[94m"
 GR= "\033[90m"
 RE= "\033[0m"
 
+# named lookups answered by a code bitmap: (class, name) -> (field, codes)
+CODE_NAMES = {
+    ('Syllable', 'stress'): ('stress_code',
+        {'unstressed': 0, 'primary': 1, 'secondary': 2}),
+    ('Phone', 'position'): ('position_code',
+        {'onset': 1, 'nucleus': 2, 'coda': 3}),
+}
 
 class UnboundStoreError(RuntimeError):
     pass
@@ -35,15 +53,53 @@ class Store:
 
     Query roots such as store.words are snapshots for the read/query phase.
     Write/build first, then call refresh_query_roots() or reopen the store
-    before relying on store-level query roots.
+    before relying on store-level query roots; catch_up() applies only the
+    changes logged since (also those written by other processes).
+    change_log_limit caps the change log at that many entries (see
+    catch_up); by default it grows until trim_change_log.
+
+    readonly=True opens the database without write access and without
+    the LMDB lock file, so many analysis processes can read one database
+    side by side; every write method raises ReadOnlyStoreError. Only use
+    it while no process writes to the database.
+
+    map_size is the initial LMDB map size in bytes; writes that fill the
+    map double it and retry.
+
+    cache is the object cache (phraser.cache): unbounded by default; an
+    LRUCache or WeakCache bounds memory for passes over large classes.
+
+    fraction samples the database for exploration: about that fraction
+    of the recordings (sample_by='audio') or speakers ('speaker') is
+    loaded whole, with parents and children linked, and the query roots
+    cover only the sample. stratify (an Audio/Speaker field such as
+    'dataset' or 'dialect', or a function of the object) samples each
+    group separately; seed makes the sample reproducible (the seed used
+    is kept in sample_seed).
+
+    lazy=True loads segments with only their key and fixed fields
+    (start, end, ids, codes) decoded; the strings (label, ...) are
+    decoded on first access, so scans that read only timing or ids skip
+    the UTF-8 decoding.
     """
 
     def __init__(self, path = locations.cgn_lmdb, fraction = None,
-        verbose = False):
+        verbose = False, readonly = False, readahead = True,
+        max_readers = 126, map_size = 1024**4, index_fields = None,
+        cache = None, lazy = False, sample_by = 'audio', stratify = None,
+        seed = None, change_log_limit = None):
         t = time.time()
-        self.DB = lmdb_helper.DB(path = path)
+        if fraction is not None: check_sample_args(fraction, sample_by)
+        self.DB = lmdb_helper.DB(path = path, map_size = map_size,
+            readonly = readonly, readahead = readahead,
+            max_readers = max_readers, index_fields = index_fields,
+            change_log_limit = change_log_limit)
         self.path = path
-        self._cache = {}      # key:str → object
+        self.readonly = readonly
+        self.lazy = lazy
+        # key → object; unbounded unless a bounded cache is given
+        if cache is None: cache = ObjectCache()
+        self._cache = cache
         self.CLASS_MAP = {}
         self.save_counter = {}
         self.load_counter = {}
@@ -52,26 +108,31 @@ class Store:
         self._classes_loaded = {}
         self.fraction = None
         self.closed = False
+        self._session_keys = None
+        self._shared_values = {}
+        self._change_seq = self.DB.last_change_seq()
         self._register_default_classes()
         if fraction is not None:
-            self._preload_sampled_fraction(fraction)
+            self._preload_sampled_fraction(fraction, sample_by, stratify,
+                seed)
         print(f'Store loaded in {time.time() - t:.2f} seconds')
 
     def __repr__(self):
         m = f'<{R}Store{RE} {B}path{RE} {self.path} | '
+        if self.readonly: m += f'{B}read-only{RE} | '
         m += f'{B}cached objects{RE} {len(self._cache)}>'
         return m
 
     def __str__(self):
-        d = self.rank_to_keys_dict()
+        d = self.rank_to_count_dict()
         m = self.__repr__() + '\n'
         m += f'{G}cached objects per class:{RE}\n'
         for class_name, count in self.load_counter.items():
             m += f'  {B}{class_name:<9}{RE} {count}\n'
         m += f'{G}db objects per class:{RE}\n'
-        for rank, keys in d.items():
+        for rank, count in d.items():
             class_name = RANK_CLASS_MAP.get(rank, str(rank))
-            m += f'  {B}{class_name:<9}{RE} {len(keys)}\n'
+            m += f'  {B}{class_name:<9}{RE} {count}\n'
         m += f'{G}saved objects per class (this session):{RE}\n'
         for class_name, count in self.save_counter.items():
             m += f'  {B}{class_name:<9}{RE} {count}\n'
@@ -144,10 +205,61 @@ class Store:
         read/query phase. Saves and deletes intentionally do not update query
         roots live.
         '''
+        self._change_seq = self.DB.last_change_seq()
         if hasattr(self, '_rank_to_keys_dict'):
             del self._rank_to_keys_dict
         self.attach_query_roots()
 
+    def catch_up(self):
+        '''Apply the database changes logged since this store last looked
+        (open, refresh_query_roots or catch_up), e.g. written by another
+        process: changed or deleted objects leave the cache, and the key
+        lists of rank_to_keys_dict and the query roots gain new keys and
+        lose deleted ones. Cheap to poll: without changes it reads one
+        log entry. Returns the number of changes applied, or None when
+        the log was trimmed past this store and it fell back to clearing
+        the cache and refresh_query_roots.
+        The log gains one entry per written or deleted row. Call
+        trim_change_log() after catch_up once every reader has caught up,
+        or open with change_log_limit to keep only the newest entries.
+        '''
+        self._ensure_open()
+        if self.DB.last_change_seq() == self._change_seq: return 0
+        try: changes = self.DB.changes_since(self._change_seq)
+        except LookupError:
+            self._cache.clear()
+            self._classes_loaded = {}
+            self.refresh_query_roots()
+            return None
+        if not changes: return 0
+        ops = {}
+        for _, op, key in changes:
+            ops[key] = op
+            self._cache.pop(key, None)
+        by_rank = {}
+        for key, op in ops.items():
+            by_rank.setdefault(key[9], []).append((key, op))
+        for rank, rank_ops in by_rank.items():
+            self._classes_loaded.pop(RANK_CLASS_MAP[rank], None)
+            keys = getattr(self, '_rank_to_keys_dict', {}).get(rank)
+            if keys is not None: apply_key_changes(keys, rank_ops)
+            for root in self._query_roots.values():
+                data = root._data
+                if data.rank != rank: continue
+                root.__dict__.pop('_objs', None)
+                if data._keys is None or data._keys is keys: continue
+                apply_key_changes(data._keys, rank_ops)
+        self._change_seq = changes[-1][0]
+        return len(changes)
+
+    def trim_change_log(self, upto_seq = None):
+        '''Drop the change-log entries up to upto_seq (default: those this
+        store has applied, i.e. up to its last catch_up). Readers still
+        behind upto_seq fall back to a full refresh on their catch_up.'''
+        self._ensure_open()
+        if upto_seq is None: upto_seq = self._change_seq
+        self.DB.trim_change_log(upto_seq)
+
     def create(self, cls, **kwargs):
         '''Create an instance of cls bound to this store.
         e.g. store.create(Audio, filename='x.wav')
@@ -181,34 +293,35 @@ class Store:
         fail_gracefully : if True, print a message and skip saving if object
                           exists in database
         '''
-        self._ensure_open()
+        self._ensure_writable()
         self._validate_for_save(obj)
         self._bind(obj)
         key = key_helper.instance_to_key(obj)
         value = struct_value.pack_instance(obj)
         fail_message = f"Object with key {key} already exists. "
         fail_message += "Skipping save."
-        try: self.DB.write(key = key, value = value, overwrite = overwrite)
-            
+        label_keys = items_to_label_index_keys([obj])
+        try: self.DB.write_with_label_links([key], [value], label_keys,
+            overwrite = overwrite)
         except KeyError as e:
             if fail_gracefully:
                 print(fail_message)
                 return
             else: raise e
         stamp_persisted_identity(obj, key)
-        self._cache[key] = obj
+        self._cache_saved([key], [obj])
         self.save_counter[obj.object_type] += 1
         if key not in self.save_key_counter:
             self.save_key_counter[key] = 1
         else: self.save_key_counter[key] += 1
-        self._handle_label_links([obj])
 
     def save_many(self, objs, overwrite = False, fail_gracefully = False):
-        self._ensure_open()
+        self._ensure_writable()
         start = time.time()
         objs = list(objs)
         keys, values = self._prepare_batch(objs)
-        try: self.DB.write_many(keys, values,
+        label_keys = items_to_label_index_keys(objs)
+        try: self.DB.write_with_label_links(keys, values, label_keys,
             overwrite = overwrite)
 
         except KeyError as e:
@@ -220,7 +333,6 @@ class Store:
             else: raise e
 
         self._finalize_batch(objs, keys)
-        self._handle_label_links(objs)
 
     def _prepare_batch(self, objs):
         '''Validate, bind and pack a batch; nothing is written.'''
@@ -238,7 +350,7 @@ class Store:
         objects, count the saves.'''
         for obj, key in zip(objs, keys):
             stamp_persisted_identity(obj, key)
-        self._cache.update(zip(keys, objs))
+        self._cache_saved(keys, objs)
         for key in keys:
             if key not in self.save_key_counter:
                 self.save_key_counter[key] = 1
@@ -266,6 +378,7 @@ class Store:
         save_many, which raises if any key already exists. Nothing is
         written when any validation fails.
         '''
+        self._ensure_writable()
         phrases = list(phrases)
         if not phrases: return
         save_validation.validate_phrase_trees(self, phrases)
@@ -300,12 +413,60 @@ class Store:
             if key not in written: self._cache.pop(key, None)
         self._finalize_batch(segments, keys)
 
-    def _handle_label_links(self, objs):
-        '''after saving objects, write label index links for all objects with
-        label_index_key attributes (e.g., Phrase, Word)'''
-        label_index_keys = items_to_label_index_keys(objs)
-        if label_index_keys:
-            self.DB.write_many_label_index_links(label_index_keys)
+    def _cache_saved(self, keys, objs):
+        '''Cache saved objects; inside a session, remember their keys so
+        an aborted session can drop them again, and pin them until the
+        session ends.'''
+        if self._session_keys is not None:
+            self._session_keys.extend(keys)
+            for key in keys: self._cache.pin(key)
+        self._cache.update(zip(keys, objs))
+
+    @contextmanager
+    def session(self, commit_every = None):
+        '''Collect every write inside the block (saves, overwrites,
+        deletes, label-index and speaker-audio links) into one LMDB
+        transaction, committed once on exit: one commit per batch instead
+        of several per object. If the block raises, nothing of it is
+        written and the objects it saved are dropped from the cache.
+        Reads inside the block see its writes.
+        commit_every:  commit after this many write calls (e.g. saves)
+                       and continue in a new transaction; an error then
+                       only rolls back the current chunk
+        with store.session():
+            for syllable in syllables: syllable.save()
+        '''
+        self._ensure_writable()
+        if self._session_keys is not None:
+            yield self
+            return
+        self._session_keys = []
+        try:
+            with self.DB.session(commit_every = commit_every):
+                yield self
+        except BaseException:
+            for key in self._session_keys: self._cache.pop(key, None)
+            raise
+        finally:
+            for key in self._session_keys: self._cache.unpin(key)
+            self._session_keys = None
+
+    def pin(self, *objs):
+        '''Keep these objects (by key) in the cache until unpin, even in a
+        bounded cache: e.g. objects edited but not saved yet, which a
+        reload must not replace by a fresh copy.'''
+        for obj in objs:
+            self._cache.pin(obj.key)
+            if obj.key not in self._cache and self.DB.key_exists(obj.key):
+                self._cache[obj.key] = obj
+
+    def unpin(self, *objs):
+        for obj in objs: self._cache.unpin(obj.key)
+
+    def cache_stats(self):
+        '''Object cache counters: objects, pinned, hits, misses and
+        evictions (see cache.ObjectCache.stats).'''
+        return self._cache.stats()
 
     def get_cached(self, key):
         '''Return the already-loaded object for key, or None.
@@ -318,8 +479,8 @@ class Store:
         key: to load the object from the database.
         '''
         self._ensure_open()
-        try: return self._bind(self._cache[key])
-        except KeyError: pass
+        obj = self._cache.lookup(key)
+        if obj is not None: return self._bind(obj)
         value = self.DB.load(key = key) 
         obj = value_key_to_instance(self, value, key)
         self._bind(obj)
@@ -349,9 +510,10 @@ class Store:
         found_in_cache = []
         not_found_in_cache = []
         for index, key in enumerate(keys):
-            if key in self._cache:
+            obj = self._cache.lookup(key)
+            if obj is not None:
                 found_in_cache.append(key)
-                objs[index] = self._bind(self._cache[key])
+                objs[index] = self._bind(obj)
             else:
                 not_found_in_cache.append(key)
         if self.verbose: print(time.time() - start, 'cache checked')
@@ -384,6 +546,20 @@ class Store:
         if self.verbose: print('gc enabled', time.time() - start)
         return objs
 
+    @contextmanager
+    def snapshot(self):
+        '''Pin one LMDB read transaction for all database reads inside the
+        block: navigation such as phrase.children -> load_many -> children
+        sees one consistent database state and skips the per-call
+        transaction setup. Writes made inside the block are not visible
+        to its reads.
+        with store.snapshot():
+            for word in phrase.words: word.syllables
+        '''
+        self._ensure_open()
+        with self.DB.snapshot():
+            yield self
+
     def label_to_instances(self, label, object_type):
         '''Return all instances of object_type whose label matches label.
         label:       the surface form to look up (e.g. "the")
@@ -396,24 +572,202 @@ class Store:
         instances = self.load_many(keys)
         return instances
 
+    def label_prefix_to_instances(self, prefix, object_type):
+        '''Return all instances of object_type whose label starts with
+        prefix, in label order. Reads only the matching key range of the
+        ordered label index.
+        Example: store.label_prefix_to_instances("ver", "Word")
+        '''
+        self._ensure_open()
+        keys = self.DB.label_prefix_keys(object_type, prefix)
+        return self.load_many(keys)
+
+    def label_range_to_instances(self, object_type, low = None, high = None):
+        '''Return all instances of object_type with low <= label <= high
+        (None: open end), in label order.'''
+        self._ensure_open()
+        keys = self.DB.label_range_keys(object_type, low, high)
+        return self.load_many(keys)
+
+    def labels(self, object_type, prefix = ''):
+        '''Sorted distinct labels of object_type, optionally starting
+        with prefix, without loading any instance.'''
+        self._ensure_open()
+        return self.DB.labels(object_type, prefix)
+
+    def index_keys(self, object_type, lookup, value):
+        '''Keys (sorted) of object_type instances that may match
+        filter(**{lookup: value}), read from a database index, or None
+        when no index answers the lookup. QuerySet loads only these keys
+        and still applies the filter, so a superset is fine.
+        Answered: label (exact, eq, in, startswith, range, gt, gte, lt,
+        lte) from the ordered label index (a derived index, rebuilt with
+        the others, unlike the label_segment links, which can lack rows);
+        Audio and Speaker fields (exact, eq, in) from the field indexes;
+        segment code fields (see bitmap_index_keys) from the bitmaps;
+        segment duration (exact, eq, in, range, gt, gte, lt, lte) from the
+        duration index.
+        '''
+        field, _, op = lookup.partition('__')
+        if object_type in ('Audio', 'Speaker'):
+            return self._field_index_keys(object_type, field, op, value)
+        keys, rest = self.bitmap_index_keys(object_type, [(lookup, value)])
+        if not rest: return keys
+        if object_type not in key_helper.SEGMENT_CLASSES: return None
+        if field == 'duration':
+            return self._duration_index_keys(object_type, op, value)
+        if field != 'label': return None
+        if not self.DB.has_index('label_order'): return None
+        if op in ('', 'exact', 'eq'): values = [value]
+        elif op == 'in': values = list(value)
+        else: values = None
+        if values is not None:
+            if not all(isinstance(v, str) for v in values): return None
+            keys = set()
+            for v in values:
+                keys.update(self.DB.label_range_keys(object_type, v, v))
+            return sorted(keys)
+        if not isinstance(value, (str, tuple, list)): return None
+        if op == 'startswith':
+            keys = self.DB.label_prefix_keys(object_type, value)
+        elif op == 'range':
+            keys = self.DB.label_range_keys(object_type, *value)
+        elif op in ('gt', 'gte'):
+            keys = self.DB.label_range_keys(object_type, low = value)
+        elif op in ('lt', 'lte'):
+            keys = self.DB.label_range_keys(object_type, high = value)
+        else: return None
+        return sorted(keys)
+
+    def bitmap_index_keys(self, object_type, lookups):
+        '''Resolve the code lookups among lookups ([(lookup, value)]) with
+        one AND/OR over the code bitmaps: overlap_code, stress_code and
+        position_code (exact, eq, in), and Syllable stress / Phone position
+        by name. Returns (sorted keys or None, the lookups not resolved).
+        The keys cover the whole class, so QuerySet only asks for store-wide
+        roots, not for querysets of given items.
+        '''
+        conditions, rest = {}, []
+        fields = index_helper.BITMAP_FIELDS.get(object_type, ())
+        for lookup, value in lookups:
+            field, _, op = lookup.partition('__')
+            if op in ('', 'exact', 'eq'): values = [value]
+            elif op == 'in': values = list(value)
+            else: values = None
+            if (object_type, field) in CODE_NAMES and values is not None:
+                field, names = CODE_NAMES[(object_type, field)]
+                if not all(v in names for v in values): values = None
+                else: values = [names[v] for v in values]
+            if field not in fields or values is None or \
+                not all(isinstance(v, int) and 0 <= v < 256 for v in values):
+                rest.append((lookup, value))
+                continue
+            codes = set(values)
+            if field in conditions: codes &= conditions[field]
+            conditions[field] = codes
+        if not conditions: return None, rest
+        keys = self.DB.bitmap_keys(object_type, conditions)
+        if keys is None: return None, lookups
+        return keys, rest
+
+    def _field_index_keys(self, object_type, field, op, value):
+        if op in ('', 'exact', 'eq'): values = [value]
+        elif op == 'in': values = list(value)
+        else: return None
+        if self.DB.field_index(object_type, field) is None: return None
+        kind = struct_value.field_type(object_type, field)
+        values = field_lookup_values(values, kind)
+        if values is None: return None
+        keys = set()
+        for v in values:
+            keys.update(self.DB.field_keys(object_type, field, v))
+        return sorted(keys)
+
+    def _duration_index_keys(self, object_type, op, value):
+        if op in ('', 'exact', 'eq', 'in'):
+            values = list(value) if op == 'in' else [value]
+            bounds = [(v, v) for v in values]
+        elif op == 'range': bounds = [tuple(value)]
+        elif op in ('gt', 'gte'): bounds = [(value, None)]
+        elif op in ('lt', 'lte'): bounds = [(None, value)]
+        else: return None
+        numbers = [b for pair in bounds for b in pair if b is not None]
+        if not all(isinstance(b, (int, float)) for b in numbers): return None
+        if not self.DB.has_index('duration'): return None
+        keys = set()
+        for low, high in bounds:
+            bounds = whole_ms_bounds(low, high, op)
+            if bounds is None: continue
+            keys.update(self.DB.duration_keys(object_type, *bounds))
+        return sorted(keys)
+
+    def shortest(self, object_type, n):
+        '''The n shortest object_type segments, shortest first, from the
+        duration index. Example: store.shortest('Phone', 100)'''
+        self._ensure_open()
+        return self.load_many(self.DB.duration_keys(object_type, limit = n))
+
+    def longest(self, object_type, n):
+        '''The n longest object_type segments, longest first; the 1%
+        longest words: store.longest('Word', store.class_count('Word') // 100)
+        '''
+        self._ensure_open()
+        return self.load_many(self.DB.duration_keys(object_type, limit = n,
+            longest = True))
+
+    def table(self, object_type):
+        '''A SegmentTable: the fixed fields of every object_type segment
+        as NumPy arrays, decoded from one scan of the class rows without
+        building objects. For whole-corpus statistics:
+        phones = store.table('Phone')
+        phones.duration[phones.label_mask('a')].mean()'''
+        self._ensure_open()
+        return SegmentTable.from_rows(object_type,
+            self.DB.iter_class_rows(object_type))
+
     def delete(self, key):
         '''delete an object from LMDB by key'''
-        self._ensure_open()
+        self._ensure_writable()
         self.DB.delete(key = key)
         if key in self._cache: del self._cache[key]
 
     def delete_many(self, keys):
         '''delete many objects from LMDB by keys'''
-        self._ensure_open()
+        self._ensure_writable()
         self.DB.delete_many(keys = keys)
         for key in keys:
             if key in self._cache: del self._cache[key]
 
+    def drop_audio(self, audio_id):
+        '''delete an audio and everything recorded in it (segments, label
+        links, speaker links, index entries) in one transaction, without
+        loading objects; e.g. before re-importing a recording.
+        Returns the number of deleted objects.'''
+        self._ensure_writable()
+        keys = self.DB.drop_audio(audio_id)
+        self._forget(keys)
+        return len(keys)
+
+    def drop_phrase_trees(self, phrases):
+        '''delete phrases with the words, syllables and phones they own,
+        their label links and index entries, in one transaction, without
+        loading the descendants. Returns the number of deleted objects.'''
+        self._ensure_writable()
+        keys = self.DB.drop_phrase_trees([phrase.key for phrase in phrases])
+        self._forget(keys)
+        return len(keys)
+
+    def _forget(self, keys):
+        for key in keys:
+            self._cache.pop(key, None)
+
     def update(self, old_key, obj):
         '''delete old_key and save obj with new key'''
+        self._ensure_writable()
         self._validate_for_save(obj)
-        self.delete(old_key)
-        self.save(obj, overwrite=True)
+        with self.session():
+            self.delete(old_key)
+            self.save(obj, overwrite=True)
         if old_key in self._cache: del self._cache[old_key]
             
     def rank_to_keys_dict(self, update = False):
@@ -426,6 +780,54 @@ class Store:
         self._rank_to_keys_dict = d
         return self._rank_to_keys_dict
 
+    def rank_to_count_dict(self):
+        '''return a dict mapping rank to the number of objects in the db.
+        Read from the class counts the db keeps current on every write, so
+        unlike rank_to_keys_dict it is never stale and never scans.'''
+        self._ensure_open()
+        return self.DB.rank_to_count_dict()
+
+    def class_count(self, object_type):
+        '''number of objects of object_type (class name) in the db'''
+        self._ensure_open()
+        return self.DB.count_object_type(object_type)
+
+    def stats(self):
+        '''LMDB environment statistics: file and map size, used and free
+        pages, and entries, depth and pages per sub-db (see DB.stats).'''
+        self._ensure_open()
+        return self.DB.stats()
+
+    def compact(self, dest):
+        '''Write a compacted copy of the database to the directory dest
+        and report the data file size before and after. The copy drops
+        the free pages that replace/delete cycles leave behind; open it
+        with Store(dest) (or move it in place) to use it.'''
+        self._ensure_open()
+        report = self.DB.compact(dest)
+        mb = 1024 ** 2
+        m = f'compacted {report["before"] / mb:.1f} MB '
+        m += f'to {report["after"] / mb:.1f} MB in {report["path"]}'
+        print(m)
+        return report
+
+    def extract(self, dest_path, audios = (), speakers = ()):
+        '''Copy a subset to a new store at dest_path (e.g. one component,
+        a set of speakers or the test split for a laptop or CI): whole
+        recordings of audios and of the recordings speakers appear in,
+        with their speakers, links and index entries, as raw rows.
+        audios, speakers:  objects or identifiers
+        Returns {'path', 'audios', 'speakers', 'rows'}; open the subset
+        with Store(dest_path).'''
+        self._ensure_open()
+        audio_ids = [getattr(a, 'identifier', a) for a in audios]
+        speaker_ids = [getattr(s, 'identifier', s) for s in speakers]
+        report = self.DB.extract(dest_path, audio_ids, speaker_ids)
+        m = f'extracted {report["audios"]} audios, {report["speakers"]} '
+        m += f'speakers ({report["rows"]} rows) to {report["path"]}'
+        print(m)
+        return report
+
     def all_keys(self):
         self._ensure_open()
         return self.DB.all_keys()
@@ -450,17 +852,70 @@ class Store:
         m = f'Loaded all objects of class: {cls.__name__}'
         m += f', in {duration:.2f} seconds.'
         if self.verbose: print(m) 
-        self._classes_loaded[class_name] = True
-
-    def _preload_sampled_fraction(self, fraction):
-        '''preload a fraction of all objects per class'''
-        self.fraction = fraction
-        if self.fraction is None: return
-        phrases = sample_instances_from_class(self, 'Phrase', self.fraction)
-        d = load_hierarchy_from_phrases(self, phrases['instances'])
-        d['Phrase'] = phrases
-        for key in self.CLASS_MAP.keys():
-            if key in d: self._classes_loaded[key] = True
+        # a bounded cache may already have dropped some of them
+        if not self._cache.bounded: self._classes_loaded[class_name] = True
+
+    def _preload_sampled_fraction(self, fraction, sample_by = 'audio',
+        stratify = None, seed = None):
+        '''Load a sample of whole recordings or speakers, link the loaded
+        segments to their parents and children, and restrict the query
+        roots and rank_to_keys_dict to the sample.'''
+        if seed is None: seed = random.randrange(2**32)
+        self.fraction, self.sample_seed = fraction, seed
+        start = time.time()
+        if sample_by == 'audio':
+            keys = [key_helper.audio_id_to_key(i)
+                for i in self.DB.audio_ids()]
+            # recordings with segments but no Audio row are left out
+            audios = self._load_rows([(key, value) for key, value
+                in zip(keys, self.DB.load_many(keys)) if value is not None])
+            audios = stratified_sample(audios, fraction, stratify, seed)
+            audio_ids = [audio.identifier for audio in audios]
+            objs = self._load_rows(self.DB.audio_rows(audio_ids))
+            speaker_ids = {obj.speaker_id for obj in objs
+                if obj.object_type in key_helper.SEGMENT_CLASSES}
+            objs += self.load_many([key_helper.speaker_id_to_key(i)
+                for i in sorted(speaker_ids)])
+        else:
+            speakers = self.load_many(self.DB.speaker_keys())
+            speakers = stratified_sample(speakers, fraction, stratify, seed)
+            speaker_ids = {speaker.identifier for speaker in speakers}
+            audio_ids = {key_helper.key_to_audio_identifier(key)
+                for speaker in speakers
+                for key in self.DB.speaker_to_audio_keys(speaker)}
+            # other speakers' segments in the same recordings stay out
+            rows = [(key, value)
+                for key, value in self.DB.audio_rows(audio_ids)
+                if not key_helper.is_segment_key(key) or
+                row_speaker_id(key, value) in speaker_ids]
+            objs = self._load_rows(rows) + speakers
+        link_loaded_segments(objs)
+        keys = {rank: [] for rank in RANK_CLASS_MAP}
+        for obj in objs: keys[CLASS_RANK_MAP[obj.object_type]].append(obj.key)
+        for rank_keys in keys.values(): rank_keys.sort()
+        self._rank_to_keys_dict = keys
+        for cls, root in self._query_roots.items():
+            root._data.keys = keys[CLASS_RANK_MAP[cls.__name__]]
+        for class_name in self.CLASS_MAP:
+            if not self._cache.bounded: self._classes_loaded[class_name] = True
+        if self.verbose:
+            m = f'Sampled {len(audio_ids)} recordings ({len(objs)} objects, '
+            m += f'seed {seed}) in {time.time() - start:.2f} seconds.'
+            print(m)
+
+    def _load_rows(self, rows):
+        '''Objects for raw (key, value) main rows, from the cache when
+        already loaded.'''
+        objs = []
+        for key, value in rows:
+            obj = self._cache.get(key)
+            if obj is None:
+                obj = value_key_to_instance(self, value, key)
+                self._bind(obj)
+                self._cache[key] = obj
+                self.load_counter[obj.object_type] += 1
+            objs.append(obj)
+        return objs
 
     def open(self):
         '''(Re)open the underlying LMDB environment.
@@ -487,6 +942,14 @@ class Store:
             raise ClosedStoreError(
                 'Store is closed. Call store.open() to reopen it.')
 
+    def _ensure_writable(self):
+        '''raise ClosedStoreError or ReadOnlyStoreError unless the store
+        can write'''
+        self._ensure_open()
+        if self.readonly:
+            raise ReadOnlyStoreError(
+                'Store is read-only. Construct Store(path) to write.')
+
     def __del__(self):
         '''Close the LMDB environment when the store is garbage collected.'''
         try: self.close()
@@ -496,22 +959,116 @@ class Store:
 
 
 
+def apply_key_changes(keys, ops):
+    '''Update a sorted key list in place with [(key, op)] change-log ops.
+    Idempotent: present keys are not added twice.'''
+    deleted = {key for key, op in ops if op == index_helper.CHANGE_DELETE}
+    if deleted: keys[:] = [key for key in keys if key not in deleted]
+    for key, op in ops:
+        if op != index_helper.CHANGE_PUT: continue
+        i = bisect.bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key: keys.insert(i, key)
+
+
+def whole_ms_bounds(low, high, op):
+    '''Round duration bounds (ms, None: open end) inwards to whole ms
+    for the duration index: (low, high), or None when no duration fits.
+    Infinite bounds and bounds past the u32 range become open ends.'''
+    if low is not None:
+        if math.isnan(low) or low == math.inf: return None
+        if low == -math.inf: low = None
+        else: low = math.floor(low) + 1 if op == 'gt' else math.ceil(low)
+    if high is not None:
+        if math.isnan(high) or high == -math.inf: return None
+        if high == math.inf: high = None
+        else: high = math.ceil(high) - 1 if op == 'lt' else math.floor(high)
+    if low is not None and low <= 0: low = None
+    if high is not None and high >= key_helper.MAX_DURATION: high = None
+    if high is not None and high < 0: return None
+    if low is not None and low > key_helper.MAX_DURATION: return None
+    if low is not None and high is not None and low > high: return None
+    return low, high
+
+
+def field_lookup_values(values, kind):
+    '''The lookup values as the field index stores them (str of the
+    value of the stored type kind), leaving out numbers no stored value
+    equals (9.5 for an int field), so the index returns the rows the
+    Python filter (==) matches. None when a value cannot be converted
+    that way; the filter then scans.'''
+    out = []
+    for value in values:
+        if isinstance(value, kind) and (kind is bool or
+            not isinstance(value, bool)):
+            out.append(value)
+        elif kind in (int, float) and isinstance(value, numbers.Real):
+            if not math.isfinite(value):
+                if kind is float: out.append(float(value))
+            elif kind is float or value == int(value):
+                out.append(kind(value))
+        else: return None
+    return out
+
+
 def value_key_to_instance(store, value, key):
     '''convert value, key loaded from LMDB to an instance of cls
     this speeds up loading by avoiding __init__ calls
     '''
 
+    if store.lazy and len(key) == key_helper.SEGMENT_KEY_LENGTH:
+        cls = store.CLASS_MAP[RANK_CLASS_MAP[key[9]]]
+        return lazy_value_key_to_instance(store, cls, value, key)
     info = key_helper.key_to_info(key)
     object_type = info['object_type']
     cls = store.CLASS_MAP[object_type]
     obj = cls.__new__(cls)
     data = struct_value.unpack_instance(object_type, value)
     data.update(info)
-    obj.__dict__.update(data)
+    share_repeated_values(store, data, object_type)
+    for name, field_value in data.items():
+        setattr(obj, name, field_value)
+    stamp_persisted_identity(obj, key)
+    return obj
+
+
+def lazy_value_key_to_instance(store, cls, value, key):
+    '''value_key_to_instance for a lazy store: the key and fixed header
+    fields go straight into the slots, without a dict; the strings stay
+    in _raw_strings until first read (Segment.__getattr__).'''
+    obj = cls.__new__(cls)
+    values = cls._FIXED_STRUCT.unpack_from(value)
+    for member, field_value in zip(cls._FIXED_MEMBERS, values):
+        member.__set__(obj, field_value)
+    _, audio_id, _, start, identifier = struct.unpack(key_helper.SEGMENT_FMT,
+        key)
+    shared = store._shared_values
+    obj.object_type = cls.__name__
+    obj.identifier = identifier
+    obj.start = start
+    obj.audio_id = shared.setdefault(audio_id, audio_id)
+    obj.speaker_id = shared.setdefault(obj.speaker_id, obj.speaker_id)
+    obj._raw_strings = value
     stamp_persisted_identity(obj, key)
     return obj
 
 
+def share_repeated_values(store, data, object_type):
+    '''Replace the values many loaded rows repeat by one shared object:
+    audio and speaker ids from the store's table (if store is given),
+    empty links by EMPTY_ID and short segment labels interned.'''
+    if store is not None:
+        shared = store._shared_values
+        for name in ('audio_id', 'speaker_id'):
+            value = data.get(name)
+            if value is not None:
+                data[name] = shared.setdefault(value, value)
+    for name in ('parent_id', 'phrase_id'):
+        if data.get(name) == EMPTY_ID: data[name] = EMPTY_ID
+    label = data.get('label')
+    if label is not None and object_type != 'Phrase' and \
+        len(label) <= 16: data['label'] = sys.intern(label)
+
+
 def stamp_persisted_identity(obj, key):
     '''Remember the persisted identity snapshot on load and save:
     _key carries the audio_id; speaker_id is value-only, so it gets
@@ -530,80 +1087,64 @@ def stamp_persisted_identity(obj, key):
     
 
 
-def collect_attribute_keys(objs, attr_name):
-    '''Given a list of objects, return a flat list of the specified attribute keys
-    e.g., 'audio_key', 'speaker_key'.
-    '''
-    keys = []
-    append = keys.append  # local binding for speed
-    for obj in objs:
-        key = getattr(obj, attr_name, None)
-        if key is not None:
-            append(key)
-    return keys
+def check_sample_args(fraction, sample_by):
+    if sample_by not in ('audio', 'speaker'):
+        raise ValueError(f'sample_by must be audio or speaker: {sample_by}')
+    if not 0 < fraction <= 1:
+        raise ValueError(f'fraction must be in (0, 1]: {fraction}')
 
-def load_phrase_descendants(store, phrases):
-    '''
-    load all descendants of given parent objects in order of classes.
-    all descendants are bulk loaded per class to minimize LMDB hits.
-    
-    parents: list of root objects
-    Returns a dict [class_name] = {'keys':keys, 'instances':objects}.
-    '''
-    results = {}
-    word_keys, syllable_keys, phone_keys = [], [], []  
-    for phrase in phrases:
-        k = store.DB.instance_to_child_keys(phrase, 'Word')
-        if k: word_keys.extend(k)
-        k = store.DB.instance_to_child_keys(phrase, 'Syllable')
-        if k: syllable_keys.extend(k)
-        k = store.DB.instance_to_child_keys(phrase, 'Phone')
-        if k: phone_keys.extend(k)
-    items=[('Word',word_keys),('Syllable',syllable_keys),('Phone',phone_keys)]
-    for child_class_name, child_keys in items:
-        instances = store.load_many(child_keys)
-        results[child_class_name] = {'keys': child_keys,'instances':instances}
-    return results
-
-
-def load_linked_audio_and_speakers(store, objs):
-    '''based on a list of objects with audio_key and speaker_key attributes,
-    load all linked audio and speaker objects in bulk.
-    '''
-    audio_keys   = collect_attribute_keys(objs, 'audio_key')
-    speaker_keys = collect_attribute_keys(objs, 'speaker_key')
-
-    # dedupe (optional)
-    audio_keys   = list(set(audio_keys))
-    speaker_keys = list(set(speaker_keys))
 
-    audios   = store.load_many(audio_keys)
-    speakers = store.load_many(speaker_keys)
-    d = {}
-    d['Audio']   = {'keys': audio_keys,   'instances': audios}
-    d['Speaker'] = {'keys': speaker_keys, 'instances': speakers}
-    return d
-
-
-def load_hierarchy_from_phrases(store, phrases):
-    '''load words, syllables, phones, audios, and speakers linked to 
-    the list of phrases in bulk per class
-    this avoids repeated LMDB hits when loading linked objects per phrase
+def stratified_sample(objs, fraction, stratify = None, seed = 0):
+    '''A reproducible sample of about fraction of objs: the objects are
+    ordered by key and grouped by stratify (a field name, a function of
+    an object, or None for one group); every group contributes
+    max(1, round(fraction * size)) objects drawn with random.Random(seed).
     '''
-    instances_dict =  load_phrase_descendants(store, phrases)
-    audio_speaker_dict = load_linked_audio_and_speakers(store, phrases)
-    instances_dict.update(audio_speaker_dict)
-    return instances_dict
-
-def sample_instances_from_class(store, class_name = 'Phrase', fraction = 0.1):
-    '''randomly sample a fraction of all objects of the given class'''
-    rank = key_helper.CLASS_RANK_MAP[class_name]
-    try: keys = store.rank_to_keys_dict()[rank]
-    except KeyError: keys = []
-    n_sample = max(1, int(len(keys) * fraction))
-    sampled_keys = random.sample(keys, n_sample)
-    sampled_objects = store.load_many(sampled_keys)
-    return {'keys': sampled_keys, 'instances': sampled_objects} 
+    if isinstance(stratify, str):
+        field = stratify
+        stratify = lambda obj: getattr(obj, field, None)
+    groups = {}
+    for obj in sorted(objs, key = lambda obj: obj.key):
+        stratum = None if stratify is None else stratify(obj)
+        groups.setdefault(stratum, []).append(obj)
+    rng = random.Random(seed)
+    sample = []
+    for stratum in sorted(groups, key = repr):
+        group = groups[stratum]
+        n = max(1, round(fraction * len(group)))
+        sample.extend(rng.sample(group, n))
+    return sample
+
+
+def row_speaker_id(key, value):
+    '''speaker_id of a segment row, from the fixed value header.'''
+    object_type = RANK_CLASS_MAP[key[9]]
+    return struct_value.unpack_fixed(object_type, value)['speaker_id']
+
+
+def link_loaded_segments(objs):
+    '''Set the parent and children links of loaded segments among
+    themselves, so navigating a loaded tree reads nothing: children in
+    key order, orphans with parent None. Segments whose parent is not
+    among objs keep an unresolved (lazily loaded) parent link.'''
+    by_identifier = {}
+    segments = []
+    for obj in objs:
+        if obj.object_type not in key_helper.SEGMENT_CLASSES: continue
+        by_identifier[obj.identifier] = obj
+        segments.append(obj)
+        if obj.allowed_child_type is not None: obj._children = []
+    segments.sort(key = lambda obj: obj.key)
+    for obj in segments:
+        if obj.object_type == 'Phrase': continue
+        if obj.parent_id == EMPTY_ID:
+            obj._parent = None
+            continue
+        parent = by_identifier.get(obj.parent_id)
+        if parent is None: continue
+        obj._parent = parent
+        parent._children.append(obj)
+
 
 def items_to_label_index_keys(items):
     label_index_keys = []
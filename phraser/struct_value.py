@@ -1,4 +1,5 @@
 import struct 
+from functools import lru_cache
 
 VERSION = 1
 
@@ -16,6 +17,62 @@ def unpack_instance(object_type, value_bytes):
         raise ValueError(f'Unsupported object type: {object_type}')
     return f(value_bytes)
 
+def unpack_fixed(object_type, value_bytes):
+    '''Unpack only the fixed header of a value to a dict; the
+    variable-length strings are not decoded.'''
+    layout = LAYOUTS[object_type.lower()]
+    fixed_vals = struct.unpack_from(layout['fixed_fmt'], value_bytes)
+    return dict(zip(layout['fixed_fields'], fixed_vals))
+
+def unpack_strings(object_type, value_bytes):
+    '''Unpack only the variable-length strings of a value to a dict; the
+    fixed header is skipped.'''
+    layout = LAYOUTS[object_type.lower()]
+    pos = struct.calcsize(layout['fixed_fmt'])
+    out = {}
+    for name, bits in _parse_var_fields(layout['fields'], object_type):
+        out[name], pos = _unpack_str(value_bytes, pos, bits)
+    return out
+
+def string_fields(object_type):
+    '''Names of the variable-length string fields of object_type.'''
+    layout = LAYOUTS[object_type.lower()]
+    return [name for name, _ in _parse_var_fields(layout['fields'],
+        object_type)]
+
+def field_type(object_type, field):
+    '''Python type of a stored field of object_type as unpack_instance
+    returns it: str for the string fields, else that of its fixed format
+    (int, float, bytes or bool).'''
+    if field in string_fields(object_type): return str
+    layout = LAYOUTS[object_type.lower()]
+    fmt = layout['fixed_fmt']
+    zeros = struct.unpack(fmt, bytes(struct.calcsize(fmt)))
+    return type(dict(zip(layout['fixed_fields'], zeros))[field])
+
+def unpack_label(object_type, value_bytes):
+    '''Decode only the label of a value: the fixed header is skipped and
+    variable fields before the label are stepped over.'''
+    label_layout = _label_layout(object_type)
+    if label_layout is None: return None
+    pos, prefix_bits = label_layout
+    for bits in prefix_bits:
+        text, pos = _unpack_str(value_bytes, pos, bits)
+    return text
+
+@lru_cache(maxsize=None)
+def _label_layout(object_type):
+    '''(offset of the variable fields, length prefix bits of the fields
+    up to and including the label) of object_type, or None without a
+    label field.'''
+    layout = LAYOUTS[object_type.lower()]
+    prefix_bits = []
+    for name, bits in _parse_var_fields(layout['fields'], object_type):
+        prefix_bits.append(bits)
+        if name == 'label':
+            return struct.calcsize(layout['fixed_fmt']), tuple(prefix_bits)
+    return None
+
 def pack_audio(instance):
     '''Pack Audio value bytes from dict.
     layout: layout dict for audio
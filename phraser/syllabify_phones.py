@@ -156,7 +156,7 @@ def _rebuild_word(phrase, old_word, syllables, cursor):
     word = models.Word(store=phrase.store, label=old_word.label,
         start=start, end=end, audio_id=old_word.audio_id,
         speaker_id=old_word.speaker_id)
-    for field, value in old_word.__dict__.items():      # carry persisted metadata
+    for field, value in old_word.attribute_dict().items():  # carry metadata
         if field in models.Word.METADATA_FIELDS:        # set ones only (skips the
             setattr(word, field, value)                 # derived 'overlap' property)
     word._children, word._overlapping = syllables, []
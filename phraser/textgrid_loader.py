@@ -85,6 +85,10 @@ def save_textgrid_items(items, store=None, existing='append'):
     Existence checks are scoped to phrases linked to the same audio, then matched
     by Phrase equality: `(audio_id, speaker_id, start)`. Multiple matches raise
     ValueError. The function returns `added`, `skipped`, or `replaced`.
+
+    With content identifiers (`content_ids=True` at conversion) an unchanged
+    re-import has the key of the stored phrase: one key lookup finds it, and it
+    is skipped or overwritten in place without loading the audio's phrases.
     '''
     validate_textgrid_existing_mode(existing)
     items = list(items)
@@ -93,6 +97,11 @@ def save_textgrid_items(items, store=None, existing='append'):
         store.save_many(items)
         return 'added'
     phrase = require_single_textgrid_phrase(items)
+    if store.DB.key_exists(phrase.key):
+        # same phrase key, same tree: every item has its stored key
+        if existing == 'add_missing': return 'skipped'
+        store.save_many(items, overwrite=True)
+        return 'replaced'
     matches = find_matching_textgrid_phrases(phrase, store=store)
     validate_textgrid_match_count(matches, phrase)
     if existing == 'add_missing':
@@ -191,12 +200,14 @@ def items_to_label_index_keys(items):
 
 def textgrid_filename_to_database_objects(textgrid_filename, offset = 0, 
     audio = None, speaker = None, overwrite = False, multiple_speakers = None,
-    store=None):
+    store=None, content_ids=False):
     '''Build store-bound objects from a TextGrid.
 
     This is staging mode: objects are bound to `store`, individual
     constructor/link writes are suppressed, and `save_textgrid_items()` persists
-    them later.
+    them later. `content_ids=True` derives the identifiers from the content
+    (`Phrase.use_content_identifiers`), so re-importing an unchanged TextGrid
+    yields the same keys.
     '''
     validate_textgrid_overwrite(overwrite)
     if audio is None or speaker is None:
@@ -238,6 +249,7 @@ def textgrid_filename_to_database_objects(textgrid_filename, offset = 0,
     if multiple_speakers is False:
         for item in items:
             item.overlap_code = no_overlap_code
+    if content_ids: phrase.use_content_identifiers(extra=items)
     return items
          
 def words_to_phrase(words, textgrid_filename, store=None, kwargs=None):
@@ -350,7 +362,7 @@ def find_and_add_phones_to_syllable(syllable, phones, save_to_db=False,
 def load_single_audio_and_transcription_to_db(audio_filename, text = None, 
     speaker = None,textgrid_filename = None, do_force_align = False, 
     save_to_db = True, textgrid_output_dir = None, store=None,
-    existing='append', audio=None):
+    existing='append', audio=None, content_ids=False):
     '''Load a transcription, optionally force-aligning first.
 
     Returns the same object list as `load_single_audio_textgrid_to_db()`.
@@ -371,12 +383,12 @@ def load_single_audio_and_transcription_to_db(audio_filename, text = None,
         textgrid_filename = o['output_file']
     db_objects = load_single_audio_textgrid_to_db(audio_filename, 
         textgrid_filename, speaker = speaker, save_to_db = save_to_db,
-        store=store, existing=existing, audio=audio)
+        store=store, existing=existing, audio=audio, content_ids=content_ids)
     return db_objects
 
 def load_single_audio_textgrid_to_db(audio_filename, textgrid_filename,
     speaker = None, save_to_db = True, store=None, existing='append',
-    audio=None):
+    audio=None, content_ids=False):
     '''Load one audio/TextGrid pair.
 
     When `save_to_db=False`, returns staged objects: audio plus TextGrid items.
@@ -392,7 +404,7 @@ def load_single_audio_textgrid_to_db(audio_filename, textgrid_filename,
         audio = audio_filename_to_db_object(
             audio_filename, save_to_db=False, store=store)
     items = textgrid_filename_to_database_objects(textgrid_filename,
-        audio=audio, speaker=speaker, store=store)
+        audio=audio, speaker=speaker, store=store, content_ids=content_ids)
     db_objects = [audio] + items
     if save_to_db:
         stored_objects = []
@@ -419,7 +431,8 @@ def audio_filename_to_db_object(audio_filename, save_to_db = False, kwargs=None,
     return audio_object
 
 def load_audios_textgrids_to_db(audio_filenames, textgrid_filenames, speakers, 
-    save_to_db = True, store=None, existing='append', audios=None):
+    save_to_db = True, store=None, existing='append', audios=None,
+    content_ids=False):
     '''Load audio/TextGrid pairs.
 
     Returns the concatenated object lists from `load_single_audio_textgrid_to_db()`.
@@ -449,13 +462,13 @@ def load_audios_textgrids_to_db(audio_filenames, textgrid_filenames, speakers,
         objs = load_single_audio_textgrid_to_db(
             audio_filename, textgrid_filename, speaker = speaker,
             save_to_db = save_to_db, store=store, existing=existing,
-            audio=audio_object)
+            audio=audio_object, content_ids=content_ids)
         db_objects.extend(objs)
     return db_objects
     
 def load_speaker_audios_textgrids_to_db(speaker, audio_filenames, 
     textgrid_filenames, save_to_db = True, store=None, existing='append',
-    audios=None):
+    audios=None, content_ids=False):
     '''Load audio/TextGrid pairs for one speaker.
 
     Returns the same object list as `load_audios_textgrids_to_db()`.
@@ -469,7 +482,8 @@ def load_speaker_audios_textgrids_to_db(speaker, audio_filenames,
     speakers = [speaker] * len(audio_filenames)
     db_objects = load_audios_textgrids_to_db(
         audio_filenames, textgrid_filenames, speakers,
-        save_to_db = save_to_db, store=store, existing=existing, audios=audios)
+        save_to_db = save_to_db, store=store, existing=existing, audios=audios,
+        content_ids=content_ids)
     return db_objects
     
 def get_phrases_from_items(items):
@@ -0,0 +1,48 @@
+'''Shared fixture of the store tests: a Store in a temporary directory,
+with helpers to open it again and to add a recording.'''
+
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Speaker
+
+
+class StoreTestCase(unittest.TestCase):
+    '''Each test gets self.store, a Store on a fresh temporary directory
+    (self.tmpdir); stores are closed and the directory removed after the
+    test.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = self.open_store()
+
+    def open_store(self, **kwargs):
+        '''Open a Store on self.tmpdir without its progress output.'''
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=self.tmpdir, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def add_recording(self, filename='test.wav', speaker_name='spk'):
+        '''Save an Audio and a Speaker and set self.identity, the
+        audio_id and speaker_id of segments in them. Returns (audio,
+        speaker).'''
+        audio = self.store.create(Audio, filename=filename,
+            duration=60_000, save=True)
+        speaker = self.store.create(Speaker, name=speaker_name,
+            dataset='test', save=True)
+        self.identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        return audio, speaker
+
+    def save_quietly(self, objs, clear_cache=True):
+        '''save_many without progress output; by default the cache is
+        emptied afterwards, so tests can count loads.'''
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(objs)
+        if clear_cache: self.store._cache.clear()
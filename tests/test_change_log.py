@@ -0,0 +1,109 @@
+import io
+import multiprocessing
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser import index_helper
+from phraser.models import Word
+from store_fixture import StoreTestCase
+
+
+def write_words(path, labels):
+    '''Another process appending words, like an ingestion job.'''
+    with redirect_stdout(io.StringIO()):
+        store = Store(path=path)
+        audio = store.audios.get(filename='log.wav')
+        speaker = store.speakers.get(name='spk')
+        words = [store.create(Word, label=label, start=10_000 + i * 100,
+            end=10_000 + i * 100 + 50, audio_id=audio.identifier,
+            speaker_id=speaker.identifier) for i, label in enumerate(labels)]
+        store.save_many(words)
+    store.close()
+
+
+class TestChangeLog(StoreTestCase):
+    '''Writes append to the change log; catch_up applies only the delta
+    to the cache and the query-root key lists.'''
+
+    def setUp(self):
+        super().setUp()
+        self.add_recording('log.wav')
+        words = [self.store.create(Word, label=label, start=i * 100,
+            end=i * 100 + 50, **self.identity)
+            for i, label in enumerate(['a', 'b', 'c'])]
+        self.save_quietly(words, clear_cache=False)
+        self.words = words
+
+    def test_writes_are_logged_in_order(self):
+        start = self.store.DB.last_change_seq()
+        word = self.words[0]
+        word.label = 'z'
+        word.save(overwrite=True)
+        self.store.delete(self.words[1].key)
+        changes = self.store.DB.changes_since(start)
+        self.assertEqual([seq for seq, _, _ in changes],
+            [start + 1, start + 2])
+        self.assertEqual([(op, key) for _, op, key in changes],
+            [(index_helper.CHANGE_PUT, word.key),
+            (index_helper.CHANGE_DELETE, self.words[1].key)])
+
+    def test_catch_up_applies_delta_from_other_process(self):
+        self.assertEqual(len(self.store.words.filter(label='a')), 1)
+        # the store's own five saves since it opened
+        self.assertEqual(self.store.catch_up(), 5)
+        self.assertEqual(self.store.catch_up(), 0)
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(target=write_words,
+            args=(self.tmpdir, ['d', 'e']))
+        process.start()
+        process.join()
+        self.assertEqual(self.store.catch_up(), 2)
+        self.assertEqual(len(self.store.words._data.keys), 5)
+        self.assertEqual([w.label for w in self.store.words],
+            ['a', 'b', 'c', 'd', 'e'])
+        self.store.DB.drop_audio(self.identity['audio_id'])
+        self.assertEqual(self.store.catch_up(), 6)
+        self.assertEqual(list(self.store.words), [])
+        self.assertNotIn(self.words[0].key, self.store._cache)
+
+    def test_trimmed_log_falls_back_to_refresh(self):
+        seq = self.store.DB.last_change_seq()
+        self.store._change_seq = 0
+        self.store.DB.trim_change_log(seq)
+        self.assertEqual(self.store.DB.last_change_seq(), seq)
+        self.assertIsNone(self.store.catch_up())
+        self.assertEqual(self.store._change_seq, seq)
+        self.assertEqual(len(list(self.store.words)), 3)
+
+    def test_store_trims_what_it_has_applied(self):
+        self.store.catch_up()
+        seq = self.store.DB.last_change_seq()
+        self.store.trim_change_log()
+        self.assertEqual(self.store.DB.changes_since(seq - 1),
+            [(seq, index_helper.CHANGE_PUT, self.words[-1].key)])
+        with self.assertRaises(LookupError):
+            self.store.DB.changes_since(0)
+        self.store.delete(self.words[0].key)
+        self.assertEqual(self.store.catch_up(), 1)
+
+    def test_limit_keeps_newest_entries(self):
+        self.store.close()
+        store = self.open_store(change_log_limit=2)
+        seq = store.DB.last_change_seq()
+        words = [store.create(Word, label=label, start=1_000 + i * 100,
+            end=1_000 + i * 100 + 50, **self.identity)
+            for i, label in enumerate(['d', 'e', 'f'])]
+        with redirect_stdout(io.StringIO()):
+            store.save_many(words)
+        changes = store.DB.changes_since(seq + 1)
+        self.assertEqual([c[0] for c in changes], [seq + 2, seq + 3])
+        with self.assertRaises(LookupError):
+            store.DB.changes_since(seq)
+
+    def test_rebuild_keeps_log(self):
+        seq = self.store.DB.last_change_seq()
+        with redirect_stdout(io.StringIO()):
+            self.store.DB.rebuild_indexes()
+        self.assertEqual(self.store.DB.last_change_seq(), seq)
+        self.assertEqual(len(self.store.DB.changes_since(0)), seq)
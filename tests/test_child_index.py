@@ -0,0 +1,90 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+class TestChildIndex(unittest.TestCase):
+    '''Segment.children reads the parent -> child index and loads only
+    owned rows; overlapping is a separate time-window query.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        self.audio = self.store.create(Audio, filename='child.wav',
+            duration=60_000, save=True)
+        self.speakers = [self.store.create(Speaker, name=name,
+            dataset='test', save=True) for name in ('a', 'b')]
+
+    def _phrase(self, speaker, label, start, end, words):
+        identity = {'audio_id': self.audio.identifier,
+            'speaker_id': speaker.identifier}
+        phrase = self.store.create(Phrase, label=label, start=start,
+            end=end, **identity)
+        phrase.add_children([self.store.create(Word, label=word,
+            start=word_start, end=word_end, **identity)
+            for word, word_start, word_end in words])
+        return phrase
+
+    def _save_two_speakers(self):
+        mine = self._phrase(self.speakers[0], 'mine', 0, 1_000,
+            [('a1', 0, 400), ('a2', 400, 1_000)])
+        theirs = self._phrase(self.speakers[1], 'theirs', 200, 900,
+            [('b1', 200, 500), ('b2', 500, 900)])
+        with redirect_stdout(io.StringIO()):
+            self.store.save_phrase_trees([mine, theirs])
+        self.store._cache.clear()
+        return mine, theirs
+
+    def test_children_load_only_owned_rows(self):
+        mine, _ = self._save_two_speakers()
+        loaded = self.store.load(mine.key)
+
+        keys = self.store.DB.instance_to_owned_child_keys(loaded)
+        self.assertEqual(len(keys), 2)
+        self.assertEqual([w.label for w in loaded.children], ['a1', 'a2'])
+        self.assertEqual(self.store.load_counter['Word'], 2)
+        self.assertEqual([w.label for w in loaded.overlapping],
+            ['b1', 'b2'])
+
+    def test_replaced_tree_drops_old_children(self):
+        mine, _ = self._save_two_speakers()
+        loaded = self.store.load(mine.key)
+        identity = {'audio_id': self.audio.identifier,
+            'speaker_id': self.speakers[0].identifier}
+        loaded.replace_children([self.store.create(Word, label='new',
+            start=0, end=1_000, **identity)])
+        with redirect_stdout(io.StringIO()):
+            self.store.save_phrase_trees([loaded], overwrite=True)
+        self.store._cache.clear()
+
+        reloaded = self.store.load(mine.key)
+        self.assertEqual([w.label for w in reloaded.children], ['new'])
+
+    def test_fallback_without_index(self):
+        mine, _ = self._save_two_speakers()
+        database = self.store.DB
+        with database.env.begin(write=True) as txn:
+            txn.drop(database.db['child'], delete=False)
+            txn.delete(b'built:child', db=database.db['meta'])
+        loaded = self.store.load(mine.key)
+
+        self.assertFalse(database.has_index('child'))
+        self.assertEqual([w.label for w in loaded.children], ['a1', 'a2'])
+
+        with redirect_stdout(io.StringIO()):
+            database.open()
+        self.assertTrue(database.has_index('child'))
+        self.assertEqual(len(database.instance_to_owned_child_keys(loaded)),
+            2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from phraser import Store
+from phraser.models import Audio, Speaker, Word
+from phraser.query import Data, QuerySet
+
+
+class TestClassCounts(unittest.TestCase):
+    '''Per-class counts live in the meta sub-db: store open and
+    len(store.<root>) never scan main, and the counts follow saves,
+    overwrites and deletes.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=self.tmpdir)
+        self.addCleanup(self.store.close)
+        self.audio = self.store.create(Audio, filename='count.wav',
+            duration=10_000, save=True)
+        self.speaker = self.store.create(Speaker, name='spk',
+            dataset='test', save=True)
+        identity = {'audio_id': self.audio.identifier,
+            'speaker_id': self.speaker.identifier}
+        self.words = [self.store.create(Word, label=str(i), start=i * 100,
+            end=i * 100 + 50, **identity) for i in range(5)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(self.words)
+
+    def test_len_of_root_uses_counts_without_key_scan(self):
+        with mock.patch.object(self.store.DB, 'rank_to_keys_dict') as scan:
+            self.assertEqual(len(self.store.words), 5)
+            self.assertEqual(len(self.store.audios), 1)
+            self.assertEqual(self.store.speakers.count(), 1)
+        scan.assert_not_called()
+
+    def test_store_open_does_not_scan_main(self):
+        self.store.close()
+        with mock.patch('phraser.lmdb_helper.DB.rank_to_keys_dict') as scan:
+            with redirect_stdout(io.StringIO()):
+                store = Store(path=self.tmpdir)
+            self.addCleanup(store.close)
+            self.assertEqual(len(store.words), 5)
+        scan.assert_not_called()
+
+    def test_counts_follow_overwrite_and_delete(self):
+        word = self.words[0]
+        word.label = 'changed'
+        word.save(overwrite=True)
+        self.assertEqual(self.store.class_count('Word'), 5)
+
+        with redirect_stdout(io.StringIO()):
+            self.store.delete_many([w.key for w in self.words[:2]])
+
+        self.assertEqual(self.store.class_count('Word'), 3)
+        self.assertEqual(self.store.class_count('Audio'), 1)
+
+    def test_filtered_len_still_filters(self):
+        self.assertEqual(len(self.store.words.filter(label='3')), 1)
+
+    def test_len_agrees_with_cached_key_lists(self):
+        self.store.rank_to_keys_dict()
+        self.store.create(Word, label='late', start=900, end=950,
+            audio_id=self.audio.identifier,
+            speaker_id=self.speaker.identifier, save=True)
+        words = Data(Word, self.store)
+        self.assertEqual(len(QuerySet(words)), 5)
+        self.assertEqual(len(list(QuerySet(words))), 5)
+        self.assertEqual(self.store.class_count('Word'), 6)
+
+    def test_counts_match_key_scan(self):
+        keys = self.store.DB.rank_to_keys_dict()
+        counts = self.store.rank_to_count_dict()
+        for rank, rank_keys in keys.items():
+            with self.subTest(rank=rank):
+                self.assertEqual(counts[rank], len(rank_keys))
+
+
+if __name__ == '__main__':
+    unittest.main()
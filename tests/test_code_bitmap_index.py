@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+
+from phraser import index_helper
+from phraser.models import Phone, Syllable
+from phraser.query import queryset_from_items
+from store_fixture import StoreTestCase
+
+
+class TestCodeBitmapIndex(StoreTestCase):
+    '''Filters on segment code fields resolved from the code bitmaps,
+    and the bitmaps kept in step with saves and deletes.'''
+
+    # (stress_code, overlap_code) per syllable
+    codes = [(1, 0), (0, 0), (1, 1), (2, 0), (1, 0), (9, 9)]
+
+    def setUp(self):
+        super().setUp()
+        self.add_recording('code.wav')
+        syllables = []
+        for i, (stress, overlap) in enumerate(self.codes):
+            syllable = self.store.create(Syllable, label=f's{i}',
+                start=i * 1_000, end=i * 1_000 + 500, **self.identity)
+            syllable.stress_code = stress
+            syllable.overlap_code = overlap
+            syllables.append(syllable)
+        phones = []
+        for i, position in enumerate(['onset', 'nucleus', 'coda', 'coda']):
+            phone = self.store.create(Phone, label=f'p{i}',
+                start=i * 100, end=i * 100 + 50, **self.identity)
+            phone.position = position
+            phones.append(phone)
+        self.save_quietly(syllables + phones)
+
+    def _labels(self, keys):
+        return [self.store.load(key).label for key in keys]
+
+    def test_and_or_over_bitmaps(self):
+        keys = self.store.DB.bitmap_keys('Syllable',
+            {'stress_code': {1, 2}, 'overlap_code': {0}})
+        self.assertEqual(self._labels(keys), ['s0', 's3', 's4'])
+
+    def test_queryset_loads_only_matches(self):
+        syllables = list(self.store.syllables.filter(stress='primary',
+            overlap_code=0))
+        self.assertEqual([s.label for s in syllables], ['s0', 's4'])
+        self.assertEqual(self.store.load_counter['Syllable'], 2)
+        coda = list(self.store.phones.filter(position='coda'))
+        self.assertEqual([p.label for p in coda], ['p2', 'p3'])
+        self.assertEqual(self.store.load_counter['Phone'], 2)
+
+    def test_overwrite_and_delete_update_bits(self):
+        syllable = self.store.syllables.get(label='s1')
+        syllable.stress_code = 1
+        syllable.save(overwrite=True)
+        keys = self.store.DB.bitmap_keys('Syllable', {'stress_code': [1]})
+        self.assertEqual(self._labels(keys), ['s0', 's1', 's2', 's4'])
+        self.store.delete(syllable.key)
+        keys = self.store.DB.bitmap_keys('Syllable', {'stress_code': [0, 1]})
+        self.assertEqual(self._labels(keys), ['s0', 's2', 's4'])
+
+    def test_chunk_boundary(self):
+        self.store.DB.close()
+        chunk_bits = index_helper.BITMAP_CHUNK_BITS
+        index_helper.BITMAP_CHUNK_BITS = 8
+        self.addCleanup(setattr, index_helper, 'BITMAP_CHUNK_BITS',
+            chunk_bits)
+        store = self.open_store()
+        store.DB.build_index(index_helper.CodeBitmapIndex())
+        keys = store.DB.bitmap_keys('Phone', {'position_code': [3]})
+        self.assertEqual([store.load(key).label for key in keys],
+            ['p2', 'p3'])
+        keys = store.DB.bitmap_keys('Syllable', {'overlap_code': [9]})
+        self.assertEqual([store.load(key).label for key in keys], ['s5'])
+
+    def test_item_queryset_does_not_read_bitmaps(self):
+        items = [self.store.syllables.get(label=label)
+            for label in ('s0', 's1', 's3')]
+        with mock.patch.object(self.store.DB, 'bitmap_keys') as bitmaps:
+            syllables = queryset_from_items(items).filter(stress_code=1)
+            self.assertEqual([s.label for s in syllables], ['s0'])
+        bitmaps.assert_not_called()
+
+    def test_unindexed_field_is_not_resolved(self):
+        self.assertIsNone(self.store.DB.bitmap_keys('Word',
+            {'stress_code': [1]}))
+        keys, rest = self.store.bitmap_index_keys('Syllable',
+            [('stress_code__gt', 0), ('label', 's1')])
+        self.assertIsNone(keys)
+        self.assertEqual(len(rest), 2)
@@ -0,0 +1,77 @@
+import gc
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.model_helper import EMPTY_ID
+from phraser.models import Audio, Phone, Speaker, Syllable, Word
+
+
+class TestCompactSegments(unittest.TestCase):
+    '''Segments keep their fields in __slots__: a loaded segment has no
+    instance dict and shares repeated ids, with the same attributes and
+    properties as before.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        audio = self.store.create(Audio, filename='compact.wav',
+            duration=60_000, save=True)
+        speaker = self.store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        self.identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        syllable = self.store.create(Syllable, label='ta', start=0, end=200,
+            **self.identity)
+        syllable.add_children([self.store.create(Phone, label=label,
+            start=start, end=start + 100, **self.identity)
+            for label, start in (('t', 0), ('a', 100))])
+        syllable.children[0].position = 'onset'
+        orphan = self.store.create(Phone, label='t', start=300, end=350,
+            **self.identity)
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many([syllable, *syllable.children, orphan])
+        self.keys = [syllable.key] + [p.key for p in syllable.children] + \
+            [orphan.key]
+        self.store._cache.clear()
+
+    def test_loaded_segments_have_no_instance_dict(self):
+        syllable, onset, nucleus, orphan = self.store.load_many(self.keys)
+        for obj in (syllable, onset, nucleus, orphan):
+            self.assertFalse(any(isinstance(x, dict)
+                for x in gc.get_referents(obj)))
+        self.assertIs(onset.audio_id, orphan.audio_id)
+        self.assertIs(onset.speaker_id, syllable.speaker_id)
+        self.assertIs(orphan.parent_id, EMPTY_ID)
+        self.assertIs(onset.label, orphan.label)
+
+    def test_fields_and_properties(self):
+        syllable, onset, nucleus, orphan = self.store.load_many(self.keys)
+        self.assertEqual((onset.label, onset.start, onset.duration),
+            ('t', 0, 100))
+        self.assertEqual(syllable.children, [onset, nucleus])
+        self.assertIs(nucleus.parent, syllable)
+        self.assertIsNone(orphan.parent)
+        self.assertEqual(onset.position, 'onset')
+        self.assertEqual(syllable.stress_code, 9)
+        self.assertIn("label", str(onset))
+        fields = onset.attribute_dict()
+        self.assertEqual(fields['end'], 100)
+        self.assertIn('_persisted_speaker_id', fields)
+
+    def test_defaults_and_extra_attributes(self):
+        self.assertEqual((Syllable.stress_code, Phone.phrase_id),
+            (9, EMPTY_ID))
+        word = Word(label='w', start=0, end=10, foo='bar', **self.identity)
+        self.assertEqual((word.ipa, word.overlap_code), ('', 9))
+        self.assertEqual(word.foo, 'bar')
+        self.assertEqual(word.attribute_dict()['foo'], 'bar')
+        word.ipa = 'w'
+        del word.ipa
+        self.assertEqual(word.ipa, '')
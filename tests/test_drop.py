@@ -0,0 +1,83 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from phraser.models import Audio, Phone, Phrase, Speaker, Syllable, Word
+from store_fixture import StoreTestCase
+
+
+class TestDrop(StoreTestCase):
+    '''drop_audio and drop_phrase_trees delete by key range in one
+    transaction, label links included, without touching other trees.'''
+
+    def setUp(self):
+        super().setUp()
+        self.audios = [self.store.create(Audio, filename=f'{name}.wav',
+            duration=60_000, save=True) for name in ('a', 'b')]
+        self.speakers = [self.store.create(Speaker, name=name,
+            dataset='test', save=True) for name in ('a', 'b')]
+        trees = [self._phrase(self.audios[0], self.speakers[0], 'mine', 0),
+            self._phrase(self.audios[0], self.speakers[1], 'theirs', 200),
+            self._phrase(self.audios[1], self.speakers[0], 'other', 0)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_phrase_trees(trees)
+        for audio in self.audios:
+            self.speakers[0].add_audio(audio)
+        self.store._cache.clear()
+        self.trees = trees
+
+    def _phrase(self, audio, speaker, label, start):
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phrase = self.store.create(Phrase, label=label, start=start,
+            end=start + 800, **identity)
+        words = []
+        for i in range(2):
+            word_start = start + i * 400
+            word = self.store.create(Word, label=f'{label}{i}',
+                start=word_start, end=word_start + 400, **identity)
+            syllable = self.store.create(Syllable, label=f'{label}{i}',
+                start=word_start, end=word_start + 400, **identity)
+            syllable.add_children([self.store.create(Phone,
+                label=f'{label}{i}', start=word_start, end=word_start + 400,
+                **identity)])
+            word.add_children([syllable])
+            words.append(word)
+        phrase.add_children(words)
+        return phrase
+
+    def _labels(self, object_type):
+        return sorted(x.label for x in getattr(self.store,
+            object_type.lower() + 's'))
+
+    def test_drop_phrase_trees_keeps_overlapping_tree(self):
+        n = self.store.drop_phrase_trees([self.trees[0]])
+        self.assertEqual(n, 7)
+        self.assertEqual(self._labels('Phrase'), ['other', 'theirs'])
+        self.assertEqual(self._labels('Phone'),
+            ['other0', 'other1', 'theirs0', 'theirs1'])
+        self.assertEqual(list(self.store.DB.label_to_segment_keys('mine0',
+            'Word')), [])
+        self.assertEqual(self.store.class_count('Word'), 4)
+        theirs = self.store.load(self.trees[1].key)
+        self.assertEqual([w.label for w in theirs.children],
+            ['theirs0', 'theirs1'])
+
+    def test_drop_audio(self):
+        audio_id = self.audios[0].identifier
+        n = self.store.drop_audio(audio_id)
+        self.assertEqual(n, 15)
+        self.assertIsNone(self.store.audios.get_or_none(filename='a.wav'))
+        self.assertEqual(self._labels('Word'), ['other0', 'other1'])
+        self.assertEqual(len(self.store.DB.all_label_index_keys()), 7)
+        self.assertEqual(len(self.store.DB.all_links()), 1)
+        self.assertEqual(len(self.store.speakers), 2)
+        self.assertEqual(self.store.DB.overlapping_keys(audio_id, 'Word',
+            0, 60_000), [])
+
+    def test_phrase_delete_drops_label_links(self):
+        phrase = self.store.load(self.trees[2].key)
+        phrase.delete()
+        self.assertEqual(self._labels('Phrase'), ['mine', 'theirs'])
+        self.assertEqual(list(self.store.DB.label_to_segment_keys('other1',
+            'Phone')), [])
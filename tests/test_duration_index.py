@@ -0,0 +1,89 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phone, Speaker, Word
+
+
+class TestDurationIndex(unittest.TestCase):
+    '''Duration filters and the shortest/longest segments read a slice of
+    the duration index, and the index follows saves and deletes.'''
+
+    # phone durations in ms
+    durations = [40, 10, 30, 25, 120, 30, 75]
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        audio = self.store.create(Audio, filename='duration.wav',
+            duration=60_000, save=True)
+        speaker = self.store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phones = [self.store.create(Phone, label=f'p{d}', start=i * 1_000,
+            end=i * 1_000 + d, **identity)
+            for i, d in enumerate(self.durations)]
+        words = [self.store.create(Word, label='w', start=0, end=5,
+            **identity)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(phones + words)
+        self.store._cache.clear()
+
+    def _durations(self, objs):
+        return [obj.duration for obj in objs]
+
+    def test_range_filters_load_only_matches(self):
+        phones = list(self.store.phones.filter(duration__lt=30))
+        self.assertEqual(sorted(self._durations(phones)), [10, 25])
+        self.assertEqual(self.store.load_counter['Phone'], 2)
+        phones = self.store.phones.filter(duration__range=(25, 40))
+        self.assertEqual(sorted(self._durations(phones)), [25, 30, 30, 40])
+        phones = self.store.phones.filter(duration__gt=29.5,
+            duration__lte=75)
+        self.assertEqual(sorted(self._durations(phones)), [30, 30, 40, 75])
+        phones = self.store.phones.filter(duration__in=[10, 120, 11])
+        self.assertEqual(sorted(self._durations(phones)), [10, 120])
+
+    def test_unbounded_and_huge_bounds(self):
+        all_durations = sorted(self.durations)
+        phones = self.store.phones.filter(duration__lt=10**10)
+        self.assertEqual(sorted(self._durations(phones)), all_durations)
+        phones = self.store.phones.filter(duration__lte=float('inf'))
+        self.assertEqual(sorted(self._durations(phones)), all_durations)
+        phones = self.store.phones.filter(duration__gt=float('-inf'))
+        self.assertEqual(sorted(self._durations(phones)), all_durations)
+        self.assertEqual(len(self.store.phones.filter(
+            duration__gte=10**10)), 0)
+        self.assertEqual(len(self.store.phones.filter(
+            duration__range=(70, float('inf')))), 2)
+        keys = self.store.DB.duration_keys('Phone', low=100, high=2**40)
+        self.assertEqual(self._durations(self.store.load_many(keys)), [120])
+
+    def test_shortest_and_longest(self):
+        self.assertEqual(self._durations(self.store.longest('Phone', 2)),
+            [120, 75])
+        self.assertEqual(self._durations(self.store.shortest('Phone', 3)),
+            [10, 25, 30])
+        self.assertEqual(self._durations(self.store.longest('Word', 5)), [5])
+        keys = self.store.DB.duration_keys('Phone', low=30, high=40,
+            longest=True)
+        self.assertEqual(self._durations(self.store.load_many(keys)),
+            [40, 30, 30])
+
+    def test_overwrite_and_delete_update_index(self):
+        phone = self.store.longest('Phone', 1)[0]
+        phone.end = phone.start + 5
+        phone.save(overwrite=True)
+        self.assertEqual(self._durations(self.store.shortest('Phone', 1)),
+            [5])
+        self.store.delete(phone.key)
+        self.assertEqual(self._durations(self.store.longest('Phone', 1)),
+            [75])
+        self.assertEqual(len(self.store.DB.duration_keys('Phone')), 6)
@@ -0,0 +1,93 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from phraser import Store
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+class TestExtract(unittest.TestCase):
+    '''Store.extract copies whole recordings with their speakers, links
+    and index entries into a new store.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = self._open('source')
+        self.audios = [self.store.create(Audio, filename=f'{i}.wav',
+            duration=60_000, dataset='cgn', save=True) for i in range(3)]
+        self.speakers = [self.store.create(Speaker, name=f'spk{i}',
+            dataset='cgn', save=True) for i in range(4)]
+        # audio i holds phrases of speakers i and i + 1
+        trees = []
+        for i, audio in enumerate(self.audios):
+            for j in (i, i + 1):
+                trees.append(self._phrase(audio, self.speakers[j],
+                    f'a{i}s{j}', j * 1_000))
+        with redirect_stdout(io.StringIO()):
+            self.store.save_phrase_trees(trees)
+        self.speakers[0].add_audio(self.audios[0])
+
+    def _open(self, name, **kwargs):
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=str(Path(self.tmpdir) / name), **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def _phrase(self, audio, speaker, label, start):
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phrase = self.store.create(Phrase, label=label, start=start,
+            end=start + 800, **identity)
+        phrase.add_children([self.store.create(Word, label=label + 'w',
+            start=start, end=start + 800, **identity)])
+        return phrase
+
+    def test_extract_audio(self):
+        dest = str(Path(self.tmpdir) / 'subset')
+        with redirect_stdout(io.StringIO()):
+            report = self.store.extract(dest, audios=[self.audios[0]])
+        self.assertEqual((report['audios'], report['speakers'],
+            report['rows']), (1, 2, 7))
+        subset = self._open('subset')
+        self.assertEqual([a.filename for a in subset.audios], ['0.wav'])
+        self.assertEqual(sorted(s.name for s in subset.speakers),
+            ['spk0', 'spk1'])
+        self.assertEqual(subset.class_count('Word'), 2)
+        word = subset.words.get(label='a0s1w')
+        self.assertEqual(word.parent.label, 'a0s1')
+        self.assertEqual(len(subset.DB.all_links()), 1)
+        self.assertEqual(len(subset.audios.filter(dataset='cgn')), 1)
+        speaker = subset.speakers.get(name='spk1')
+        self.assertEqual([p.label for p in speaker.phrases], ['a0s1'])
+
+    def test_extract_speakers_takes_their_recordings(self):
+        dest = str(Path(self.tmpdir) / 'subset')
+        with redirect_stdout(io.StringIO()):
+            report = self.store.extract(dest,
+                speakers=[self.speakers[2].identifier])
+        self.assertEqual((report['audios'], report['speakers']), (2, 3))
+        subset = self._open('subset')
+        self.assertEqual(sorted(a.filename for a in subset.audios),
+            ['1.wav', '2.wav'])
+        self.assertEqual(subset.class_count('Phrase'), 4)
+
+    def test_extract_keeps_index_fields(self):
+        fields = {'Audio': ('dataset',)}
+        self.store.close()
+        store = self._open('source', index_fields=fields)
+        dest = str(Path(self.tmpdir) / 'subset')
+        with redirect_stdout(io.StringIO()):
+            store.extract(dest, audios=[self.audios[0]])
+        subset = self._open('subset', readonly=True, index_fields=fields)
+        self.assertEqual(len(subset.DB.field_keys('Audio', 'dataset',
+            'cgn')), 1)
+
+    def test_extract_refuses_non_empty_destination(self):
+        dest = str(Path(self.tmpdir) / 'source')
+        with self.assertRaises(ValueError):
+            self.store.DB.extract(dest + '_copy', [self.audios[0].identifier])
+            self.store.DB.extract(dest + '_copy', [self.audios[0].identifier])
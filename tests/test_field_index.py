@@ -0,0 +1,82 @@
+import unittest
+
+from phraser.models import Audio, Speaker
+from store_fixture import StoreTestCase
+
+
+class TestFieldIndex(StoreTestCase):
+    '''Audio and Speaker lookups on indexed fields load only the matching
+    objects, and the index follows saves and deletes.'''
+
+    def setUp(self):
+        super().setUp()
+        audios = [self.store.create(Audio, filename=f'fn{i:06d}.wav',
+            dataset='cgn' if i % 2 else 'ifadv', language='nl',
+            duration=1_000) for i in range(6)]
+        speakers = [self.store.create(Speaker, name=f'N0{i % 3}',
+            dataset='cgn' if i < 3 else 'ifadv') for i in range(6)]
+        for i, speaker in enumerate(speakers):
+            speaker.gender_code = i % 2
+        self.save_quietly(audios + speakers)
+
+    def test_get_by_filename_loads_one_audio(self):
+        audio = self.store.audios.get(filename='fn000003.wav')
+        self.assertEqual(audio.filename, 'fn000003.wav')
+        self.assertEqual(self.store.load_counter['Audio'], 1)
+
+    def test_speaker_identity_intersects_fields(self):
+        speaker = self.store.speakers.get(name='N01', dataset='ifadv')
+        self.assertEqual((speaker.name, speaker.dataset), ('N01', 'ifadv'))
+        self.assertEqual(self.store.load_counter['Speaker'], 1)
+
+    def test_metadata_filters(self):
+        audios = list(self.store.audios.filter(dataset='cgn'))
+        self.assertEqual(len(audios), 3)
+        speakers = list(self.store.speakers.filter(gender_code__in=[1]))
+        self.assertEqual(len(speakers), 3)
+        self.assertEqual(self.store.load_counter['Speaker'], 3)
+
+    def test_overwrite_and_delete_keep_index_in_sync(self):
+        audio = self.store.audios.get(filename='fn000001.wav')
+        audio.filename = 'renamed.wav'
+        audio.save(overwrite=True)
+        self.assertIsNone(
+            self.store.audios.get_or_none(filename='fn000001.wav'))
+        self.assertEqual(self.store.DB.field_keys('Audio', 'filename',
+            'renamed.wav'), [audio.key])
+        self.store.delete(audio.key)
+        self.assertEqual(self.store.DB.field_keys('Audio', 'filename',
+            'renamed.wav'), [])
+
+    def test_unindexed_field_falls_back(self):
+        self.assertIsNone(self.store.DB.field_keys('Audio', 'duration',
+            1_000))
+        self.assertEqual(len(self.store.audios.filter(duration=1_000)), 6)
+
+    def test_changed_fields_do_not_leave_stale_markers(self):
+        self.store.close()
+        store = self.open_store(index_fields={'Speaker': ('name',)})
+        store.create(Audio, filename='late.wav', dataset='cgn',
+            duration=1_000, save=True)
+        store.close()
+        store = self.open_store()
+        self.assertEqual(len(store.speakers.filter(dataset='ifadv')), 3)
+        self.assertEqual(len(store.DB.field_keys('Speaker', 'dataset',
+            'ifadv')), 3)
+        self.assertEqual(len(store.audios.filter(dataset='cgn')), 4)
+
+    def test_numeric_lookup_of_another_type(self):
+        speakers = self.store.speakers
+        self.assertEqual(len(speakers.filter(gender_code=1.0)), 3)
+        self.assertEqual(len(speakers.filter(gender_code__in=[True])), 3)
+        self.assertEqual(len(speakers.filter(gender_code=0.5)), 0)
+        self.assertEqual(len(speakers.filter(name=1)), 0)
+
+    def test_configured_fields_are_built_on_open(self):
+        self.store.close()
+        store = self.open_store(index_fields={'Audio': ('duration',)})
+        self.assertEqual(len(store.DB.field_keys('Audio', 'duration',
+            1_000)), 6)
+        self.assertIsNone(store.DB.field_keys('Speaker', 'name', 'N01'))
+        self.assertIsNone(store.DB.field_keys('Audio', 'filename',
+            'fn000001.wav'))
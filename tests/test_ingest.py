@@ -0,0 +1,126 @@
+import io
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.ingest import (IngestWriter, _commit_group, ingest,
+    pack_phrase_trees)
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+def make_tree(audio_id, speaker_id, label, start):
+    '''A staged phrase tree built without a Store, as a producer would.'''
+    identity = {'audio_id': audio_id, 'speaker_id': speaker_id}
+    phrase = Phrase(label=label, start=start, end=start + 800, **identity)
+    phrase.add_children([Word(label=f'{label}{i}', start=start + i * 400,
+        end=start + i * 400 + 400, **identity) for i in range(2)])
+    return phrase
+
+
+def produce(task):
+    audio_id, speaker_id, start = task
+    if start == -2: os._exit(3)
+    if start < 0: raise ValueError('bad task')
+    return [make_tree(audio_id, speaker_id, f'p{start}', start)]
+
+
+class TestIngest(unittest.TestCase):
+    '''Producers pack trees without a Store; one writer process validates
+    and commits them and acknowledges every batch.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        store = self._open()
+        self.audio_id = store.create(Audio, filename='ingest.wav',
+            duration=60_000, save=True).identifier
+        self.speaker_id = store.create(Speaker, name='spk', dataset='test',
+            save=True).identifier
+        store.close()
+
+    def _open(self):
+        with redirect_stdout(io.StringIO()):
+            return Store(path=self.tmpdir)
+
+    def _phrase_labels(self):
+        store = self._open()
+        self.addCleanup(store.close)
+        return sorted(p.label for p in store.phrases)
+
+    def test_pack_rejects_overlap_in_batch(self):
+        trees = [make_tree(self.audio_id, self.speaker_id, 'a', 0),
+            make_tree(self.audio_id, self.speaker_id, 'b', 400)]
+        with self.assertRaises(ValueError):
+            pack_phrase_trees(trees)
+        batch = pack_phrase_trees(trees[:1], batch_id=7)
+        self.assertEqual((batch.batch_id, batch.n_rows), (7, 3))
+        self.assertEqual(len(batch.label_keys), 3)
+
+    def test_parallel_ingest(self):
+        tasks = [(self.audio_id, self.speaker_id, i * 1_000)
+            for i in range(6)]
+        tasks.append((self.audio_id, self.speaker_id, -1))
+        with redirect_stdout(io.StringIO()):
+            acks = ingest(self.tmpdir, tasks, produce, n_producers=3,
+                group_rows=7)
+        self.assertEqual([ack.batch_id for ack in acks], list(range(7)))
+        self.assertTrue(all(ack.ok for ack in acks[:6]))
+        self.assertIn('bad task', acks[6].error)
+        self.assertEqual(len(self._phrase_labels()), 6)
+
+    def test_writer_rejects_one_batch_and_commits_the_rest(self):
+        batches = [pack_phrase_trees([make_tree(self.audio_id,
+            self.speaker_id, label, start)], batch_id=label)
+            for label, start in [('a', 0), ('b', 400), ('c', 2_000)]]
+        batches.append(batches[2])
+        with redirect_stdout(io.StringIO()):
+            with IngestWriter(self.tmpdir, max_pending=2) as writer:
+                for batch in batches: writer.submit(batch)
+                acks = [writer.acks.get() for _ in batches]
+        errors = {ack.batch_id: ack.error for ack in acks if not ack.ok}
+        self.assertEqual(sorted(errors), ['b', 'c'])
+        self.assertIn('overlap', errors['b'])
+        self.assertEqual(self._phrase_labels(), ['a', 'c'])
+
+    def test_dead_writer_raises_instead_of_hanging(self):
+        missing = os.path.join(self.tmpdir, 'missing')
+        tasks = [(self.audio_id, self.speaker_id, 0)] * 2
+        with self.assertRaises(RuntimeError):
+            ingest(missing, tasks, produce, readonly=True, poll=0.1)
+        batch = pack_phrase_trees([make_tree(self.audio_id,
+            self.speaker_id, 'a', 0)])
+        with self.assertRaises(RuntimeError):
+            with IngestWriter(missing, max_pending=1, poll=0.1,
+                readonly=True) as writer:
+                for _ in range(3): writer.submit(batch)
+        self.assertFalse(os.path.exists(missing))
+
+    def test_dead_producer_rejects_only_its_task(self):
+        tasks = [(self.audio_id, self.speaker_id, start)
+            for start in (0, -2, 1_000)]
+        with redirect_stdout(io.StringIO()):
+            acks = ingest(self.tmpdir, tasks, produce, n_producers=2,
+                poll=0.1)
+        # the dead producer may also have lost a batch it had not flushed
+        self.assertIn('exited with code 3', acks[1].error)
+        written = [f'p{tasks[ack.batch_id][2]}' for ack in acks if ack.ok]
+        self.assertEqual(self._phrase_labels(), written)
+
+    def test_failing_batch_in_group_is_written_alone(self):
+        batches = [pack_phrase_trees([make_tree(self.audio_id,
+            self.speaker_id, label, start)], batch_id=label)
+            for label, start in [('a', 0), ('b', 1_000), ('c', 2_000)]]
+        batches[1].values[1] = None
+        store = self._open()
+        acks = queue.Queue()
+        with redirect_stdout(io.StringIO()):
+            _commit_group(store, batches, acks)
+        store.close()
+        acks = [acks.get_nowait() for _ in batches]
+        self.assertEqual([ack.ok for ack in acks], [True, False, True])
+        self.assertIn('batch not written', acks[1].error)
+        self.assertEqual(self._phrase_labels(), ['a', 'c'])
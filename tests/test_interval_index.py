@@ -0,0 +1,109 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+class TestIntervalIndex(unittest.TestCase):
+    '''DB.overlapping_keys finds every segment overlapping a window,
+    including ones starting before it, and stays current on save,
+    overwrite and delete.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        self.audio = self.store.create(Audio, filename='interval.wav',
+            duration=7_200_000, save=True)
+        self.speaker = self.store.create(Speaker, name='spk',
+            dataset='test', save=True)
+        self.identity = {'audio_id': self.audio.identifier,
+            'speaker_id': self.speaker.identifier}
+
+    def _word(self, label, start, end):
+        return self.store.create(Word, label=label, start=start, end=end,
+            **self.identity)
+
+    def _overlapping(self, start, end, object_type='Word'):
+        keys = self.store.DB.overlapping_keys(self.audio.identifier,
+            object_type, start, end)
+        return [self.store.load(key).label for key in keys]
+
+    def test_finds_segments_starting_before_the_window(self):
+        words = [self._word('long', 0, 3_600_000),
+            self._word('before', 12_000, 12_400),
+            self._word('inside', 12_500, 13_000),
+            self._word('across', 13_900, 14_200),
+            self._word('after', 14_100, 14_500)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(words)
+
+        labels = self._overlapping(12_300, 14_000)
+
+        self.assertEqual(labels, ['long', 'before', 'inside', 'across'])
+
+    def test_window_is_closed(self):
+        word = self._word('edge', 1_000, 2_000)
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many([word])
+
+        self.assertEqual(self._overlapping(2_000, 3_000), ['edge'])
+        self.assertEqual(self._overlapping(0, 1_000), ['edge'])
+        self.assertEqual(self._overlapping(2_001, 3_000), [])
+
+    def test_late_window_in_long_recording(self):
+        start = 3_500_000
+        words = [self._word(str(i), start + i * 300, start + i * 300 + 250)
+            for i in range(10)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(words)
+
+        labels = self._overlapping(start + 600, start + 1_200)
+
+        self.assertEqual(labels, ['2', '3', '4'])
+
+    def test_classes_are_kept_apart(self):
+        phrase = self.store.create(Phrase, label='p', start=0, end=5_000,
+            **self.identity)
+        word = self._word('w', 100, 400)
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many([phrase, word])
+
+        self.assertEqual(self._overlapping(0, 5_000, 'Phrase'), ['p'])
+        self.assertEqual(self._overlapping(0, 5_000, 'Word'), ['w'])
+
+    def test_overwrite_and_delete_keep_index_current(self):
+        word = self._word('grow', 1_000, 1_200)
+        word.save()
+        word.end = 9_000
+        word.save(overwrite=True)
+
+        self.assertEqual(self._overlapping(8_000, 8_500), ['grow'])
+
+        with redirect_stdout(io.StringIO()):
+            self.store.delete_many([word.key])
+
+        self.assertEqual(self._overlapping(0, 10_000), [])
+
+    def test_index_is_built_for_database_without_it(self):
+        word = self._word('legacy', 500, 900)
+        word.save()
+        database = self.store.DB
+        with database.env.begin(write=True) as txn:
+            txn.drop(database.db['interval'], delete=False)
+            txn.drop(database.db['meta'], delete=False)
+
+        with redirect_stdout(io.StringIO()):
+            database.open()
+
+        self.assertEqual(self._overlapping(0, 1_000), ['legacy'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phone, Speaker, Syllable, Word
+
+
+class TestLazyLoading(unittest.TestCase):
+    '''Store(lazy=True) decodes the key and fixed header fields of a
+    loaded segment and keeps its strings raw until first access.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        store = self._open()
+        audio = store.create(Audio, filename='lazy.wav', duration=60_000,
+            save=True)
+        speaker = store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        word = store.create(Word, label='ta', ipa='tɑ', start=0, end=200,
+            **identity)
+        syllable = store.create(Syllable, label='ta', start=0, end=200,
+            **identity)
+        word.add_children([syllable])
+        syllable.add_children([store.create(Phone, label=label,
+            start=start, end=start + 100, **identity)
+            for label, start in (('t', 0), ('ɑ', 100))])
+        syllable.children[0].position = 'onset'
+        with redirect_stdout(io.StringIO()):
+            store.save_many([word, syllable, *syllable.children])
+        self.speaker_id = speaker.identifier
+        self.keys = [p.key for p in syllable.children]
+        self.word_key = word.key
+        store.close()
+
+    def _open(self, lazy=False):
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=self.tmpdir, lazy=lazy)
+        self.addCleanup(store.close)
+        return store
+
+    def _fields(self, obj):
+        fields = obj.attribute_dict()
+        del fields['_store']
+        return fields
+
+    def test_strings_decode_on_first_access(self):
+        store = self._open(lazy=True)
+        onset, nucleus = store.load_many(self.keys)
+        self.assertIsNotNone(onset._raw_strings)
+        self.assertEqual((onset.start, onset.end, onset.duration),
+            (0, 100, 100))
+        self.assertEqual(onset.position, 'onset')
+        self.assertEqual(onset.speaker_id, self.speaker_id)
+        self.assertIsNotNone(onset._raw_strings)
+        self.assertEqual(nucleus.label, 'ɑ')
+        self.assertIsNone(nucleus._raw_strings)
+        self.assertEqual(nucleus.parent.label, 'ta')
+        self.assertIsNotNone(onset._raw_strings)
+
+    def test_lazy_objects_match_eager_objects(self):
+        store = self._open()
+        eager = [self._fields(obj) for obj in store.load_many(self.keys)]
+        store.close()
+        store = self._open(lazy=True)
+        lazy = store.load_many(self.keys)
+        self.assertEqual([self._fields(obj) for obj in lazy], eager)
+        word = store.load(self.word_key)
+        self.assertEqual((word.ipa, word.label), ('tɑ', 'ta'))
+        labels = [p.label for p in store.phones.filter(label='t')]
+        self.assertEqual(labels, ['t'])
+
+    def test_edits_before_decoding_survive_and_save(self):
+        store = self._open(lazy=True)
+        onset = store.load(self.keys[0])
+        onset.label = 'd'
+        onset.end = 90
+        self.assertEqual((onset.label, onset.end), ('d', 90))
+        onset.save(overwrite=True)
+        store.close()
+        onset = self._open().load(self.keys[0])
+        self.assertEqual((onset.label, onset.end, onset.position),
+            ('d', 90, 'onset'))
@@ -1,8 +1,12 @@
+import io
 import tempfile
 import unittest
+from contextlib import redirect_stdout
 from unittest import mock
 
-from phraser.lmdb_helper import DB
+from phraser.lmdb_helper import DB, put_sorted
+from phraser.models import Phone, Syllable, Word
+from store_fixture import StoreTestCase
 
 
 class TestLmdbBatchWrites(unittest.TestCase):
@@ -34,6 +38,78 @@ class TestLmdbBatchWrites(unittest.TestCase):
         self.assertTrue(existing)
         self.assertFalse(missing)
 
+    def test_unsorted_batch_is_written_in_key_order(self):
+        keys = [b'c', b'a', b'd', b'b']
+        self.database.write_many(keys, [key * 2 for key in keys])
+        self.assertEqual(self.database.all_keys(), [b'a', b'b', b'c', b'd'])
+        self.assertEqual(self.database.load(b'd'), b'dd')
+        self.database.write_many([b'e', b'aa'], [b'1', b'2'])
+        self.assertEqual(self.database.load(b'aa'), b'2')
+
+    def test_put_sorted_reports_existing_and_unsorted_keys(self):
+        with self.database.env.begin(write=True) as txn:
+            self.assertTrue(put_sorted(txn, None, [(b'a', b'1'), (b'b', b'2')],
+                overwrite=False))
+            self.assertFalse(put_sorted(txn, None, [(b'c', b''), (b'c', b'')],
+                overwrite=False))
+            self.assertFalse(put_sorted(txn, None, [(b'a', b'x')],
+                overwrite=False))
+            with self.assertRaises(ValueError):
+                put_sorted(txn, None, [(b'y', b''), (b'x', b'')])
+
+
+class TestBatchIndexUpdates(StoreTestCase):
+    '''The derived indexes a batch write keeps (from rows decoded once
+    for all of them) hold what a rebuild from main holds.'''
+
+    def setUp(self):
+        super().setUp()
+        self.add_recording('batch.wav')
+        self.segments = []
+        for i in range(12):
+            word = self.store.create(Word, label=f'w{i % 5}',
+                start=i * 1_000, end=i * 1_000 + 900, **self.identity)
+            syllable = self.store.create(Syllable, label=f's{i % 3}',
+                start=i * 1_000, end=i * 1_000 + 400 + i, **self.identity)
+            syllable.stress_code = i % 3
+            phone = self.store.create(Phone, label='ab'[i % 2],
+                start=i * 1_000, end=i * 1_000 + 100, **self.identity)
+            phone.position = ['onset', 'nucleus', 'coda'][i % 3]
+            self.segments += [word, syllable, phone]
+        self.save_quietly(self.segments)
+
+    def _index_rows(self, skip=('change_log',)):
+        db = self.store.DB
+        names = sorted({index.db_name for index in db.indexes} - set(skip))
+        with db.env.begin() as txn:
+            return {name: list(txn.cursor(db=db.db[name])) for name in names}
+
+    def test_batch_write_matches_rebuild(self):
+        written = self._index_rows()
+        with redirect_stdout(io.StringIO()):
+            self.store.DB.rebuild_indexes()
+        self.assertEqual(self._index_rows(), written)
+
+    def test_overwrite_and_delete_match_rebuild(self):
+        changed = self.segments[::4]
+        for segment in changed:
+            segment.end += 7
+            segment.label = segment.label + 'x'
+            if segment.object_type == 'Syllable': segment.stress_code = 2
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(changed, overwrite=True)
+        self.store.delete_many([s.key for s in self.segments[2::5]])
+        # a rebuild renumbers the bitmap ordinals: compare what they answer
+        written = self._index_rows(skip=('change_log', 'code_bitmap'))
+        stressed = self.store.DB.bitmap_keys('Syllable', {'stress_code': [2]})
+        with redirect_stdout(io.StringIO()):
+            self.store.DB.rebuild_indexes()
+        self.assertEqual(self._index_rows(skip=('change_log', 'code_bitmap')),
+            written)
+        self.assertEqual(self.store.DB.bitmap_keys('Syllable',
+            {'stress_code': [2]}), stressed)
+        self.assertTrue(stressed)
+
 
 if __name__ == '__main__':
     unittest.main()
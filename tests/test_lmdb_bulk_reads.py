@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+
+from phraser.lmdb_helper import DB
+
+
+class TestLmdbBulkReads(unittest.TestCase):
+    '''DB.load_many fetches in key order but answers in caller order.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = DB(path=self.directory.name)
+        self.addCleanup(self.database.close)
+        keys = [bytes([i]) * 3 for i in range(1, 9)]
+        self.database.write_many(keys, [key + b'v' for key in keys])
+
+    def test_values_follow_caller_order(self):
+        keys = [b'\x05' * 3, b'\x01' * 3, b'\x08' * 3, b'\x03' * 3]
+        values = self.database.load_many(keys)
+        self.assertEqual(values, [key + b'v' for key in keys])
+
+    def test_missing_and_repeated_keys(self):
+        keys = [b'\x02' * 3, b'missing', b'\x02' * 3, b'\x00']
+        values = self.database.load_many(keys)
+        self.assertEqual(values, [b'\x02\x02\x02v', None,
+            b'\x02\x02\x02v', None])
+
+    def test_sorted_keys(self):
+        keys = [bytes([i]) * 3 for i in range(1, 9)]
+        self.assertEqual(self.database.load_many(keys),
+            [key + b'v' for key in keys])
+        self.assertEqual(self.database.load_many([]), [])
+
+    def test_buffers_are_memoryviews(self):
+        keys = [b'\x07' * 3, b'missing', b'\x04' * 3]
+        with self.database.load_many_buffers(keys) as values:
+            self.assertIsInstance(values[0], memoryview)
+            self.assertIsNone(values[1])
+            self.assertEqual([bytes(values[0]), bytes(values[2])],
+                [b'\x07\x07\x07v', b'\x04\x04\x04v'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import lmdb
+
+from phraser import Store
+from phraser.lmdb_helper import DB
+from phraser.models import Audio
+
+
+class TestMapGrowth(unittest.TestCase):
+    '''Writes that fill the LMDB map grow it and are retried.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = DB(path=self.directory.name, map_size=256 * 1024)
+        self.addCleanup(self.database.close)
+        self.keys = [i.to_bytes(4, 'big') for i in range(400)]
+        self.values = [os.urandom(1024) for _ in self.keys]
+
+    def test_write_many_grows_the_map(self):
+        with redirect_stdout(io.StringIO()):
+            self.database.write_many(self.keys, self.values)
+        self.assertGreater(self.database.env.info()['map_size'], 256 * 1024)
+        self.assertEqual(self.database.load_many(self.keys), self.values)
+
+    def test_session_grows_the_map_when_it_aborts(self):
+        with self.assertRaises(lmdb.MapFullError):
+            with redirect_stdout(io.StringIO()):
+                with self.database.session():
+                    self.database.write_many(self.keys, self.values)
+        self.assertIsNone(self.database.load(self.keys[0]))
+        self.assertGreater(self.database.env.info()['map_size'], 256 * 1024)
+
+
+class TestStatsAndCompact(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        self.path = tmpdir
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=os.path.join(tmpdir, 'db'))
+        self.addCleanup(self.store.close)
+
+    def test_stats_report_pages_and_sub_dbs(self):
+        audios = [self.store.create(Audio, filename=f'{i}.wav',
+            duration=1_000) for i in range(50)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(audios)
+        stats = self.store.stats()
+        self.assertEqual(stats['sub_dbs']['main']['entries'], 50)
+        self.assertGreaterEqual(stats['sub_dbs']['main']['depth'], 1)
+        self.assertEqual(stats['total_pages'],
+            stats['used_pages'] + stats['free_pages'])
+        self.assertGreaterEqual(stats['free_pages'], 0)
+
+    def test_compact_copy_is_smaller_and_complete(self):
+        audios = [self.store.create(Audio, filename=f'{i}.wav',
+            duration=1_000) for i in range(2_000)]
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(audios)
+            self.store.delete_many([audio.key for audio in audios[100:]])
+            report = self.store.compact(os.path.join(self.path, 'copy'))
+        self.assertLess(report['after'], report['before'])
+
+        with redirect_stdout(io.StringIO()):
+            copy = Store(path=report['path'], readonly=True)
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.class_count('Audio'), 100)
+        self.assertEqual(copy.load(audios[0].key).filename, '0.wav')
+
+
+if __name__ == '__main__':
+    unittest.main()
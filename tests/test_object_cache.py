@@ -0,0 +1,117 @@
+import gc
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.cache import LRUCache, ObjectCache, WeakCache, estimate_size
+from phraser.models import Audio, Phone, Speaker
+
+
+class TestObjectCache(unittest.TestCase):
+    '''Store caches: unbounded by default, LRU by count or bytes, or weak;
+    with hit/miss/eviction counts and pins that are never evicted.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        store = self._open()
+        audio = store.create(Audio, filename='cache.wav', duration=60_000,
+            save=True)
+        speaker = store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phones = [store.create(Phone, label=f'p{i}', start=i * 100,
+            end=i * 100 + 50, **identity) for i in range(20)]
+        with redirect_stdout(io.StringIO()):
+            store.save_many(phones)
+        self.keys = sorted(phone.key for phone in phones)
+        store.close()
+
+    def _open(self, cache=None):
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=self.tmpdir, cache=cache)
+        self.addCleanup(store.close)
+        return store
+
+    def test_default_cache_keeps_everything(self):
+        store = self._open()
+        self.assertIsInstance(store._cache, ObjectCache)
+        first = store.load_many(self.keys)
+        self.assertIs(store.load(self.keys[0]), first[0])
+        stats = store.cache_stats()
+        self.assertEqual((stats['objects'], stats['evictions']), (20, 0))
+        self.assertEqual((stats['hits'], stats['misses']), (1, 20))
+
+    def test_lru_by_count_evicts_least_recently_used(self):
+        store = self._open(LRUCache(max_objects=5))
+        store.load_many(self.keys[:5])
+        store.load(self.keys[0])
+        store.load(self.keys[5])
+        self.assertEqual(len(store._cache), 5)
+        self.assertIn(self.keys[0], store._cache)
+        self.assertNotIn(self.keys[1], store._cache)
+        self.assertEqual(store.cache_stats()['evictions'], 1)
+
+    def test_lru_by_bytes(self):
+        cache = LRUCache(max_bytes=1)
+        store = self._open(cache)
+        size = estimate_size(store.load(self.keys[0]))
+        cache.max_bytes = size * 3
+        store.load_many(self.keys)
+        self.assertLessEqual(cache.nbytes, size * 3)
+        self.assertIn(len(cache), (2, 3))
+        self.assertIn(self.keys[-1], cache)
+        self.assertEqual(cache.stats()['evictions'], 21 - len(cache))
+
+    def test_size_counts_instance_attributes(self):
+        store = self._open(ObjectCache())
+        phone = store.load(self.keys[0])
+        size = estimate_size(phone)
+        self.assertNotIn({}, gc.get_referents(phone))
+        phone.note = 'x' * 1_000
+        self.assertGreater(estimate_size(phone), size + 1_000)
+        phone.__dict__
+        self.assertGreater(estimate_size(phone), size + 1_000)
+
+    def test_pins_survive_eviction(self):
+        store = self._open(LRUCache(max_objects=2))
+        phone = store.load(self.keys[0])
+        phone.label = 'edited'
+        store.pin(phone)
+        store.load_many(self.keys[1:])
+        self.assertIs(store.load(self.keys[0]), phone)
+        store.unpin(phone)
+        store.load_many(self.keys[1:3])
+        self.assertNotIn(self.keys[0], store._cache)
+
+    def test_session_writes_are_pinned_until_the_session_ends(self):
+        store = self._open(LRUCache(max_objects=1))
+        phones = store.load_many(self.keys[:3])
+        with store.session():
+            for phone in phones: phone.save(overwrite=True)
+            for phone in phones:
+                self.assertTrue(store._cache.is_pinned(phone.key))
+            self.assertEqual(len(store._cache), 3)
+        self.assertEqual(store._cache.stats()['pinned'], 0)
+
+    def test_weak_cache_holds_only_referenced_objects(self):
+        store = self._open(WeakCache())
+        phone = store.load(self.keys[0])
+        store.load(self.keys[1])
+        gc.collect()
+        self.assertIs(store.load(self.keys[0]), phone)
+        self.assertNotIn(self.keys[1], store._cache)
+        self.assertEqual(store.cache_stats()['evictions'], 1)
+
+    def test_iteration_streams_with_a_bounded_cache(self):
+        store = self._open(LRUCache(max_objects=4))
+        labels = [phone.label for phone in store.phones]
+        self.assertEqual(len(labels), 20)
+        self.assertFalse(hasattr(store.phones, '_objs'))
+        self.assertEqual(len(store._cache), 4)
+        labels = [p.label for p in store.phones.filter(label__in=['p3'])]
+        self.assertEqual(labels, ['p3'])
@@ -0,0 +1,124 @@
+import unittest
+from unittest import mock
+
+from phraser import key_helper
+from phraser.query import queryset_from_items
+from phraser.models import Word
+from store_fixture import StoreTestCase
+
+
+class TestOrderedLabelKeys(unittest.TestCase):
+    def test_key_order_is_label_order(self):
+        labels = ['', 'a', 'a\x00', 'a\x00b', 'ab', 'b', 'z', 'é', '文',
+            'x' * 500, 'x' * 400]
+        key = b'\x00' * key_helper.SEGMENT_LEN
+        keys = [key_helper.pack_ordered_label_key(label, 2, key)
+            for label in labels]
+        by_key = [label for _, label in sorted(zip(keys, labels))]
+        self.assertEqual(by_key, sorted(labels))
+
+    def test_label_round_trip(self):
+        key = b'\x01' * key_helper.SEGMENT_LEN
+        for label in ['', 'a\x00b', 'één']:
+            index_key = key_helper.pack_ordered_label_key(label, 2, key)
+            self.assertEqual(
+                key_helper.ordered_label_key_to_label(index_key)[0], label)
+            self.assertEqual(
+                key_helper.ordered_label_key_to_instance_key(index_key), key)
+
+
+class TestOrderedLabelIndex(StoreTestCase):
+    '''Prefix, range and vocabulary scans over the ordered label index,
+    and QuerySet label filters narrowed by it.'''
+
+    labels = ['ver', 'veel', 'vergeten', 'verder', 'de', 'het', 'ver',
+        'zien']
+
+    def setUp(self):
+        super().setUp()
+        self.add_recording('label.wav')
+        self.save_quietly([self._word(label, i * 1_000)
+            for i, label in enumerate(self.labels)])
+
+    def _word(self, label, start):
+        return self.store.create(Word, label=label, start=start,
+            end=start + 500, **self.identity)
+
+    def test_prefix_scan(self):
+        words = self.store.label_prefix_to_instances('ver', 'Word')
+        self.assertEqual([w.label for w in words],
+            ['ver', 'ver', 'verder', 'vergeten'])
+
+    def test_range_scan(self):
+        keys = self.store.DB.label_range_keys('Word', 'h', 'veel')
+        labels = [self.store.load(key).label for key in keys]
+        self.assertEqual(labels, ['het', 'veel'])
+        keys = self.store.DB.label_range_keys('Word', low='vergeten')
+        self.assertEqual(len(keys), 2)
+
+    def test_vocabulary(self):
+        self.assertEqual(self.store.labels('Word'), sorted(set(self.labels)))
+        self.assertEqual(self.store.labels('Word', prefix='ver'),
+            ['ver', 'verder', 'vergeten'])
+        self.assertEqual(self.store.labels('Phrase'), [])
+
+    def test_queryset_filters_load_only_index_matches(self):
+        words = list(self.store.words.filter(label__startswith='ver'))
+        self.assertEqual(len(words), 4)
+        self.assertEqual(self.store.load_counter['Word'], 4)
+
+        words = self.store.words.filter(label__in=['de', 'zien'])
+        self.assertEqual(sorted(w.label for w in words), ['de', 'zien'])
+        words = self.store.words.filter(label__gt='ver', label__lt='zien')
+        self.assertEqual(sorted(w.label for w in words),
+            ['verder', 'vergeten'])
+        self.assertEqual(self.store.load_counter['Word'], 6)
+
+    def test_exact_label_filter_does_not_need_label_links(self):
+        word = self.store.words.get(label='de')
+        link = key_helper.label_to_label_index_key('de', 'Word', word.key)
+        with self.store.DB.env.begin(write=True) as txn:
+            self.assertTrue(txn.delete(link,
+                db=self.store.DB.db['label_segment']))
+        words = self.store.words.filter(label__in=['de', 'het'])
+        self.assertEqual(sorted(w.label for w in words), ['de', 'het'])
+        self.assertEqual(len(self.store.words.filter(label='de')), 1)
+
+    def test_filter_agrees_with_root_whichever_runs_first(self):
+        list(self.store.phrases)
+        self.save_quietly([self._word('ver', 20_000)])
+        before = len(self.store.words.filter(label='ver'))
+        self.assertEqual(len(self.store.words), 8)
+        after = len(self.store.words.filter(label='ver'))
+        self.assertEqual((before, after), (2, 2))
+        self.store.catch_up()
+        self.assertEqual(len(self.store.words.filter(label='ver')), 3)
+
+    def test_item_queryset_filters_without_index(self):
+        items = [self.store.words.get(label=label)
+            for label in ('de', 'verder', 'zien')]
+        with mock.patch.object(self.store.DB, 'label_prefix_keys') as scan:
+            words = queryset_from_items(items).filter(
+                label__startswith='ver')
+            self.assertEqual([w.label for w in words], ['verder'])
+        scan.assert_not_called()
+
+    def test_overwrite_moves_entry(self):
+        word = self.store.words.get(label='het')
+        word.label = 'vet'
+        word.save(overwrite=True)
+        self.assertEqual(self.store.labels('Word', prefix='ve'),
+            ['veel', 'ver', 'verder', 'vergeten', 'vet'])
+        self.assertNotIn('het', self.store.labels('Word'))
+
+    def test_long_label_is_found_by_prefix(self):
+        long_label = 'lang' * 200
+        self.save_quietly([self._word(long_label, 50_000)])
+        words = self.store.words.filter(label__startswith='langlang')
+        self.assertEqual([w.label for w in words], [long_label])
+        words = self.store.words.filter(label=long_label)
+        self.assertEqual(len(words), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -183,6 +183,52 @@ class TestTextGridStoreBoundStaging(unittest.TestCase):
                 self.assertEqual(item.phrase_id, phrase.identifier)
                 self.assertEqual(item.phrase_start, phrase.start)
 
+    def _content_id_items(self, word='hello'):
+        tg = MiniTextGrid(
+            names=['ORT-MAU', 'KAN-MAU', 'MAS', 'MAU'],
+            tiers=[
+                Tier([interval(word, 0, .5)]),
+                Tier([interval('h e', 0, .5)]),
+                Tier([interval('hel', 0, .5), interval('lo', .5, .75)]),
+                Tier([interval('h', 0, .25), interval('e', .25, .5),
+                    interval('l', .5, .625), interval('o', .625, .75)]),
+            ])
+        loader = textgrid_loader.textgrid_filename_to_database_objects
+        with patch.object(textgrid_loader, 'load_textgrid',
+                return_value=tg), redirect_stdout(io.StringIO()):
+            return loader('fake.TextGrid', audio=self.audio,
+                speaker=self.speaker, store=self.store, content_ids=True)
+
+    def test_content_ids_make_reimport_a_key_lookup(self):
+        self.audio = make_audio(self.store)
+        self.speaker = make_speaker(self.store)
+        items = self._content_id_items()
+        keys = sorted(item.key for item in items)
+        phrase = [i for i in items if i.object_type == 'Phrase'][0]
+        for item in items:
+            self.assertEqual(item.phrase_id, phrase.identifier)
+        orphan = [i for i in items if i.label == 'lo'][0]
+        for phone in [i for i in items if i.label in ('l', 'o')]:
+            self.assertEqual(phone.parent_id, orphan.identifier)
+        with redirect_stdout(io.StringIO()):
+            textgrid_loader.save_textgrid_items(items, store=self.store)
+
+        again = self._content_id_items()
+        self.assertEqual(sorted(item.key for item in again), keys)
+        with patch.object(self.store, 'load_many') as load_many:
+            actions = [textgrid_loader.save_textgrid_items(again,
+                store=self.store, existing=existing)
+                for existing in ('add_missing', 'upsert')]
+        load_many.assert_not_called()
+        self.assertEqual(actions, ['skipped', 'replaced'])
+        self.assertEqual(self.store.class_count('Phone'), 4)
+
+        changed = self._content_id_items(word='hallo')
+        self.assertNotIn(changed[-1].key, keys)
+        self.assertEqual(textgrid_loader.save_textgrid_items(changed,
+            store=self.store, existing='upsert'), 'replaced')
+        self.assertFalse(self.store.DB.key_exists(phrase.key))
+
     def test_textgrid_overwrite_option_is_rejected(self):
         with self.assertRaisesRegex(ValueError, 'overwrite=True'):
             textgrid_loader.textgrid_filename_to_database_objects(
@@ -0,0 +1,87 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import lmdb
+
+from phraser import ReadOnlyStoreError, Store
+from phraser.models import Audio, Speaker, Word
+
+
+class TestReadOnlyStore(unittest.TestCase):
+    '''Store(readonly=True) reads a database written elsewhere without
+    the lock file and rejects every write.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            writer = Store(path=self.tmpdir)
+        audio = writer.create(Audio, filename='ro.wav', duration=1_000,
+            save=True)
+        self.speaker = writer.create(Speaker, name='spk', dataset='test',
+            save=True)
+        self.word = writer.create(Word, label='ro', start=0, end=100,
+            audio_id=audio.identifier, speaker_id=self.speaker.identifier,
+            save=True)
+        self.audio = audio
+        writer.close()
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=self.tmpdir, readonly=True)
+        self.addCleanup(self.store.close)
+
+    def test_reads_work(self):
+        loaded = self.store.load(self.word.key)
+        self.assertEqual(loaded.label, 'ro')
+        self.assertEqual(len(self.store.words), 1)
+        keys = self.store.DB.overlapping_keys(self.audio.identifier, 'Word',
+            50, 60)
+        self.assertEqual(keys, [self.word.key])
+
+    def test_no_lock_file_is_used(self):
+        self.assertFalse(self.store.DB.env.flags()['lock'])
+        self.assertTrue(self.store.DB.env.flags()['readonly'])
+
+    def test_write_methods_raise(self):
+        loaded = self.store.load(self.word.key)
+        speaker = self.store.load(self.speaker.key)
+        writes = {
+            'save': lambda: self.store.save(loaded, overwrite=True),
+            'save_many': lambda: self.store.save_many([loaded]),
+            'delete': lambda: self.store.delete(loaded.key),
+            'delete_many': lambda: self.store.delete_many([loaded.key]),
+            'db write': lambda: self.store.DB.write(b'k', b'v'),
+            'speaker link': lambda: speaker.add_audio(self.audio),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                with self.assertRaises(ReadOnlyStoreError):
+                    write()
+        self.assertIsNotNone(self.store.DB.load(self.word.key))
+
+    def test_missing_sub_db_falls_back_to_scans(self):
+        del self.store.DB.db['interval']
+        keys = self.store.DB.overlapping_keys(self.audio.identifier, 'Word',
+            50, 60)
+        self.assertEqual(keys, [self.word.key])
+
+    def test_database_without_change_log(self):
+        self.store.close()
+        env = lmdb.open(self.tmpdir, max_dbs=16)
+        with env.begin(write=True) as txn:
+            txn.drop(env.open_db(b'change_log', txn=txn))
+        env.close()
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=self.tmpdir, readonly=True)
+        self.addCleanup(store.close)
+        self.assertNotIn('change_log', store.DB.db)
+        self.assertEqual(store.DB.last_change_seq(), 0)
+        self.assertEqual(store.DB.changes_since(0), [])
+        self.assertEqual(store.catch_up(), 0)
+        self.assertEqual(store.load(self.word.key).label, 'ro')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phone, Phrase, Speaker, Syllable, Word
+
+
+class TestSampledStore(unittest.TestCase):
+    '''Store(fraction=...) loads whole sampled recordings (or speakers),
+    reproducibly from a seed, with the trees linked and the query roots
+    restricted to the sample.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        store = self._open()
+        speakers = [store.create(Speaker, name=f'spk{i}', dataset='test',
+            dialect=dialect, save=True)
+            for i, dialect in enumerate(['north', 'south'])]
+        items = []
+        for i in range(8):
+            audio = store.create(Audio, filename=f'{i}.wav',
+                dataset='comp-a' if i < 6 else 'comp-b', duration=60_000,
+                save=True)
+            for j, speaker in enumerate(speakers):
+                items += self._tree(store, audio, speaker, start=j * 1_000)
+        with redirect_stdout(io.StringIO()):
+            store.save_many(items)
+        store.close()
+
+    def _tree(self, store, audio, speaker, start):
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phrase = store.create(Phrase, label='ta', start=start,
+            end=start + 200, **identity)
+        word = store.create(Word, label='ta', start=start, end=start + 200,
+            **identity)
+        syllable = store.create(Syllable, label='ta', start=start,
+            end=start + 200, **identity)
+        phones = [store.create(Phone, label=label, start=start + offset,
+            end=start + offset + 100, **identity)
+            for label, offset in (('t', 0), ('a', 100))]
+        phrase.add_children([word])
+        word.add_children([syllable])
+        syllable.add_children(phones)
+        return [phrase, word, syllable, *phones]
+
+    def _open(self, **kwargs):
+        with redirect_stdout(io.StringIO()):
+            store = Store(path=self.tmpdir, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def _filenames(self, store):
+        return sorted(audio.filename for audio in store.audios)
+
+    def test_sample_is_reproducible_and_stratified(self):
+        store = self._open(fraction=0.25, stratify='dataset', seed=7)
+        filenames = self._filenames(store)
+        store.close()
+        self.assertEqual(len(filenames), 3)
+        self.assertEqual(sum(name in ('6.wav', '7.wav')
+            for name in filenames), 1)
+        store = self._open(fraction=0.25, stratify='dataset', seed=7)
+        self.assertEqual(self._filenames(store), filenames)
+        self.assertEqual(store.sample_seed, 7)
+        audio_ids = {audio.identifier for audio in store.audios}
+        self.assertEqual(len(store.phrases), 6)
+        self.assertEqual(len(store.phones), 12)
+        self.assertTrue(all(p.audio_id in audio_ids for p in store.phones))
+        self.assertEqual(len(store.speakers), 2)
+        self.assertEqual(len(store.phones.filter(label='t')), 6)
+
+    def test_trees_are_linked_without_reads(self):
+        store = self._open(fraction=0.25, seed=1)
+        loaded = dict(store.load_counter)
+        for phrase in store.phrases:
+            word, = phrase.children
+            syllable, = word.children
+            self.assertEqual([p.label for p in syllable.children],
+                ['t', 'a'])
+            self.assertIs(syllable.children[1].parent.parent.parent, phrase)
+            self.assertIsNone(phrase.parent)
+        self.assertEqual(store.load_counter, loaded)
+
+    def test_sample_by_speaker(self):
+        store = self._open(fraction=0.5, sample_by='speaker',
+            stratify='dataset', seed=3)
+        speakers = list(store.speakers)
+        self.assertEqual(len(speakers), 1)
+        self.assertEqual(len(store.audios), 8)
+        self.assertEqual(len(store.phrases), 8)
+        self.assertEqual({p.speaker_id for p in store.phones},
+            {speakers[0].identifier})
+        with self.assertRaises(ValueError):
+            self._open(fraction=0.5, sample_by='dataset')
@@ -0,0 +1,98 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from phraser import Store
+from phraser.models import Audio, Phone, Phrase, Speaker, Syllable, Word
+
+
+class TestSegmentTable(unittest.TestCase):
+    '''store.table decodes the fixed fields of a class into arrays that
+    agree with the loaded objects.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        speaker = self.store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        items = []
+        for filename in ('a.wav', 'b.wav'):
+            audio = self.store.create(Audio, filename=filename,
+                duration=60_000, save=True)
+            identity = {'audio_id': audio.identifier,
+                'speaker_id': speaker.identifier}
+            phrase = self.store.create(Phrase, label='ta pi', start=0,
+                end=400, **identity)
+            syllables = [self.store.create(Syllable, label=label,
+                start=start, end=start + 200, **identity)
+                for label, start in (('ta', 0), ('pi', 200))]
+            word = self.store.create(Word, label='tapi', start=0, end=400,
+                **identity)
+            phrase.add_children([word])
+            word.add_children(syllables)
+            for syllable in syllables:
+                syllable.add_children([self.store.create(Phone,
+                    label=label, start=syllable.start + offset,
+                    end=syllable.start + offset + 100, **identity)
+                    for label, offset in zip(syllable.label, (0, 100))])
+                syllable.children[0].position = 'onset'
+            phones = [p for s in syllables for p in s.children]
+            items += [phrase, word, *syllables, *phones]
+        items.append(self.store.create(Phone, label='ə', start=500,
+            end=530, **identity))
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(items)
+        self.store._cache.clear()
+
+    def test_columns_match_objects(self):
+        table = self.store.table('Phone')
+        phones = self.store.load_many(table.keys())
+        self.assertEqual(len(table), 9)
+        self.assertEqual(len(self.store._cache), 9)
+        self.assertEqual(table.start.tolist(), [p.start for p in phones])
+        self.assertEqual(table.duration.tolist(),
+            [p.duration for p in phones])
+        self.assertEqual(table.label_array().tolist(),
+            [p.label for p in phones])
+        self.assertEqual(table.position_code.tolist(),
+            [p.position_code for p in phones])
+        self.assertEqual([bytes(table.audio_ids[i])
+            for i in table.audio_index], [p.audio_id for p in phones])
+        self.assertEqual(len(table.speaker_ids), 1)
+        orphan = table.parent_index == -1
+        self.assertEqual(table.label_array()[orphan].tolist(), ['ə'])
+        self.assertIsNone(table.stress_code)
+        self.assertEqual(len(self.store.table('Phrase')), 2)
+        self.assertIsNone(self.store.table('Phrase').parent_index)
+
+    def test_aggregates_and_links(self):
+        phones = self.store.table('Phone')
+        self.assertEqual(phones.duration[phones.label_mask('t', 'a')].sum(),
+            400)
+        counts = np.bincount(phones.label_code)
+        self.assertEqual(dict(zip(phones.labels, counts.tolist())),
+            {'t': 2, 'a': 2, 'p': 2, 'i': 2, 'ə': 1})
+        syllables = self.store.table('Syllable')
+        rows = syllables.rows_of(phones.parent_ids)[phones.parent_index]
+        linked = phones.parent_index >= 0
+        self.assertTrue((syllables.start[rows[linked]] <=
+            phones.start[linked]).all())
+        self.assertEqual(syllables.label_array()[rows[:2]].tolist(),
+            ['ta', 'ta'])
+        phrases = self.store.table('Phrase')
+        rows = phrases.rows_of(syllables.phrase_ids)
+        self.assertEqual(sorted(rows.tolist()), [0, 1])
+
+    def test_empty_class_and_bad_class(self):
+        self.store.delete_many(self.store.table('Phrase').keys())
+        self.assertEqual(len(self.store.table('Phrase')), 0)
+        self.assertEqual(self.store.table('Phrase').keys(), [])
+        with self.assertRaises(ValueError):
+            self.store.table('Speaker')
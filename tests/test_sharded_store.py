@@ -0,0 +1,104 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import ShardedStore, Store, key_helper
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+class TestShardedStore(unittest.TestCase):
+    '''ShardedStore keeps each audio with its segments in one shard and
+    reads all shards through the Store API.'''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.store = self._open(n_shards=3)
+
+    def _open(self, path=None, **kwargs):
+        with redirect_stdout(io.StringIO()):
+            store = ShardedStore(path or self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def _fill(self, store, n_audios=6):
+        speaker = store.create(Speaker, name='spk', dataset='test')
+        objs = [speaker]
+        for i in range(n_audios):
+            audio = store.create(Audio, filename=f'{i}.wav',
+                duration=10_000)
+            phrase = store.create(Phrase, label=f'p{i}', start=0,
+                end=1_000, audio_id=audio.identifier,
+                speaker_id=speaker.identifier)
+            phrase.add_children([store.create(Word, label=f'w{i}',
+                start=0, end=500, audio_id=audio.identifier,
+                speaker_id=speaker.identifier)])
+            objs += [phrase, audio] + phrase.words
+        with redirect_stdout(io.StringIO()):
+            store.save_many(objs)
+        return speaker
+
+    def test_audio_and_segments_share_a_shard(self):
+        self._fill(self.store)
+        for shard in self.store.shards:
+            audio_ids = set(shard.DB.audio_ids())
+            for key in shard.DB.all_keys():
+                if key_helper.is_segment_key(key):
+                    self.assertIn(key[1:9], audio_ids)
+        used = [shard.class_count('Audio') for shard in self.store.shards]
+        self.assertEqual(sum(used), 6)
+        self.assertGreater(sum(1 for n in used if n), 1)
+
+    def test_queries_and_counts_span_shards(self):
+        speaker = self._fill(self.store)
+        self.assertEqual(self.store.class_count('Word'), 6)
+        self.assertEqual(self.store.class_count('Speaker'), 1)
+        self.assertEqual(len(self.store.phrases), 6)
+        labels = sorted(w.label for w in self.store.words.filter(
+            label__in=['w1', 'w4']))
+        self.assertEqual(labels, ['w1', 'w4'])
+        phrase = self.store.phrases.get(label='p2')
+        self.assertEqual([w.label for w in phrase.words], ['w2'])
+        self.assertEqual(phrase.speaker.name, 'spk')
+        phrases = self.store.speaker_phrases(speaker)
+        self.assertEqual(len(phrases), 6)
+
+    def test_load_many_keeps_order(self):
+        self._fill(self.store)
+        keys = list(reversed(self.store.rank_to_keys_dict()[2]))
+        words = self.store.load_many(keys)
+        self.assertEqual([w.key for w in words], keys)
+
+    def test_reopen_finds_audios_placed_by_custom_route(self):
+        self.store.close()
+        path = self.path + '/custom'
+        route = lambda audio, n: int(audio.filename[0]) % 2
+        store = self._open(path, n_shards=2, route=route)
+        self._fill(store, n_audios=4)
+        store.close()
+
+        reopened = self._open(path)
+        self.assertEqual(reopened.n_shards, 2)
+        audios = reopened.shards[1].audios
+        self.assertEqual(sorted(a.filename for a in audios),
+            ['1.wav', '3.wav'])
+        self.assertEqual(reopened.class_count('Phrase'), 4)
+
+    def test_shard_is_a_plain_store(self):
+        self._fill(self.store)
+        self.store.close()
+        with redirect_stdout(io.StringIO()):
+            shard = Store(path=str(self.store.shard_paths[0]),
+                readonly=True)
+        self.addCleanup(shard.close)
+        self.assertEqual(shard.class_count('Speaker'), 1)
+
+    def test_shard_count_mismatch(self):
+        with self.assertRaises(ValueError):
+            self._open(n_shards=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.lmdb_helper import DB
+from phraser.models import Audio, Phrase, Speaker, Word
+
+
+class TestDBSnapshot(unittest.TestCase):
+    '''DB.snapshot pins one read transaction for every read inside it.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = DB(path=self.directory.name)
+        self.addCleanup(self.database.close)
+
+    def test_reads_inside_share_one_state(self):
+        self.database.write(b'a', b'1')
+        with self.database.snapshot():
+            self.database.write(b'b', b'2')
+            self.assertIsNone(self.database.load(b'b'))
+            self.assertEqual(self.database.load_many([b'a', b'b']),
+                [b'1', None])
+        self.assertEqual(self.database.load(b'b'), b'2')
+
+    def test_nested_snapshot_reuses_outer_transaction(self):
+        with self.database.snapshot():
+            outer = self.database._snapshot_txn
+            with self.database.snapshot():
+                self.assertIs(self.database._snapshot_txn, outer)
+            self.assertIs(self.database._snapshot_txn, outer)
+        self.assertIsNone(self.database._snapshot_txn)
+
+    def test_existence_check_sees_writes_made_inside(self):
+        with self.database.snapshot():
+            self.database.write(b'new', b'value')
+            with self.assertRaises(KeyError):
+                self.database.write(b'new', b'other')
+        self.assertEqual(self.database.load(b'new'), b'value')
+
+    def test_close_ends_snapshot(self):
+        with self.database.snapshot():
+            self.database.close()
+            self.assertIsNone(self.database._snapshot_txn)
+
+
+class TestStoreSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+
+    def test_tree_navigation_inside_snapshot(self):
+        audio = self.store.create(Audio, filename='snap.wav',
+            duration=1_000, save=True)
+        speaker = self.store.create(Speaker, name='spk', dataset='test',
+            save=True)
+        identity = {'audio_id': audio.identifier,
+            'speaker_id': speaker.identifier}
+        phrase = self.store.create(Phrase, label='a b', start=0, end=200,
+            **identity)
+        words = [self.store.create(Word, label='a', start=0, end=100,
+            **identity), self.store.create(Word, label='b', start=100,
+            end=200, **identity)]
+        phrase.add_children(words)
+        with redirect_stdout(io.StringIO()):
+            self.store.save_phrase_trees([phrase])
+        self.store._cache.clear()
+
+        with self.store.snapshot() as store:
+            loaded = store.load(phrase.key)
+            labels = [word.label for word in loaded.words]
+            self.assertIsNotNone(store.DB._snapshot_txn)
+
+        self.assertEqual(labels, ['a', 'b'])
+        self.assertIsNone(self.store.DB._snapshot_txn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.models import Audio, Phrase, Speaker
+
+
+class TestSpeakerLinks(unittest.TestCase):
+    '''Speaker phrases and audio speakers come from the speaker_phrase and
+    audio_speaker indexes, not from every phrase of a shared audio.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        self.audios = [self.store.create(Audio, filename=f'{i}.wav',
+            duration=60_000, save=True) for i in range(2)]
+        self.speakers = [self.store.create(Speaker, name=name,
+            dataset='test', save=True) for name in ('a', 'b')]
+        phrases = []
+        for audio in self.audios:
+            for i, speaker in enumerate(self.speakers):
+                phrases.append(self.store.create(Phrase,
+                    label=f'{speaker.name}-{audio.filename}',
+                    start=i * 1_000, end=i * 1_000 + 900,
+                    audio_id=audio.identifier,
+                    speaker_id=speaker.identifier))
+        with redirect_stdout(io.StringIO()):
+            self.store.save_many(phrases)
+        self.store._cache.clear()
+
+    def test_speaker_phrases_are_only_own_phrases(self):
+        speaker = self.store.load(self.speakers[0].key)
+        labels = [phrase.label for phrase in speaker.phrases]
+        self.assertEqual(sorted(labels), ['a-0.wav', 'a-1.wav'])
+        self.assertEqual(self.store.load_counter['Phrase'], 2)
+
+    def test_speaker_audios_include_audios_of_its_phrases(self):
+        speaker = self.store.load(self.speakers[1].key)
+        filenames = sorted(audio.filename for audio in speaker.audios)
+        self.assertEqual(filenames, ['0.wav', '1.wav'])
+
+    def test_audio_speakers_without_loading_phrases(self):
+        audio = self.store.load(self.audios[0].key)
+        names = sorted(speaker.name for speaker in audio.speakers)
+        self.assertEqual(names, ['a', 'b'])
+        self.assertEqual(self.store.load_counter['Phrase'], 0)
+
+    def test_linked_speaker_without_phrases(self):
+        extra = self.store.create(Speaker, name='c', dataset='test',
+            save=True)
+        extra.add_audio(self.audios[0])
+        keys = self.store.DB.audio_to_speaker_keys(self.audios[0])
+        self.assertIn(extra.key, keys)
+
+        self.store.DB.delete_speaker_audio_link(extra, self.audios[0])
+        keys = self.store.DB.audio_to_speaker_keys(self.audios[0])
+        self.assertNotIn(extra.key, keys)
+
+    def test_indexes_are_built_for_database_without_them(self):
+        for audio in self.audios: self.speakers[0].add_audio(audio)
+        database = self.store.DB
+        with database.env.begin(write=True) as txn:
+            for name in ('speaker_phrase', 'audio_speaker'):
+                txn.drop(database.db[name], delete=False)
+                txn.delete(b'built:' + name.encode(),
+                    db=database.db['meta'])
+        speaker = self.store.load(self.speakers[0].key)
+        fallback = database.speaker_to_phrase_keys(speaker)
+
+        with redirect_stdout(io.StringIO()):
+            database.open()
+
+        self.assertEqual(database.speaker_to_phrase_keys(speaker), fallback)
+        self.assertEqual(len(fallback), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
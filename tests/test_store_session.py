@@ -0,0 +1,124 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from phraser import Store
+from phraser.lmdb_helper import DB
+from phraser.models import Audio, Speaker, Word
+
+
+class TestDBSession(unittest.TestCase):
+    '''DB.session commits every write inside it in one transaction.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = DB(path=self.directory.name)
+        self.addCleanup(self.database.close)
+
+    def _committed(self, key):
+        with self.database.env.begin() as txn:
+            return txn.get(key, db = self.database.db['main'])
+
+    def test_writes_commit_on_exit(self):
+        with self.database.session():
+            self.database.write(b'a', b'1')
+            self.database.write_many([b'b', b'c'], [b'2', b'3'])
+            self.assertIsNone(self._committed(b'a'))
+            self.assertEqual(self.database.load(b'b'), b'2')
+        self.assertEqual(self._committed(b'a'), b'1')
+        self.assertEqual(self.database.load_many([b'b', b'c']),
+            [b'2', b'3'])
+
+    def test_error_aborts_the_session(self):
+        with self.assertRaises(ValueError):
+            with self.database.session():
+                self.database.write(b'a', b'1')
+                raise ValueError('stop')
+        self.assertIsNone(self.database.load(b'a'))
+
+    def test_failed_write_leaves_nothing_and_session_goes_on(self):
+        self.database.write(b'existing', b'old')
+        with self.database.session():
+            with self.assertRaises(KeyError):
+                self.database.write_many([b'new', b'existing'],
+                    [b'value', b'changed'])
+            self.database.write(b'other', b'1')
+        self.assertIsNone(self.database.load(b'new'))
+        self.assertEqual(self.database.load(b'existing'), b'old')
+        self.assertEqual(self.database.load(b'other'), b'1')
+
+    def test_commit_every_commits_chunks(self):
+        with self.database.session(commit_every = 2):
+            self.database.write(b'a', b'1')
+            self.database.write(b'b', b'2')
+            self.assertEqual(self._committed(b'a'), b'1')
+            self.database.write(b'c', b'3')
+            self.assertIsNone(self._committed(b'c'))
+        self.assertEqual(self._committed(b'c'), b'3')
+
+
+class TestStoreSession(unittest.TestCase):
+    '''Store.session batches saves, links and deletes into one commit.'''
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            self.store = Store(path=tmpdir)
+        self.addCleanup(self.store.close)
+        self.audio = self.store.create(Audio, filename='session.wav',
+            duration=10_000)
+        self.speaker = self.store.create(Speaker, name='spk',
+            dataset='test')
+
+    def _word(self, label, start):
+        return self.store.create(Word, label=label, start=start,
+            end=start + 100, audio_id=self.audio.identifier,
+            speaker_id=self.speaker.identifier)
+
+    def test_saves_links_and_deletes_commit_together(self):
+        words = [self._word(str(i), i * 200) for i in range(3)]
+        with redirect_stdout(io.StringIO()):
+            with self.store.session():
+                self.audio.save()
+                self.speaker.save()
+                self.speaker.add_audio(self.audio)
+                for word in words: word.save()
+                self.store.delete_many([words[0].key])
+                self.assertIsNone(self.store.DB.env.begin().get(
+                    words[1].key, db = self.store.DB.db['main']))
+
+        self.assertEqual(self.store.class_count('Word'), 2)
+        labels = self.store.label_to_instances('1', 'Word')
+        self.assertEqual([word.label for word in labels], ['1'])
+        audio_keys = self.store.DB.speaker_to_audio_keys(self.speaker)
+        self.assertEqual(audio_keys, [self.audio.key])
+
+    def test_abort_writes_nothing_and_drops_cached_objects(self):
+        word = self._word('gone', 0)
+        with self.assertRaises(RuntimeError):
+            with self.store.session():
+                self.audio.save()
+                word.save()
+                raise RuntimeError('abort')
+        self.assertIsNone(self.store.get_cached(word.key))
+        self.assertEqual(self.store.class_count('Word'), 0)
+        self.assertEqual(list(self.store.DB.label_to_segment_keys('gone',
+            'Word')), [])
+
+    def test_fail_gracefully_inside_session(self):
+        self.audio.save()
+        duplicate = self.store.create(Audio, filename='session.wav',
+            duration=10_000, identifier=self.audio.identifier)
+        with redirect_stdout(io.StringIO()):
+            with self.store.session():
+                self.store.save(duplicate, fail_gracefully=True)
+                self.speaker.save()
+        self.assertEqual(self.store.class_count('Speaker'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()